@@ -0,0 +1,251 @@
+"""Estadísticas del dashboard sobre columnas de users en memoria
+
+Las columnas que usan las estadísticas (edad, match, verificada, Instagram y
+hora de detección) se cargan una vez en arrays compactos y se actualizan con
+cada usuario ingerido, así full_stats no recorre la tabla. Los cálculos son
+vectoriales con NumPy si está instalado; si no, los mismos en Python puro
+(dan exactamente lo mismo, ver benchmarks/bench_analytics.py).
+"""
+import array
+import bisect
+import os
+import threading
+from collections import Counter
+from datetime import datetime
+
+import database as db
+import metrics
+
+try:
+    import numpy as np  # opcional: pip install numpy
+except ImportError:
+    np = None
+
+# BUMBLE_ANALYTICS_NUMPY=0: Python puro aunque NumPy esté instalado (para comparar)
+USE_NUMPY = np is not None and os.environ.get('BUMBLE_ANALYTICS_NUMPY', '1') != '0'
+
+AGE_BUCKETS = (18, 25, 30, 35, 40, 45)   # inicio de cada tramo; el último es "45+"
+PERCENTILES = (10, 25, 50, 75, 90)
+HOURS = 24
+NO_HOUR = -1                             # usuarios sin first_seen_ts
+
+# (nombre, código de array.array, dtype de NumPy)
+COLUMNS = (
+    ('age', 'h', 'int16'),
+    ('match', 'b', 'int8'),
+    ('verified', 'b', 'int8'),
+    ('instagram', 'b', 'int8'),
+    ('hour', 'b', 'int8'),
+)
+
+ROWS = metrics.gauge('bumble_analytics_rows', 'Usuarios en las columnas de estadísticas')
+LOADS = metrics.counter('bumble_analytics_loads_total', 'Cargas completas de las columnas de estadísticas')
+SUMMARY_SECONDS = metrics.histogram('bumble_analytics_summary_seconds', 'Duración del cálculo de las estadísticas')
+
+
+def bucket_labels():
+    return [f'{start}-{end - 1}' for start, end in zip(AGE_BUCKETS, AGE_BUCKETS[1:])] + [f'{AGE_BUCKETS[-1]}+']
+
+
+def _row_values(user):
+    return (
+        int(user.get('age') or 0), int(bool(user.get('has_voted'))),
+        int(bool(user.get('is_verified'))), int(bool(user.get('instagram_connected')))
+    )
+
+
+class UserColumns:
+    """Columnas de users en arrays (array.array), una fila por usuario
+
+    Se cargan de la BD la primera vez que se piden las estadísticas (o si
+    cambió la base de datos o en la BD hay filas que no llegaron por upsert)
+    y upsert() las mantiene al día. Las escrituras que llegan durante una
+    carga se aplican al terminarla. Quien borre filas llama a invalidate().
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.load_lock = threading.Lock()
+        self.positions = {}    # id -> fila
+        self.columns = {name: array.array(code) for name, code, _ in COLUMNS}
+        self.db_file = None    # base de datos cargada (None: sin cargar)
+        self.pending = None    # upserts durante una carga
+
+    def __len__(self):
+        return len(self.positions)
+
+    def _append(self, columns, positions, user_id, values, hour):
+        positions[user_id] = len(positions)
+        for name, value in zip(('age', 'match', 'verified', 'instagram', 'hour'), (*values, hour)):
+            columns[name].append(value)
+
+    def load(self):
+        """Leer las columnas de toda la tabla users (por bloques, de una instantánea)"""
+        with self.load_lock:
+            with self.lock:
+                self.pending = []
+            positions = {}
+            columns = {name: array.array(code) for name, code, _ in COLUMNS}
+            try:
+                for rows in db.iter_analytics_rows():
+                    for user_id, age, has_voted, verified, instagram, hour in rows:
+                        values = (age or 0, int(bool(has_voted)), int(bool(verified)), int(bool(instagram)))
+                        self._append(columns, positions, user_id, values, NO_HOUR if hour is None else hour)
+            except BaseException:
+                with self.lock:
+                    self.pending = None
+                raise
+            with self.lock:
+                self.positions, self.columns = positions, columns
+                self.db_file = db.DB_FILE
+                pending, self.pending = self.pending, None
+                for user, hour in pending:
+                    self._upsert(user, hour)
+            LOADS.inc()
+            ROWS.set(len(positions))
+
+    def ensure_loaded(self, expected_rows=None):
+        """Cargar si hace falta; expected_rows: filas en la BD (puede ir por detrás de los upsert)"""
+        if self.db_file != db.DB_FILE or (expected_rows is not None and expected_rows > len(self)):
+            self.load()
+
+    def invalidate(self):
+        """Volver a cargar en el próximo summary()"""
+        with self.lock:
+            self.db_file = None
+
+    def upsert(self, user):
+        """Añadir o actualizar un usuario recién guardado (no hace nada si aún no se cargó)"""
+        hour = datetime.now().hour
+        with self.lock:
+            if self.pending is not None:
+                self.pending.append((user, hour))
+            elif self.db_file is not None:
+                self._upsert(user, hour)
+
+    def _upsert(self, user, hour):
+        values = _row_values(user)
+        position = self.positions.get(user['id'])
+        if position is None:
+            # La hora de detección es la del primer guardado
+            self._append(self.columns, self.positions, user['id'], values, hour)
+            ROWS.set(len(self.positions))
+            return
+        for name, value in zip(('age', 'match', 'verified', 'instagram'), values):
+            self.columns[name][position] = value
+
+    def clear(self):
+        with self.lock:
+            self.positions = {}
+            self.columns = {name: array.array(code) for name, code, _ in COLUMNS}
+        ROWS.set(0)
+
+    def snapshot(self):
+        """Copia de las columnas: arrays de NumPy o array.array (para calcular sin el lock)"""
+        with self.lock:
+            if USE_NUMPY:
+                return {name: np.frombuffer(self.columns[name], dtype=dtype).copy()
+                        for name, _, dtype in COLUMNS}
+            return {name: array.array(code, self.columns[name]) for name, code, _ in COLUMNS}
+
+    def summary(self, expected_rows=None):
+        """Estadísticas de todos los usuarios (ver numpy_summary)"""
+        self.ensure_loaded(expected_rows)
+        columns = self.snapshot()
+        with SUMMARY_SECONDS.time():
+            return (numpy_summary if USE_NUMPY else python_summary)(**columns)
+
+
+def _percent(part, total):
+    return round(part / total * 100, 1) if total else 0.0
+
+
+def _age_stats(labels, counts):
+    """Media, mediana y percentiles de la distribución [(edad, cantidad)]
+
+    Percentil q: la edad en la posición (q * (n - 1)) // 100 de las edades
+    ordenadas (el método 'lower' de numpy.percentile), sin redondeos de coma
+    flotante para que NumPy, Python y el navegador coincidan.
+    """
+    count = sum(counts)
+    if count == 0:
+        return None, None, {f'p{q}': None for q in PERCENTILES}
+    cumulative, seen = [], 0
+    for n in counts:
+        seen += n
+        cumulative.append(seen)
+
+    def age_at(position):
+        return labels[bisect.bisect_right(cumulative, position)]
+
+    average = round(sum(age * n for age, n in zip(labels, counts)) / count, 1)
+    median = (age_at((count - 1) // 2) + age_at(count // 2)) / 2
+    return average, median, {f'p{q}': age_at(q * (count - 1) // 100) for q in PERCENTILES}
+
+
+def _result(total, labels, counts, bucket_totals, bucket_matches, verified, instagram, matches, hours):
+    average, median, percentiles = _age_stats(labels, counts)
+    return {
+        'rows': total,
+        'age_series': {'labels': labels, 'values': counts},
+        'average_age': average,
+        'median_age': median,
+        'age_percentiles': percentiles,
+        'age_buckets': {
+            'labels': bucket_labels(),
+            'totals': bucket_totals,
+            'matches': bucket_matches,
+            'match_rate': [_percent(m, n) for m, n in zip(bucket_matches, bucket_totals)]
+        },
+        'ratios': {
+            'match': _percent(matches, total),
+            'verified': _percent(verified, total),
+            'instagram': _percent(instagram, total)
+        },
+        'hours': hours
+    }
+
+
+def numpy_summary(age, match, verified, instagram, hour):
+    """Estadísticas con operaciones vectoriales sobre las columnas
+
+    Histograma de edades, media/mediana/percentiles, tasa de match por tramo
+    de edad, proporción de verificadas, con Instagram y con match, y usuarios
+    detectados por hora del día.
+    """
+    counts = np.bincount(age[age > 0])
+    labels = np.flatnonzero(counts)
+
+    buckets = np.searchsorted(AGE_BUCKETS, age, side='right') - 1
+    in_bucket = buckets >= 0
+    bucket_totals = np.bincount(buckets[in_bucket], minlength=len(AGE_BUCKETS))
+    bucket_matches = np.bincount(buckets[in_bucket], weights=match[in_bucket], minlength=len(AGE_BUCKETS))
+
+    return _result(
+        len(age), labels.tolist(), counts[labels].tolist(),
+        bucket_totals.tolist(), bucket_matches.astype(np.int64).tolist(),
+        int(np.count_nonzero(verified)), int(np.count_nonzero(instagram)), int(np.count_nonzero(match)),
+        np.bincount(hour[hour >= 0], minlength=HOURS).tolist()
+    )
+
+
+def python_summary(age, match, verified, instagram, hour):
+    """Lo mismo que numpy_summary recorriendo las filas en Python"""
+    ages = Counter()
+    bucket_totals = [0] * len(AGE_BUCKETS)
+    bucket_matches = [0] * len(AGE_BUCKETS)
+    hours = [0] * HOURS
+    for user_age, user_match, user_hour in zip(age, match, hour):
+        if user_age > 0:
+            ages[user_age] += 1
+        bucket = bisect.bisect_right(AGE_BUCKETS, user_age) - 1
+        if bucket >= 0:
+            bucket_totals[bucket] += 1
+            bucket_matches[bucket] += user_match
+        if user_hour >= 0:
+            hours[user_hour] += 1
+    labels = sorted(ages)
+    return _result(
+        len(age), labels, [ages[a] for a in labels], bucket_totals, bucket_matches,
+        sum(1 for v in verified if v), sum(1 for v in instagram if v), sum(1 for v in match if v), hours
+    )
@@ -0,0 +1,289 @@
+"""Copias de seguridad en caliente de la base de datos (API de backup de SQLite)
+
+La copia se hace por pasos de PAGES_PER_STEP páginas desde una transacción de
+lectura abierta (database.read_snapshot): en WAL el monitor sigue escribiendo
+mientras tanto y la copia es la base de datos tal como estaba al empezar. Sin
+esa transacción, cada escritura del monitor reiniciaría la copia desde la
+primera página.
+
+    python backup.py                     # copia ahora en BUMBLE_BACKUP_DIR
+    python backup.py --gzip              # comprimida (.db.gz)
+    python backup.py --list
+    python backup.py --restore backups/bumble_data-20260101-120000.db.gz
+
+Restaurar sobrescribe la base de datos (antes se guarda una copia
+"pre-restore" en la subcarpeta PRE_RESTORE_DIR, fuera de la rotación):
+hacerlo con el servidor parado.
+"""
+import argparse
+import glob
+import gzip
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+from datetime import datetime
+from time import monotonic, sleep
+
+import database as db
+import metrics
+import querycache
+
+BACKUP_DIR = os.environ.get('BUMBLE_BACKUP_DIR', 'backups')
+# Copia programada mientras el monitor está activo (segundos; 0 la desactiva)
+BACKUP_INTERVAL = float(os.environ.get('BUMBLE_BACKUP_INTERVAL', 6 * 3600))
+BACKUP_KEEP = int(os.environ.get('BUMBLE_BACKUP_KEEP', 7))    # copias que se conservan (0: todas)
+BACKUP_GZIP = os.environ.get('BUMBLE_BACKUP_GZIP', '0') != '0'
+
+PAGES_PER_STEP = 256    # páginas por paso (1 MB con páginas de 4 KB)
+STEP_PAUSE = 0.005      # pausa entre pasos para no acaparar el disco
+PROGRESS_INTERVAL = 0.25
+COPY_CHUNK = 1024 * 1024
+
+TIMESTAMP_FORMAT = '%Y%m%d-%H%M%S'
+PRE_RESTORE_DIR = 'pre-restore'  # ni list_backups, ni rotate, ni due las ven
+
+BACKUP_SECONDS = metrics.histogram('bumble_backup_seconds', 'Duración de cada copia de seguridad',
+                                   buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300))
+BACKUPS = metrics.counter('bumble_backups_total', 'Copias de seguridad creadas')
+BACKUP_ERRORS = metrics.counter('bumble_backup_errors_total', 'Copias de seguridad fallidas')
+BACKUP_BYTES = metrics.gauge('bumble_backup_bytes', 'Tamaño de la última copia de seguridad')
+
+
+def _stem(source=None):
+    return os.path.splitext(os.path.basename(source or db.DB_FILE))[0]
+
+
+def _steps(progress):
+    """Callback de Connection.backup: informa de (páginas copiadas, total) y cede"""
+    def step(status, remaining, total):
+        if progress is not None:
+            progress(total - remaining, total)
+        sleep(STEP_PAUSE)
+    return step
+
+
+def _gzip_file(path, dest):
+    with open(path, 'rb') as src, gzip.open(dest, 'wb', compresslevel=6) as out:
+        shutil.copyfileobj(src, out, COPY_CHUNK)
+
+
+def create(dest_dir=BACKUP_DIR, compress=BACKUP_GZIP, progress=None, tag=None, source=None):
+    """Copiar la base de datos en `dest_dir` y devolver la ruta de la copia
+
+    progress(copiadas, total) se llama tras cada paso. La copia no aparece con
+    su nombre final hasta estar completa.
+    """
+    os.makedirs(dest_dir, exist_ok=True)
+    name = f'{_stem(source)}-{datetime.now().strftime(TIMESTAMP_FORMAT)}'
+    if tag:
+        name += f'-{tag}'
+    extension = '.db.gz' if compress else '.db'
+    path = os.path.join(dest_dir, name + extension)
+    suffix = 1
+    while os.path.exists(path):  # dos copias en el mismo segundo
+        path = os.path.join(dest_dir, f'{name}.{suffix}{extension}')
+        suffix += 1
+    name = os.path.basename(path)[:-len(extension)]
+    part = path + '.part'
+    copy = os.path.join(dest_dir, name + '.db.tmp') if compress else part
+
+    try:
+        with BACKUP_SECONDS.time(), db.read_snapshot(source) as src:
+            dst = sqlite3.connect(copy)
+            try:
+                src.backup(dst, pages=PAGES_PER_STEP, progress=_steps(progress))
+                # La copia es un único archivo, sin -wal ni -shm
+                dst.execute('PRAGMA journal_mode=DELETE')
+            finally:
+                dst.close()
+            if compress:
+                _gzip_file(copy, part)
+        os.replace(part, path)
+    except BaseException:
+        BACKUP_ERRORS.inc()
+        raise
+    finally:
+        for leftover in {copy, part}:
+            if os.path.exists(leftover):
+                os.remove(leftover)
+
+    BACKUPS.inc()
+    BACKUP_BYTES.set(os.path.getsize(path))
+    return path
+
+
+def list_backups(dest_dir=BACKUP_DIR, source=None):
+    """Copias existentes, de la más reciente a la más antigua"""
+    paths = glob.glob(os.path.join(dest_dir, f'{_stem(source)}-*.db'))
+    paths += glob.glob(os.path.join(dest_dir, f'{_stem(source)}-*.db.gz'))
+    backups = []
+    for path in sorted(paths, key=os.path.getmtime, reverse=True):
+        stat = os.stat(path)
+        backups.append({
+            'name': os.path.basename(path),
+            'path': path,
+            'bytes': stat.st_size,
+            'created': datetime.fromtimestamp(stat.st_mtime).isoformat(timespec='seconds')
+        })
+    return backups
+
+
+def rotate(keep=BACKUP_KEEP, dest_dir=BACKUP_DIR, source=None):
+    """Borrar las copias más antiguas que sobran de `keep`; devuelve las borradas"""
+    if keep <= 0:
+        return []
+    removed = [backup['path'] for backup in list_backups(dest_dir, source)[keep:]]
+    for path in removed:
+        os.remove(path)
+    return removed
+
+
+def due(interval=BACKUP_INTERVAL, dest_dir=BACKUP_DIR):
+    """True si la copia más reciente tiene más de `interval` segundos (o no hay ninguna)"""
+    backups = list_backups(dest_dir)
+    if not backups:
+        return True
+    age = datetime.now().timestamp() - os.path.getmtime(backups[0]['path'])
+    return age >= interval
+
+
+def restore(path, target=None, progress=None, safety_copy=True):
+    """Reemplazar la base de datos por la copia `path` (.db o .db.gz)
+
+    La copia se comprueba (PRAGMA quick_check) antes de tocar nada y se
+    vuelca con la API de backup, en una sola transacción de escritura.
+    Devuelve la ruta de la copia "pre-restore" (o None), que se guarda en
+    PRE_RESTORE_DIR junto a la copia restaurada.
+    """
+    target = target or db.DB_FILE
+    workdir = os.path.dirname(os.path.abspath(target))
+    unpacked = None
+    if path.endswith('.gz'):
+        fd, unpacked = tempfile.mkstemp(suffix='.db', dir=workdir)
+        with os.fdopen(fd, 'wb') as out, gzip.open(path, 'rb') as src:
+            shutil.copyfileobj(src, out, COPY_CHUNK)
+
+    try:
+        src = sqlite3.connect(unpacked or path)
+        try:
+            check = src.execute('PRAGMA quick_check').fetchone()[0]
+            if check != 'ok':
+                raise ValueError(f'Copia dañada ({path}): {check}')
+            tables = {row[0] for row in src.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            if 'users' not in tables:
+                raise ValueError(f'{path} no es una base de datos del monitor')
+
+            previous = None
+            if safety_copy and os.path.exists(target):
+                safety_dir = os.path.join(os.path.dirname(path) or '.', PRE_RESTORE_DIR)
+                previous = create(safety_dir, compress=False, tag='pre-restore', source=target)
+
+            dst = sqlite3.connect(target)
+            try:
+                src.backup(dst, pages=PAGES_PER_STEP, progress=_steps(progress))
+                dst.execute('PRAGMA journal_mode=WAL')
+            finally:
+                dst.close()
+        finally:
+            src.close()
+    finally:
+        if unpacked:
+            os.remove(unpacked)
+
+    # Lo leído de la base de datos anterior ya no vale
+    if target == db.DB_FILE:
+        querycache.bump('users', 'activity_log', 'stats')
+    return previous
+
+
+class BackupJob:
+    """Una copia a la vez en un thread aparte, con su progreso
+
+    on_progress(status) recibe el estado (ver status()) como mucho cada
+    PROGRESS_INTERVAL segundos, y siempre al empezar y al terminar.
+    """
+
+    def __init__(self, on_progress=None, dest_dir=BACKUP_DIR):
+        self.on_progress = on_progress
+        self.dest_dir = dest_dir
+        self.lock = threading.Lock()
+        self.thread = None
+        self.state = {'running': False, 'copied': 0, 'total': 0, 'path': None, 'error': None}
+        self.last_report = 0.0
+
+    def status(self):
+        with self.lock:
+            return dict(self.state)
+
+    def _set(self, report=True, **changes):
+        with self.lock:
+            self.state.update(changes)
+            state = dict(self.state)
+        if report and self.on_progress is not None:
+            self.last_report = monotonic()
+            self.on_progress(state)
+
+    def _progress(self, copied, total):
+        now = monotonic()
+        self._set(report=now - self.last_report >= PROGRESS_INTERVAL, copied=copied, total=total)
+
+    def start(self, compress=BACKUP_GZIP, keep=BACKUP_KEEP):
+        """Lanzar una copia; False si ya hay una en curso"""
+        with self.lock:
+            if self.state['running']:
+                return False
+            self.state.update(running=True, copied=0, total=0, path=None, error=None)
+        self.thread = threading.Thread(target=self._run, args=(compress, keep), daemon=True)
+        self.thread.start()
+        return True
+
+    def _run(self, compress, keep):
+        self._set()
+        try:
+            path = create(self.dest_dir, compress=compress, progress=self._progress)
+            removed = rotate(keep, self.dest_dir)
+            self._set(running=False, path=path, bytes=os.path.getsize(path), removed=len(removed))
+        except Exception as e:
+            self._set(running=False, error=str(e))
+
+
+def _size(num_bytes):
+    return f'{num_bytes / (1024 * 1024):.1f} MB'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Copias de seguridad de la base de datos del monitor')
+    parser.add_argument('--db', default=None, help=f'Base de datos (por defecto {db.DB_FILE})')
+    parser.add_argument('--dir', default=BACKUP_DIR, help='Carpeta de las copias')
+    parser.add_argument('--gzip', action='store_true', default=BACKUP_GZIP, help='Comprimir la copia (.db.gz)')
+    parser.add_argument('--keep', type=int, default=BACKUP_KEEP, help='Copias a conservar (0: todas)')
+    parser.add_argument('--list', action='store_true', help='Listar las copias existentes')
+    parser.add_argument('--restore', metavar='COPIA', help='Restaurar una copia (con el servidor parado)')
+    args = parser.parse_args()
+    if args.db:
+        db.DB_FILE = args.db
+
+    def report(copied, total):
+        print(f'\r   {copied}/{total} páginas', end='', flush=True)
+
+    if args.list:
+        for backup in list_backups(args.dir):
+            print(f"{backup['name']:50} {_size(backup['bytes']):>10}  {backup['created']}")
+    elif args.restore:
+        previous = restore(args.restore, progress=report)
+        print(f'\n✅ Restaurada {args.restore} en {db.DB_FILE}')
+        if previous:
+            print(f'   La base de datos anterior quedó en {previous}')
+    else:
+        started = monotonic()
+        path = create(args.dir, compress=args.gzip, progress=report)
+        removed = rotate(args.keep, args.dir)
+        print(f'\n✅ {path} ({_size(os.path.getsize(path))}, {monotonic() - started:.1f} s)')
+        for old in removed:
+            print(f'   Borrada {old}')
+
+
+if __name__ == '__main__':
+    main()
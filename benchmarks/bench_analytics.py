@@ -0,0 +1,57 @@
+"""Estadísticas del dashboard (analytics.py): NumPy frente a Python puro
+
+El cálculo se mide sobre BENCH_ANALYTICS_ROWS filas sintéticas (1M por
+defecto) en las mismas columnas que usa UserColumns; los dos caminos deben
+dar el mismo resultado. La carga inicial de las columnas desde la BD se mide
+a las escalas de siempre.
+"""
+
+import array
+import os
+
+import pytest
+
+import analytics
+
+np = pytest.importorskip('numpy')
+
+ANALYTICS_ROWS = int(os.environ.get('BENCH_ANALYTICS_ROWS', 1_000_000))
+
+
+@pytest.fixture(scope='module')
+def columns():
+    rng = np.random.default_rng(6)
+    age = rng.integers(18, 56, ANALYTICS_ROWS).astype('int16')
+    age[rng.random(ANALYTICS_ROWS) < 0.02] = 0   # sin edad
+    hour = rng.integers(0, 24, ANALYTICS_ROWS).astype('int8')
+    hour[rng.random(ANALYTICS_ROWS) < 0.01] = analytics.NO_HOUR
+    return {
+        'age': age,
+        'match': (rng.random(ANALYTICS_ROWS) < 0.2).astype('int8'),
+        'verified': (rng.random(ANALYTICS_ROWS) < 0.4).astype('int8'),
+        'instagram': (rng.random(ANALYTICS_ROWS) < 0.3).astype('int8'),
+        'hour': hour
+    }
+
+
+@pytest.fixture(scope='module')
+def expected(columns):
+    return analytics.numpy_summary(**columns)
+
+
+@pytest.mark.parametrize('engine', ['numpy', 'python'])
+def bench_analytics_summary(benchmark, columns, expected, engine):
+    if engine == 'numpy':
+        result = benchmark(analytics.numpy_summary, **columns)
+    else:
+        # Lo que recorre el camino sin NumPy: los array.array de UserColumns
+        arrays = {name: array.array(code, columns[name].tobytes()) for name, code, _ in analytics.COLUMNS}
+        result = benchmark.pedantic(analytics.python_summary, kwargs=arrays, rounds=3)
+    benchmark.extra_info['rows'] = ANALYTICS_ROWS
+    assert result == expected
+
+
+def bench_analytics_load(benchmark, populated_db):
+    store = analytics.UserColumns()
+    benchmark.pedantic(store.load, rounds=3)
+    assert len(store) == populated_db
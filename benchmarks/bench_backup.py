@@ -0,0 +1,65 @@
+"""Copia de seguridad en caliente mientras el monitor escribe
+
+Un thread escribe en activity_log sin parar durante la copia; se anota cuántas
+escrituras entraron y la latencia máxima de una escritura (extra_info y salida
+con -s). Cada prueba trabaja sobre una copia de la base de datos de la escala.
+"""
+
+import sqlite3
+import threading
+from time import perf_counter
+
+import pytest
+
+import backup
+import database as db
+
+
+@pytest.fixture
+def live_db(populated_db, tmp_path, monkeypatch):
+    copy = backup.create(str(tmp_path / 'source'), compress=False)
+    conn = sqlite3.connect(copy)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.close()
+    monkeypatch.setattr(db, 'DB_FILE', copy)
+    return populated_db
+
+
+def _with_writer(function):
+    stop = threading.Event()
+    latencies = []
+
+    def writer():
+        while not stop.is_set():
+            started = perf_counter()
+            db.log_activity('bench', 'u', 'n', 'escritura durante la copia')
+            latencies.append(perf_counter() - started)
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    try:
+        result = function()
+    finally:
+        stop.set()
+        thread.join()
+    return result, latencies
+
+
+@pytest.mark.parametrize('compress', [False, True], ids=['db', 'gzip'])
+def bench_backup_under_writes(benchmark, live_db, tmp_path, compress):
+    dest = str(tmp_path / 'backups')
+    runs = []
+
+    def run():
+        path, latencies = _with_writer(lambda: backup.create(dest, compress=compress))
+        runs.append(latencies)
+        return path
+
+    path = benchmark.pedantic(run, rounds=3)
+    writes = sum(len(latencies) for latencies in runs) / len(runs)
+    worst = max(max(latencies, default=0) for latencies in runs)
+    benchmark.extra_info['writes_during_backup'] = writes
+    benchmark.extra_info['max_write_seconds'] = worst
+    print(f"\n{live_db} usuarios: {writes:.0f} escrituras durante la copia, la más lenta {worst * 1000:.1f} ms")
+    assert backup.list_backups(dest)[0]['path'] == path
+    assert writes > 0
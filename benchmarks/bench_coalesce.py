@@ -0,0 +1,82 @@
+"""Carga de muchas pestañas: peticiones simultáneas de estadísticas e historial
+
+Cada ronda simula un new_user (escritura que caduca la caché de consultas) y
+TABS clientes piden lo mismo a la vez. Con single-flight las peticiones que
+llegan mientras otra calcula se unen a ella; se cuenta cuántas veces se
+ejecutó la consulta por ronda.
+"""
+
+import os
+import threading
+
+import pytest
+
+import metrics
+import querycache
+import singleflight
+
+TABS = int(os.environ.get('BENCH_TABS', 16))
+
+
+def _query_runs(function):
+    return metrics.DB_CALL_SECONDS.snapshot().get(function, {}).get('count', 0)
+
+
+def _many_tabs(web, event, data=None):
+    clients = [web.socketio.test_client(web.app) for _ in range(TABS)]
+    for client in clients:
+        client.get_received()
+    barrier = threading.Barrier(TABS)
+
+    def tab(client):
+        barrier.wait()
+        client.emit(event, data) if data is not None else client.emit(event)
+
+    def run():
+        run.rounds += 1
+        querycache.bump('users', 'activity_log')  # un new_user entre ronda y ronda
+        threads = [threading.Thread(target=tab, args=(client,)) for client in clients]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return [client.get_received() for client in clients]
+    run.rounds = 0
+    return clients, run
+
+
+@pytest.mark.parametrize('coalesce', [True, False], ids=['singleflight', 'direct'])
+def bench_full_stats_many_tabs(benchmark, web, populated_db, monkeypatch, coalesce):
+    monkeypatch.setattr(singleflight, 'ENABLED', coalesce)
+    clients, run = _many_tabs(web, 'get_full_stats')
+    runs_before = _query_runs('get_stats')
+
+    received = benchmark.pedantic(run, rounds=5)
+    per_round = (_query_runs('get_stats') - runs_before) / run.rounds
+    benchmark.extra_info['get_stats_per_round'] = per_round
+    print(f"\n{TABS} pestañas, get_stats por ronda: {per_round}")
+    # Todas las pestañas reciben sus estadísticas
+    assert all(sum(m['name'] == 'full_stats' for m in messages) == 1 for messages in received)
+    for client in clients:
+        client.disconnect()
+
+
+@pytest.mark.parametrize('coalesce', [True, False], ids=['singleflight', 'direct'])
+def bench_history_many_tabs(benchmark, web, populated_db, monkeypatch, coalesce):
+    monkeypatch.setattr(singleflight, 'ENABLED', coalesce)
+    # El cliente de pruebas no confirma los bloques: sin límite de ventana
+    monkeypatch.setattr(web, 'STREAM_WINDOW', 10**6)
+    reads = []
+    iter_users = web.db.iter_users
+    monkeypatch.setattr(web.db, 'iter_users', lambda *a, **k: reads.append(1) or iter_users(*a, **k))
+    clients, run = _many_tabs(web, 'get_history', {'stream_id': 'h'})
+
+    received = benchmark.pedantic(run, rounds=3)
+    per_round = len(reads) / run.rounds
+    benchmark.extra_info['history_reads_per_round'] = per_round
+    print(f"\n{TABS} pestañas, lecturas del historial por ronda: {per_round}")
+    for messages in received:
+        done = [m for m in messages if m['name'] == 'history_done']
+        assert len(done) == 1 and done[0]['args'][0]['total'] >= populated_db
+    for client in clients:
+        client.disconnect()
@@ -0,0 +1,79 @@
+"""Benchmarks de las consultas de database.py a 1k/10k/100k usuarios
+
+Las lecturas cacheadas se miden sin caché (`__wrapped__`: el coste de la
+consulta) y, las que piden varias pestañas a la vez, también desde la caché.
+"""
+
+import itertools
+from datetime import datetime, timedelta
+
+import database as db
+import synthetic
+
+
+def bench_save_user_insert(benchmark, empty_db):
+    users = iter(synthetic.user_infos(200_000))
+    benchmark(lambda: db.save_user(next(users)))
+
+
+def bench_save_user_update(benchmark, populated_db):
+    users = itertools.cycle(synthetic.user_infos(1_000))
+    benchmark(lambda: db.save_user(next(users)))
+
+
+def bench_get_all_users(benchmark, populated_db):
+    users = benchmark(db.get_all_users.__wrapped__)
+    assert len(users) >= populated_db
+
+
+def bench_get_matches(benchmark, populated_db):
+    benchmark(db.get_matches.__wrapped__)
+
+
+def bench_get_stats(benchmark, populated_db):
+    stats = benchmark(db.get_stats.__wrapped__)
+    assert stats['total'] >= populated_db
+
+
+def bench_get_activity_log(benchmark, populated_db):
+    activities = benchmark(db.get_activity_log.__wrapped__, 100)
+    assert len(activities) == 100
+
+
+def bench_search_users_prefix(benchmark, populated_db):
+    result = benchmark(db.search_users, 'mad')
+    assert result['total'] > 0
+
+
+def bench_get_stats_cached(benchmark, populated_db):
+    stats = benchmark(db.get_stats)
+    assert stats['total'] >= populated_db
+
+
+def bench_get_match_chunks_cached(benchmark, populated_db):
+    chunks = benchmark(db.get_match_chunks)
+    assert chunks and chunks[0][0]['has_voted']
+
+
+def bench_get_users_seen_between(benchmark, populated_db):
+    # synthetic.populate: un usuario por minuto desde el 1/1/2026 (los actualizados, ahora)
+    start = datetime(2026, 1, 1)
+    users = benchmark(db.get_users_seen_between, start)
+    assert len(users) == db.count_users()
+    assert db.get_users_seen_between(start, start + timedelta(minutes=10)) == [
+        user for user in users if user['last_seen'] < (start + timedelta(minutes=10)).isoformat()]
+
+
+def bench_get_users_within_km(benchmark, populated_db):
+    users = benchmark(db.get_users_within_km, 10)
+    assert users and all(user['distance_short'] for user in users)
+
+
+def bench_get_detections_per_hour(benchmark, populated_db):
+    hours = benchmark(db.get_detections_per_hour)
+    assert sum(count for _, count in hours) == db.count_users()
+
+
+def bench_backfill_numeric_columns_again(benchmark, populated_db):
+    # Ya rellenadas: solo se recorren las filas nuevas, no las que no se pudieron convertir
+    benchmark(db.backfill_numeric_columns)
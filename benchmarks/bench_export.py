@@ -0,0 +1,39 @@
+"""Exportación en streaming de users (NDJSON y CSV)
+
+Mide el recorrido completo y, en una pasada aparte con tracemalloc, la
+memoria máxima: debe ser la misma a cualquier escala (extra_info y salida
+con -s).
+"""
+
+import tracemalloc
+
+import pytest
+
+import export
+
+
+def _drain(fmt):
+    total = 0
+    for text in export.stream('users', fmt):
+        total += len(text)
+    return total
+
+
+def _peak_bytes(fmt):
+    tracemalloc.start()
+    try:
+        _drain(fmt)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+@pytest.mark.parametrize('fmt', export.FORMATS)
+def bench_export_users(benchmark, populated_db, fmt):
+    size = benchmark(_drain, fmt)
+    peak = _peak_bytes(fmt)
+    benchmark.extra_info['bytes'] = size
+    benchmark.extra_info['peak_memory_bytes'] = peak
+    print(f"\n{populated_db} usuarios en {fmt}: {size / 1024 / 1024:.1f} MB exportados, "
+          f"memoria máxima {peak / 1024 / 1024:.2f} MB")
+    assert peak < 8 * 1024 * 1024
@@ -0,0 +1,33 @@
+"""Benchmarks del camino de ingesta y del handler de estadísticas"""
+
+import pytest
+
+import synthetic
+
+PAYLOAD_USERS = 100
+
+
+@pytest.mark.parametrize('shape', list(synthetic.PAYLOADS))
+def bench_process_response(benchmark, web, shape):
+    make_payload, url = synthetic.PAYLOADS[shape]
+    payload = make_payload(PAYLOAD_USERS)
+
+    def setup():
+        # Vaciar la sesión para que cada ronda procese usuarios "nuevos"
+        web.session_users.clear()
+
+    benchmark.pedantic(web.process_response, args=(payload, url), setup=setup, rounds=10)
+    assert len(web.session_users) == PAYLOAD_USERS
+
+
+def bench_handle_get_full_stats(benchmark, web, populated_db):
+    client = web.socketio.test_client(web.app)
+    client.get_received()
+
+    def request_stats():
+        client.emit('get_full_stats')
+        return client.get_received()
+
+    received = benchmark(request_stats)
+    assert any(message['name'] == 'full_stats' for message in received)
+    client.disconnect()
@@ -0,0 +1,36 @@
+"""Benchmark del parseo de respuestas grandes en el pool de procesos"""
+
+import os
+
+import pytest
+
+import parsing
+import synthetic
+
+BODIES = 16
+BODY_USERS = 1000
+WORKERS = tuple(int(w) for w in os.environ.get('BENCH_PARSE_WORKERS', '').split(',') if w) or (0, 1, 2, 4)
+
+
+@pytest.fixture(scope='module')
+def large_bodies():
+    """Lote de respuestas SERVER_GET_ENCOUNTERS grandes, como en una reproducción"""
+    make_payload, url = synthetic.PAYLOADS['encounters']
+    return [(make_payload(BODY_USERS, offset=i * BODY_USERS, seed=i), url) for i in range(BODIES)]
+
+
+@pytest.mark.parametrize('workers', WORKERS, ids=lambda w: f'{w}w')
+def bench_parse_all(benchmark, monkeypatch, large_bodies, workers):
+    monkeypatch.setattr(parsing, 'PARSE_WORKERS', workers)
+    parsing.shutdown_pool()
+    # Arrancar los procesos fuera de la medida
+    parsing.start_pool()
+    try:
+        results = benchmark.pedantic(parsing.parse_all, args=(large_bodies,), rounds=5, warmup_rounds=1)
+    finally:
+        parsing.shutdown_pool()
+
+    users = sum(len(found) for found, _ in results)
+    assert users == BODIES * BODY_USERS
+    if benchmark.stats:
+        benchmark.extra_info['users_per_sec'] = round(users / benchmark.stats.stats.mean)
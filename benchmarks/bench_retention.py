@@ -0,0 +1,95 @@
+"""Retención: archivar la mitad de users por lotes mientras el monitor escribe
+
+Un thread escribe en activity_log durante todo el archivado; se anota la
+latencia máxima de una escritura (cada lote es una transacción corta, así que
+no debería pasar de lo que tarda un lote) y cuánto devuelve después el vacuum
+incremental. Cada prueba trabaja sobre una copia de la base de datos de la escala.
+
+Además se comprueba que archivar olvida las respuestas cacheadas (bodycache) con
+esos usuarios: si la misma respuesta vuelve a llegar se procesa y se guardan.
+"""
+
+import os
+import sqlite3
+
+import pytest
+
+import backup
+import bodycache
+import database as db
+import retention
+import synthetic
+from bench_backup import _with_writer
+
+
+@pytest.fixture
+def live_db(populated_db, tmp_path, monkeypatch):
+    copy = backup.create(str(tmp_path / 'source'), compress=False)
+    conn = sqlite3.connect(copy, isolation_level=None)
+    conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+    conn.execute('VACUUM')
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.close()
+    monkeypatch.setattr(db, 'DB_FILE', copy)
+    monkeypatch.setattr(retention, 'ARCHIVE_FILE', str(tmp_path / 'archive.db'))
+    return populated_db
+
+
+@pytest.mark.parametrize('batch', [100, retention.ARCHIVE_BATCH])
+def bench_retention_archive_under_writes(benchmark, live_db, batch):
+    policy = retention.Policy('users', 'last_seen_ts', max_rows=live_db // 2)
+
+    def run():
+        moved = 0
+        while True:
+            count = retention.archive_batch(policy, limit=batch)
+            if not count:
+                return moved
+            moved += count
+
+    moved, latencies = benchmark.pedantic(lambda: _with_writer(run), rounds=1)
+    size = os.path.getsize(db.DB_FILE)
+    freed = 0
+    while True:
+        pages = retention.vacuum_step()
+        if not pages:
+            break
+        freed += pages
+    worst = max(latencies, default=0)
+    benchmark.extra_info['archived'] = moved
+    benchmark.extra_info['max_write_seconds'] = worst
+    benchmark.extra_info['vacuumed_pages'] = freed
+    print(f"\n{live_db} usuarios: {moved} archivados en lotes de {batch}, escritura más lenta "
+          f"{worst * 1000:.1f} ms, {freed} páginas devueltas ({size} -> {os.path.getsize(db.DB_FILE)} bytes)")
+    assert moved == live_db - live_db // 2
+    assert db.count_users() == live_db // 2
+    assert freed > 0
+
+
+def bench_retention_forgets_cached_bodies(benchmark, live_db):
+    url = synthetic.PAYLOADS['encounters'][1]
+    users = synthetic.user_infos(min(live_db, 2000))
+    groups = [[info['id'] for info in users[i:i + 10]] for i in range(0, len(users), 10)]
+    bodies = {f'body-{n}': ids for n, ids in enumerate(groups)}
+    bodycache.clear()
+    for body, ids in bodies.items():
+        bodycache.remember_body(url, body, ids)
+    policy = retention.Policy('users', 'last_seen_ts', max_rows=live_db // 2)
+
+    moved = benchmark.pedantic(lambda: retention.archive_batch(policy), rounds=1)
+    try:
+        conn = sqlite3.connect(db.DB_FILE)
+        remaining = {row[0] for row in conn.execute('SELECT id FROM users')}
+        conn.close()
+        for body, ids in bodies.items():
+            hit = bodycache.lookup_body(url, body)
+            # Se olvida la respuesta entera en cuanto falta uno de sus usuarios
+            assert (hit is not None) == remaining.issuperset(ids)
+        archived = next(info for info in users if info['id'] not in remaining)
+        before = db.count_users()
+        assert db.save_user(archived)
+        db.flush_touches()
+        assert db.count_users() == before + 1
+        benchmark.extra_info['archived'] = moved
+    finally:
+        bodycache.clear()
@@ -0,0 +1,57 @@
+"""Formatos en el cable de una lista de 10k perfiles (history_chunk / users_list)
+
+Mide codificar (formato + serialización del paquete de SocketIO) y decodificar
+(lo que hace wire.js) y anota los bytes enviados, en crudo y comprimidos con
+deflate como los comprime permessage-deflate (extra_info y salida con -s).
+"""
+
+import json
+import zlib
+
+import pytest
+
+import database as db
+import wire
+
+WIRE_PROFILES = 10_000
+
+
+@pytest.fixture(scope='module')
+def profiles(scale_dbs):
+    path = scale_dbs(WIRE_PROFILES)
+    previous, db.DB_FILE = db.DB_FILE, path
+    try:
+        return db.get_all_users.__wrapped__(limit=WIRE_PROFILES)
+    finally:
+        db.DB_FILE = previous
+
+
+def _encode(users, fmt):
+    payload = wire.encode_users(users, fmt)
+    # Los bytes van como adjunto binario; el resto, en el texto JSON del paquete
+    return payload if isinstance(payload, bytes) else json.dumps(payload).encode('utf-8')
+
+
+def _decode(data, fmt):
+    return wire.decode_users(data if fmt == wire.MSGPACK else json.loads(data))
+
+
+def _deflated_size(data):
+    compressor = zlib.compressobj(wbits=-15)
+    return len(compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH))
+
+
+@pytest.mark.parametrize('fmt', wire.FORMATS)
+def bench_wire_encode(benchmark, profiles, fmt):
+    data = benchmark(_encode, profiles, fmt)
+    benchmark.extra_info['bytes'] = len(data)
+    benchmark.extra_info['deflated_bytes'] = _deflated_size(data)
+    print(f"\n{fmt}: {len(data) / 1024:.0f} KB, {benchmark.extra_info['deflated_bytes'] / 1024:.0f} KB con deflate")
+
+
+@pytest.mark.parametrize('fmt', wire.FORMATS)
+def bench_wire_decode(benchmark, profiles, fmt):
+    data = _encode(profiles, fmt)
+    users = benchmark(_decode, data, fmt)
+    assert len(users) == len(profiles)
+    assert users[:100] == profiles[:100]
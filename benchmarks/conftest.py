@@ -0,0 +1,57 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import database as db  # noqa: E402
+import synthetic  # noqa: E402
+
+# Limitar escalas con BENCH_SCALES=1000,10000
+SCALES = tuple(int(s) for s in os.environ.get('BENCH_SCALES', '').split(',') if s) or synthetic.SCALES
+
+
+@pytest.fixture(scope='session')
+def scale_dbs(tmp_path_factory):
+    """Una base de datos poblada por escala, creada una sola vez por sesión"""
+    created = {}
+
+    def get(scale):
+        if scale not in created:
+            path = str(tmp_path_factory.mktemp(f'db{scale}') / 'bumble_data.db')
+            db.DB_FILE = path
+            db.init_database()
+            synthetic.populate(path, scale)
+            db.backfill_numeric_columns()
+            created[scale] = path
+        return created[scale]
+    return get
+
+
+@pytest.fixture(params=SCALES, ids=lambda s: f'{s // 1000}k')
+def populated_db(request, scale_dbs, monkeypatch):
+    """Base de datos con N usuarios ya insertados"""
+    path = scale_dbs(request.param)
+    monkeypatch.setattr(db, 'DB_FILE', path)
+    return request.param
+
+
+@pytest.fixture
+def empty_db(tmp_path, monkeypatch):
+    """Base de datos vacía"""
+    monkeypatch.setattr(db, 'DB_FILE', str(tmp_path / 'bumble_data.db'))
+    db.init_database()
+    return db.DB_FILE
+
+
+@pytest.fixture
+def web(tmp_path, monkeypatch):
+    """bumble_web importado contra una base de datos temporal"""
+    monkeypatch.setattr(db, 'DB_FILE', str(tmp_path / 'bumble_web.db'))
+    db.init_database()
+    import bumble_web
+    monkeypatch.setattr(bumble_web, 'SETTLE_SCALE', 0)
+    return bumble_web
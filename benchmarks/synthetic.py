@@ -0,0 +1,154 @@
+"""
+Generador de datos sintéticos con la forma de las respuestas de Bumble.
+
+Todo es determinista (semilla fija) para que los resultados entre commits
+sean comparables.
+"""
+
+import json
+import random
+import sqlite3
+from datetime import datetime, timedelta
+
+import schema
+
+NAMES = ['Ana', 'Lucía', 'María', 'Sofía', 'Paula', 'Laura', 'Carmen', 'Elena', 'Marta', 'Julia',
+         'Sara', 'Irene', 'Claudia', 'Alba', 'Noa', 'Daniela', 'Valeria', 'Andrea', 'Nerea', 'Olivia']
+CITIES = [('Madrid', 'España'), ('Barcelona', 'España'), ('Valencia', 'España'), ('Sevilla', 'España'),
+          ('Bilbao', 'España'), ('Málaga', 'España'), ('Lisboa', 'Portugal'), ('Porto', 'Portugal')]
+INTERESTS = ['Viajar', 'Yoga', 'Café', 'Cine', 'Senderismo', 'Fotografía', 'Cocina', 'Música',
+             'Lectura', 'Running', 'Arte', 'Vino', 'Perros', 'Gatos', 'Series', 'Playa']
+PROFILE_FIELDS = [
+    ('lifestyle_education', ['Universidad', 'Máster', 'Bachillerato']),
+    ('lifestyle_height', ['160 cm', '165 cm', '170 cm', '175 cm']),
+    ('lifestyle_smoking', ['Nunca', 'A veces']),
+    ('lifestyle_drinking', ['Socialmente', 'Nunca', 'Frecuentemente']),
+    ('lifestyle_exercise', ['Activa', 'A veces', 'Casi nunca']),
+    ('lifestyle_pets', ['Perro', 'Gato', 'Ninguna']),
+    ('lifestyle_politics', ['Moderada', 'Liberal', 'Apolítica']),
+    ('lifestyle_religion', ['Agnóstica', 'Católica', 'Atea']),
+    ('lifestyle_zodiak', ['Aries', 'Tauro', 'Géminis', 'Leo', 'Virgo']),
+    ('lifestyle_dating_intentions', ['Relación', 'Algo casual', 'No lo sé']),
+]
+
+SCALES = (1_000, 10_000, 100_000)
+
+def make_api_user(i, rng):
+    """Usuario tal y como aparece en el JSON de la API"""
+    city, country = rng.choice(CITIES)
+    albums = [{'photos': [{'large_url': f'//pd1eu.bumbcdn.com/p{i}/large.jpg'}]}]
+    if rng.random() < 0.3:
+        albums.append({'album_type': 12, 'external_provider': 12, 'photos': []})
+
+    user = {
+        'user_id': f'u{i:08d}',
+        'name': rng.choice(NAMES),
+        'age': rng.randint(18, 45),
+        'albums': albums,
+        'interests': [{'name': name} for name in rng.sample(INTERESTS, rng.randint(0, 6))],
+        'profile_fields': [
+            {'id': field_id, 'display_value': rng.choice(values)}
+            for field_id, values in PROFILE_FIELDS if rng.random() < 0.7
+        ],
+        'city': {'name': city},
+        'country': {'name': country},
+        'distance_short': f'{rng.randint(1, 80)} km',
+        'online_status': rng.randint(0, 3),
+        'is_verified': rng.random() < 0.4,
+    }
+    if rng.random() < 0.2:
+        user['spotify_mood_song'] = {'name': f'Canción {i}', 'artist_name': f'Artista {i % 50}'}
+    return user
+
+
+def encounters_payload(n, offset=0, seed=1):
+    """Respuesta SERVER_GET_ENCOUNTERS con n usuarios"""
+    rng = random.Random(seed)
+    results = [{'user': make_api_user(offset + i, rng), 'has_user_voted': rng.random() < 0.2} for i in range(n)]
+    return json.dumps({'body': [{'client_encounters': {'results': results}}]})
+
+
+def client_user_list_payload(n, offset=0, seed=2):
+    """Respuesta client_user_list (beeline) con n usuarios"""
+    rng = random.Random(seed)
+    users = [make_api_user(offset + i, rng) for i in range(n)]
+    return json.dumps({'body': [{'client_user_list': {'section': {'users': users}}}]})
+
+
+def connections_payload(n, offset=0, seed=3):
+    """Respuesta SERVER_GET_CONNECTIONS con n conexiones"""
+    rng = random.Random(seed)
+    connections = [{'user': make_api_user(offset + i, rng), 'is_match': True} for i in range(n)]
+    return json.dumps({'body': [{'connections': connections}]})
+
+
+def conversations_payload(n, offset=0, seed=4):
+    """Respuesta de conversaciones con n conversaciones"""
+    rng = random.Random(seed)
+    conversations = [{'person': make_api_user(offset + i, rng)} for i in range(n)]
+    return json.dumps({'conversations': conversations})
+
+
+PAYLOADS = {
+    'encounters': (encounters_payload, 'https://bumble.com/mwebapi.phtml?SERVER_GET_ENCOUNTERS'),
+    'client_user_list': (client_user_list_payload, 'https://bumble.com/mwebapi.phtml?SERVER_GET_USER_LIST'),
+    'connections': (connections_payload, 'https://bumble.com/mwebapi.phtml?SERVER_GET_CONNECTIONS'),
+    'conversations': (conversations_payload, 'https://bumble.com/mwebapi.phtml?SERVER_GET_CONVERSATIONS'),
+}
+
+
+def make_user_info(i, rng):
+    """user_info tal y como lo construye process_response"""
+    city, country = rng.choice(CITIES)
+    name = rng.choice(NAMES)
+    detected = datetime(2026, 1, 1) + timedelta(minutes=i)
+    info = {
+        'id': f'u{i:08d}',
+        'name': name,
+        'display_name': name,
+        'age': rng.randint(18, 45),
+        'has_voted': rng.random() < 0.2,
+        'photo': f'https://pd1eu.bumbcdn.com/p{i}/large.jpg',
+        'timestamp': detected.strftime("%H:%M:%S %d/%m/%Y"),
+        'interests': rng.sample(INTERESTS, rng.randint(0, 6)),
+        'distance_short': f'{rng.randint(1, 80)} km',
+        'online_status': rng.randint(0, 3),
+        'is_verified': rng.random() < 0.4,
+        'instagram_connected': rng.random() < 0.3,
+        'spotify_track': '',
+        'city': city,
+        'country': country,
+    }
+    for field_id, values in PROFILE_FIELDS:
+        column = field_id.replace('lifestyle_', '').replace('zodiak', 'zodiac')
+        info[column] = rng.choice(values)
+    return info
+
+
+def user_infos(n, offset=0, seed=5):
+    rng = random.Random(seed)
+    return [make_user_info(offset + i, rng) for i in range(n)]
+
+
+def populate(db_file, n, seed=6):
+    """Rellenar la tabla users con n filas y activity_log con otras tantas"""
+    rng = random.Random(seed)
+    conn = sqlite3.connect(db_file)
+    rows = []
+    activity = []
+    row = {}
+    for i in range(n):
+        info = make_user_info(i, rng)
+        seen = (datetime(2026, 1, 1) + timedelta(minutes=i)).isoformat()
+        # Las mismas columnas y conversiones que save_user; las numéricas, con backfill_numeric_columns
+        row = schema.content_values(info)
+        row.update(id=info['id'], timestamp=info['timestamp'], first_seen=seen, last_seen=seen)
+        rows.append(tuple(row.values()))
+        activity.append((seen, 'match' if info['has_voted'] else 'like_received',
+                         info['id'], info['name'], f"{info['age']} años, {info['city']}"))
+    if rows:
+        conn.executemany(schema.insert_sql(list(row)), rows)
+    conn.executemany('INSERT INTO activity_log (timestamp, action_type, user_id, user_name, details) '
+                     'VALUES (?, ?, ?, ?, ?)', activity)
+    conn.commit()
+    conn.close()
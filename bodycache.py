@@ -0,0 +1,142 @@
+"""Cachés LRU acotadas para no reprocesar respuestas de la API ya vistas
+
+request_cache recuerda los requestId de Chrome ya leídos (ni siquiera se
+pide getResponseBody) y body_cache los cuerpos ya procesados de cada URL
+con los ids de usuario que traían, así un cuerpo repetido (la misma página
+de encounters otra vez) solo actualiza last_seen. Las dos tienen límite de
+entradas y body_cache también de bytes (variables BUMBLE_*_CACHE_*).
+"""
+import os
+import threading
+import zlib
+from collections import OrderedDict
+
+import metrics
+
+# Límites configurables (BUMBLE_BODY_CACHE_ENTRIES / BUMBLE_BODY_CACHE_BYTES)
+BODY_CACHE_ENTRIES = int(os.environ.get('BUMBLE_BODY_CACHE_ENTRIES', 256))
+BODY_CACHE_BYTES = int(os.environ.get('BUMBLE_BODY_CACHE_BYTES', 16 * 1024 * 1024))
+REQUEST_CACHE_ENTRIES = int(os.environ.get('BUMBLE_REQUEST_CACHE_ENTRIES', 4096))
+
+
+class LRUCache:
+    """Caché LRU acotada por número de entradas y por bytes"""
+
+    def __init__(self, name, max_entries, max_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # clave -> (valor, tamaño)
+        self.bytes = 0
+        self.lock = threading.Lock()
+
+        self.hits = metrics.counter(f'bumble_{name}_cache_hits_total', f'Aciertos de la caché {name}')
+        self.misses = metrics.counter(f'bumble_{name}_cache_misses_total', f'Fallos de la caché {name}')
+        self.evictions = metrics.counter(f'bumble_{name}_cache_evictions_total', f'Entradas expulsadas de la caché {name}')
+        self.size_gauge = metrics.gauge(f'bumble_{name}_cache_entries', f'Entradas en la caché {name}')
+        self.bytes_gauge = metrics.gauge(f'bumble_{name}_cache_bytes', f'Bytes en la caché {name}')
+
+    def get(self, key):
+        """Valor guardado (y marcarlo como reciente) o None"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses.inc()
+                return None
+            self.entries.move_to_end(key)
+        self.hits.inc()
+        return entry[0]
+
+    def put(self, key, value, size=0):
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.bytes -= previous[1]
+            # Un valor mayor que el límite de bytes no se guarda
+            if self.max_bytes is not None and size > self.max_bytes:
+                self._update_gauges()
+                return
+            self.entries[key] = (value, size)
+            self.bytes += size
+            self._evict()
+            self._update_gauges()
+
+    def _evict(self):
+        while self.entries and (
+            len(self.entries) > self.max_entries
+            or (self.max_bytes is not None and self.bytes > self.max_bytes)
+        ):
+            _, (_, size) = self.entries.popitem(last=False)
+            self.bytes -= size
+            self.evictions.inc()
+
+    def _update_gauges(self):
+        self.size_gauge.set(len(self.entries))
+        self.bytes_gauge.set(self.bytes)
+
+    def discard(self, predicate):
+        """Quitar las entradas cuyo valor cumpla predicate(valor); devuelve cuántas"""
+        with self.lock:
+            keys = [key for key, (value, _) in self.entries.items() if predicate(value)]
+            for key in keys:
+                self.bytes -= self.entries.pop(key)[1]
+            self._update_gauges()
+        return len(keys)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+            self._update_gauges()
+
+    def __len__(self):
+        return len(self.entries)
+
+
+# Cuerpos ya procesados, por hash rápido (CRC32 + longitud + URL), con los ids
+# de usuario que contenían. El cuerpo se guarda para confirmar el acierto: una
+# colisión de CRC32 no descarta datos
+body_cache = LRUCache('body', BODY_CACHE_ENTRIES, BODY_CACHE_BYTES)
+
+# requestId de Chrome ya leídos: evita incluso la llamada a getResponseBody
+request_cache = LRUCache('request', REQUEST_CACHE_ENTRIES)
+
+
+def seen_request(request_id):
+    """True si este requestId ya se leyó"""
+    return request_cache.get(request_id) is not None
+
+
+def mark_request(request_id):
+    request_cache.put(request_id, True)
+
+
+def _body_key(url, data):
+    return (url, len(data), zlib.crc32(data))
+
+
+def lookup_body(url, body):
+    """ids de usuario de un cuerpo idéntico ya procesado de la misma URL, o None"""
+    data = body.encode('utf-8', 'surrogatepass')
+    entry = body_cache.get(_body_key(url, data))
+    if entry is not None and entry[0] == body:
+        return entry[1]
+    return None
+
+
+def remember_body(url, body, user_ids):
+    """Registrar un cuerpo procesado y los usuarios que contenía"""
+    data = body.encode('utf-8', 'surrogatepass')
+    body_cache.put(_body_key(url, data), (body, tuple(user_ids)), len(data))
+
+
+def forget_users(user_ids):
+    """Olvidar los cuerpos con alguno de estos usuarios (archivados): si la
+    respuesta se repite se procesa entera y se vuelven a guardar"""
+    user_ids = set(user_ids)
+    return body_cache.discard(lambda entry: not user_ids.isdisjoint(entry[1]))
+
+
+def clear():
+    """Olvidar lo procesado (p. ej. tras limpiar los datos)"""
+    body_cache.clear()
+    request_cache.clear()
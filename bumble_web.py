@@ -1,22 +1,44 @@
-from flask import Flask, render_template, jsonify, request
-from flask_socketio import SocketIO, emit
+from flask import Flask, render_template, jsonify, request, Response
+from flask_socketio import SocketIO, emit, join_room, leave_room, close_room
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
-from time import sleep
+from time import sleep, perf_counter
 from langdetect import detect
 import json
 import os
 import threading
+import uuid
 from datetime import datetime
 import database as db
+import metrics
+import logbuffer
+import bodycache
+import scheduler
+import parsing
+import httpcache
+import session
+import singleflight
+import state
+import wire
+import backup
+import export
+import analytics
+import retention
+import schema
+from replay import RecordingDriver
+
+
+class InstrumentedSocketIO(SocketIO):
+    """SocketIO que mide la duración de cada emit"""
+
+    def emit(self, event, *args, **kwargs):
+        with metrics.EMIT_SECONDS.time(event):
+            return super().emit(event, *args, **kwargs)
+
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'bumble-secret-key'
-socketio = SocketIO(app, cors_allowed_origins="*")
-
-# Inicializar base de datos
-db.init_database()
-db.migrate_from_files()
+socketio = (InstrumentedSocketIO if metrics.ENABLED else SocketIO)(app, cors_allowed_origins="*")
 
 # URLs que Bumble usa para obtener datos
 DATA_URLS = [
@@ -37,28 +59,64 @@ DATA_URLS = [
 ]
 BUMBLE_URL = "https://bumble.com/app"
 
-# Estado global
-monitor_state = {
-    'running': False,
-    'driver': None,
-    'users': [],
-    'history': [],
-    'start_time': None,
-    'autolike_enabled': False,
-    'autolike_delay': 3,  # segundos entre likes
-    'autolike_count': 0
-}
+# Grabar la sesión en NDJSON para reproducirla offline (ver replay.py)
+RECORD_FILE = os.environ.get('BUMBLE_RECORD')
+
+# Multiplicador de las esperas de captura (la reproducción offline lo pone a 0)
+SETTLE_SCALE = 1.0
+
+# Estado global: instantáneas inmutables; se escribe con update()/increment()
+monitor_state = state.StateStore()
+
+# Últimos logs en memoria y niveles suscritos por cliente
+log_buffer = logbuffer.LogBuffer()
+log_subscriptions = logbuffer.Subscriptions()
+
+# Streams en curso: (sid, stream_id) -> evento de cancelación
+active_streams = {}
+STREAM_WINDOW = 2      # bloques enviados sin confirmar por el cliente
+STREAM_ACK_TIMEOUT = 30
+
+# Peticiones idénticas simultáneas (varias pestañas): un solo cálculo por vuelo
+stream_flights = singleflight.Group()
+stats_flights = singleflight.Group()
+
+TOP_CITIES = 5         # ciudades en el resumen de estadísticas
+
+API_PAGE_SIZE = db.STREAM_CHUNK_SIZE   # usuarios por página de /api/history y /api/matches
+API_MAX_PAGE_SIZE = 5000
+
+# Planificador del monitor: intervalos en segundos (base, máximo en reposo)
+monitor_scheduler = scheduler.Scheduler()
+CAPTURE_INTERVAL = (0.5, 2)     # driver.get_log: en reposo, el mismo ritmo que antes
+CAPTURE_FOLLOWUP = 0.25         # repetir tras tráfico relevante (llega en ráfagas)
+PAGE_CHECK_INTERVAL = (1, 60)   # page_source es caro: se espacia si la página no cambia
+CHROME_CHECK_INTERVAL = 5
+STATS_INTERVAL = 1
+AUTOLIKE_IDLE_INTERVAL = 5      # con el autolike desactivado
+connected_clients = set()       # sids conectados; sin ninguno el planificador se pausa
+wire_formats = {}               # sid -> formato de las listas de perfiles (ver wire.py)
+
+# Copias de seguridad en caliente (ver backup.py); el progreso va a todas las pestañas
+backup_job = backup.BackupJob(on_progress=lambda status: report_backup(status))
+BACKUP_CHECK_INTERVAL = 300     # revisar si toca la copia programada
+RETENTION_INTERVAL = (1, 600)   # archivo y vacuum por pasos en los huecos del planificador
+
+# Usuarios vistos en esta sesión: los más recientes en memoria, el resto en SQLite
+session_users = session.SessionStore()
+
+# Columnas de users para las estadísticas (se cargan al pedirlas por primera vez)
+user_columns = analytics.UserColumns()
 
 
 def load_history():
-    """Cargar historial de usuarios desde la base de datos"""
+    """Contar el historial de usuarios en la base de datos (se lee por páginas al pedirlo)"""
     try:
-        users = db.get_all_users()
-        monitor_state['history'] = users
-        log_message(f"Historial cargado: {len(users)} usuarios", 'info')
+        total = monitor_state.update(history_total=db.count_users()).history_total
+        log_message(f"Historial cargado: {total} usuarios", 'info')
     except Exception as e:
         log_message(f"Error cargando historial: {str(e)}", 'warning')
-        monitor_state['history'] = []
+        monitor_state.update(history_total=0)
 
 
 def save_history():
@@ -67,63 +125,86 @@ def save_history():
 
 
 def add_to_history(user_info):
-    """Agregar usuario al historial"""
+    """Agregar usuario al historial (True si no estaba ya en la BD)"""
     try:
-        db.save_user(user_info)
-        # Recargar historial desde la BD
-        monitor_state['history'] = db.get_all_users()
-        socketio.emit('history_update', {'total': len(monitor_state['history'])})
+        is_new = db.save_user(user_info)
+        user_columns.upsert(user_info)
+        current = monitor_state.increment('history_total') if is_new else monitor_state.snapshot()
+        socketio.emit('history_update', {'total': current.history_total})
+        return is_new
     except Exception as e:
         log_message(f"Error guardando en historial: {str(e)}", 'error')
+        return None
+
+
+def emit_new_user(user_info):
+    """new_user a cada cliente en su formato (los de JSON reciben el diccionario)"""
+    for fmt in wire.FORMATS:
+        payload = user_info if fmt == wire.JSON else wire.encode_users([user_info], fmt)
+        socketio.emit('new_user', payload, to=wire.room_for(fmt))
+
+
+def users_payload(users, sid=None):
+    """Lista de perfiles en el formato del cliente `sid` (por defecto, el de la petición)"""
+    return wire.encode_users(users, wire_formats.get(sid or request.sid, wire.JSON))
 
 
 def log_message(message, msg_type='info'):
     """Enviar mensaje de log a los clientes conectados"""
     timestamp = datetime.now().strftime("%H:%M:%S")
     
-    # Emojis y prefijos por tipo de log
-    log_types = {
-        'success': '✅',
-        'error': '❌',
-        'warning': '⚠️',
-        'info': '🔵',
-        'debug': '🔍',
-        'chrome': '🌐',
-        'api': '📡',
-        'user': '👤'
-    }
-    
-    emoji = log_types.get(msg_type, '💬')
+    emoji = logbuffer.LOG_TYPES.get(msg_type, '💬')
     formatted_message = f"{emoji} {message}"
     
-    # Imprimir en consola del servidor con formato
-    print(f"[{timestamp}] {formatted_message}")
+    # Imprimir en consola del servidor (no bloqueante, a través de la cola)
+    logbuffer.console.info(f"[{timestamp}] {formatted_message}")
     
-    socketio.emit('log', {
+    entry = log_buffer.append({
         'timestamp': timestamp,
         'message': formatted_message,
         'type': msg_type
     })
+    
+    # Solo a los clientes suscritos a este nivel
+    socketio.emit('log', entry, to=logbuffer.room_for(msg_type))
 
 
 def update_stats():
     """Actualizar estadísticas en tiempo real"""
     socketio.emit('stats_update', {
-        'total': len(monitor_state['users']),
+        'total': len(session_users),
         'elapsed_time': get_elapsed_time()
     })
 
 
 def get_elapsed_time():
     """Calcular tiempo transcurrido"""
-    if monitor_state['start_time']:
-        elapsed = datetime.now() - monitor_state['start_time']
+    start_time = monitor_state['start_time']
+    if start_time:
+        elapsed = datetime.now() - start_time
         hours, remainder = divmod(int(elapsed.total_seconds()), 3600)
         minutes, seconds = divmod(remainder, 60)
         return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
     return "00:00:00"
 
 
+def autolike_status(snapshot=None):
+    """Payload de autolike_status a partir de una instantánea del estado"""
+    snapshot = snapshot or monitor_state.snapshot()
+    return {
+        'enabled': snapshot.autolike_enabled,
+        'delay': snapshot.autolike_delay,
+        'count': snapshot.autolike_count,
+        'version': snapshot.version
+    }
+
+
+def settle(seconds):
+    """Esperar a que Chrome termine de cargar (escalado por SETTLE_SCALE)"""
+    if SETTLE_SCALE:
+        sleep(seconds * SETTLE_SCALE)
+
+
 def create_cookies(driver):
     """Crear y guardar cookies"""
     log_message("Esperando inicio de sesión manual en Chrome...", 'chrome')
@@ -155,18 +236,27 @@ def load_cookies(driver):
         log_message("No se encontraron cookies guardadas", 'warning')
 
 
-def get_likes(driver):
-    """Obtener información de likes de los logs de performance"""
+def get_likes(driver, wait=1):
+    """Obtener información de likes de los logs de performance
+    
+    `wait`: segundos de espera previa (tras navegar). El planificador usa 0:
+    lo que aún no esté en el log se lee en la siguiente pasada.
+    Devuelve (entradas de log leídas, respuestas de la API de Bumble vistas).
+    """
+    logs = []
+    found_urls = []
     try:
-        sleep(1)
-        logs = driver.get_log("performance")
+        settle(wait)
+        with metrics.GET_LOG_SECONDS.time():
+            logs = driver.get_log("performance")
         response_data = None
-        found_urls = []
         processed_count = 0
+        pending = []  # (cuerpo, url) a decodificar al final del lote
         
         for log in logs:
             try:
-                network_log = json.loads(log["message"])["message"]
+                with metrics.LOG_PARSE_SECONDS.time():
+                    network_log = json.loads(log["message"])["message"]
                 
                 # Capturar todas las URLs para debugging
                 if "Network.responseReceived" in network_log["method"]:
@@ -185,21 +275,30 @@ def get_likes(driver):
                             # Verificar si la URL contiene alguna de las palabras clave
                             if any(keyword in url for keyword in DATA_URLS):
                                 try:
+                                    request_id = network_log["params"]["requestId"]
+                                    if bodycache.seen_request(request_id):
+                                        continue
+                                    
                                     # Pequeña espera para asegurar que la respuesta esté disponible
-                                    sleep(0.5)
+                                    settle(0.5)
                                     
-                                    request_id = network_log["params"]["requestId"]
-                                    response_body = driver.execute_cdp_cmd(
-                                        'Network.getResponseBody', 
-                                        {'requestId': request_id}
-                                    )
+                                    with metrics.RESPONSE_BODY_SECONDS.time():
+                                        response_body = driver.execute_cdp_cmd(
+                                            'Network.getResponseBody', 
+                                            {'requestId': request_id}
+                                        )
+                                    
+                                    bodycache.mark_request(request_id)
                                     
                                     if response_body and 'body' in response_body:
-                                        # Extraer nombre corto de la API
-                                        api_name = next((k for k in DATA_URLS if k in url), "API")
-                                        log_message(f"Datos capturados de: {api_name}", 'api')
-                                        process_response(response_body['body'], url)
-                                        processed_count += 1
+                                        # Mismo contenido que una respuesta ya procesada: no
+                                        # decodificar, solo actualizar last_seen de sus usuarios
+                                        cached_ids = bodycache.lookup_body(url, response_body['body'])
+                                        if cached_ids is not None:
+                                            db.touch_users(cached_ids)
+                                            continue
+                                        
+                                        pending.append((response_body['body'], url))
                                         
                                 except Exception as e:
                                     # Solo loguear si es un error relevante
@@ -210,6 +309,20 @@ def get_likes(driver):
             except Exception as e:
                 continue
         
+        # Decodificar todas las respuestas del lote (en paralelo si hay pool de parseo)
+        with metrics.PARSE_BATCH_SECONDS.time():
+            parsed = parsing.parse_all(pending)
+        for (body, url), (users, error) in zip(pending, parsed):
+            # Extraer nombre corto de la API
+            api_name = next((k for k in DATA_URLS if k in url), "API")
+            log_message(f"Datos capturados de: {api_name}", 'api')
+            with metrics.PROCESS_RESPONSE_SECONDS.time():
+                user_ids = apply_parsed(users, error)
+            if user_ids is not None:
+                bodycache.remember_body(url, body, user_ids)
+            processed_count += 1
+            metrics.RESPONSES_PROCESSED.inc()
+        
         # Logging de URLs encontradas para debugging (solo ocasionalmente)
         if found_urls and len(found_urls) % 20 == 0:  # Cada 20 URLs
             unique_urls = list(set([url.split('/')[-1].split('?')[0] for url in found_urls]))
@@ -217,265 +330,109 @@ def get_likes(driver):
                 
     except Exception as e:
         log_message(f"Error obteniendo datos: {str(e)[:100]}", 'error')
+    return len(logs), len(found_urls)
 
 
 def process_response(response_data, url=""):
-    """Procesar respuesta de la API de Bumble"""
+    """Procesar respuesta de la API de Bumble (ids de usuario vistos, None si falla)"""
+    with metrics.PROCESS_RESPONSE_SECONDS.time():
+        return apply_parsed(*parsing.parse_safe(response_data, url))
+
+
+def display_name_for(name):
+    """Nombre para mostrar: los nombres en hebreo se invierten (RTL)"""
     try:
-        response = json.loads(response_data)
-        
-        # Intentar diferentes estructuras de respuesta
-        results = None
-        
-        # Estructura 1: encounters
-        if 'body' in response and isinstance(response['body'], list) and len(response['body']) > 0:
-            body = response['body'][0]
+        if detect(name) == 'he':
+            return name[::-1]
+    except:
+        pass
+    return name
+
+
+def apply_parsed(users, error=None):
+    """Aplicar los usuarios de una respuesta ya parseada (parsing.parse_body)
+    
+    Sesión, BD, log y emits. Devuelve los ids de usuario vistos, o None si
+    la respuesta no se pudo decodificar.
+    """
+    if error:
+        log_message(f"Error procesando respuesta: {error[:80]}", 'error')
+        return None
+    if users is None:
+        return []  # Sin datos relevantes
+    
+    log_message(f"✅ {len(users)} usuarios encontrados", 'api')
+    
+    new_users = 0
+    user_ids = []
+    unchanged = []
+    for user in users:
+        try:
+            user_info = dict(zip(parsing.USER_FIELDS, user))
+            user_info['timestamp'] = datetime.now().strftime("%H:%M:%S %d/%m/%Y")
+            user_id = user_info['id']
+            user_ids.append(user_id)
+            has_voted = user_info['has_voted']
+            city = user_info['city']
+            distance_short = user_info['distance_short']
             
-            # Client encounters (principal para swipe/feed)
-            if 'client_encounters' in body:
-                results = body['client_encounters'].get('results', [])
-            # Client user list (lista de usuarios, beeline)
-            elif 'client_user_list' in body:
-                user_list = body['client_user_list']
-                if 'section' in user_list:
-                    section = user_list['section']
-                    if 'users' in section:
-                        results = section['users']
-                    elif 'items' in section:
-                        results = section['items']
-                elif 'users' in user_list:
-                    results = user_list['users']
-            # Encounters directo
-            elif 'encounters' in body:
-                results = body['encounters']
-            # Sections (beeline alternativo)
-            elif 'section' in body or 'sections' in body:
-                sections = body.get('sections', [body.get('section', {})])
-                for section in sections:
-                    if isinstance(section, dict):
-                        if 'users' in section:
-                            results = section['users']
-                            break
-                        elif 'items' in section:
-                            results = section['items']
-                            break
-            # User list directo
-            elif 'users' in body:
-                results = body['users']
-            # Conversations/Matches
-            elif 'results' in body:
-                results = body['results']
-            # Connections
-            elif 'connections' in body:
-                connections = body['connections']
-                results = []
-                for conn in connections:
-                    if 'user' in conn:
-                        user_data = {
-                            'user': conn['user'],
-                            'has_user_voted': conn.get('has_conversation', False) or conn.get('is_match', True)
-                        }
-                        results.append(user_data)
-        
-        # Estructura 2: directa
-        if not results and 'encounters' in response:
-            results = response['encounters']
+            # Verificar si ya existe
+            known = session_users.get(user_id)
             
-        # Estructura 3: beeline
-        if not results and 'beeline' in response:
-            results = response['beeline']
-        
-        # Estructura 4: matches
-        if not results and 'matches' in response:
-            matches = response['matches']
-            results = []
-            for match in matches:
-                if 'user' in match:
-                    results.append({'user': match['user'], 'has_user_voted': True})
-        
-        # Estructura 5: conversations
-        if not results and 'conversations' in response:
-            conversations = response['conversations']
-            results = []
-            for conv in conversations:
-                if 'person' in conv:
-                    results.append({'user': conv['person'], 'has_user_voted': True})
-                elif 'user' in conv:
-                    results.append({'user': conv['user'], 'has_user_voted': True})
-        
-        if not results:
-            return  # Sin datos relevantes
-        
-        log_message(f"✅ {len(results)} usuarios encontrados", 'api')
-        
-        new_users = 0
-        for user_data in results:
+            if known is not None:
+                # Ya visto en esta sesión: igual que en la sesión, solo last_seen (un lote
+                # por respuesta); si cambió, save_user reescribe las columnas que cambiaron
+                metrics.DUPLICATES_SKIPPED.inc()
+                same_name = user_info['name'] == known['name']
+                user_info['display_name'] = known['display_name'] if same_name else display_name_for(user_info['name'])
+                if schema.content_values(user_info) == schema.content_values(known):
+                    unchanged.append(user_id)
+                else:
+                    db.save_user(user_info)
+                    user_columns.upsert(user_info)
+                continue
+            
+            display_name = display_name_for(user_info['name'])
+            user_info['display_name'] = display_name
+            new_users += 1
+            metrics.USERS_INGESTED.inc()
+            
+            # Agregar al historial (is_new: los clientes pueden sumar a sus contadores)
+            user_info['is_new'] = bool(add_to_history(user_info))
+            session_users.add(user_info)
+            
+            # Determinar tipo de usuario
+            user_type = "Match" if has_voted else "Like Nuevo"
+            
+            # Registrar actividad en la base de datos
             try:
-                # Extraer información del usuario - manejar diferentes estructuras
-                user = user_data.get('user', user_data)
-                
-                if not user or 'user_id' not in user:
-                    continue
-                
-                user_id = user['user_id']
-                
-                # Verificar si ya existe
-                if any(u['id'] == user_id for u in monitor_state['users']):
-                    continue
-                
-                # Extraer foto
-                photo = None
-                if 'albums' in user and user['albums']:
-                    if 'photos' in user['albums'][0] and user['albums'][0]['photos']:
-                        photo_url = user['albums'][0]['photos'][0].get('large_url', '')
-                        if photo_url:
-                            photo = 'https://' + photo_url[2:] if photo_url.startswith('//') else photo_url
-                
-                # Extraer intereses de Facebook
-                interests = []
-                if 'interests' in user and user['interests']:
-                    interests = [interest.get('name', '') for interest in user['interests'][:10]]  # Primeros 10
-                
-                # Extraer campos de perfil (profile_fields)
-                profile_data = {
-                    'education': '',
-                    'height': '',
-                    'smoking': '',
-                    'drinking': '',
-                    'exercise': '',
-                    'pets': '',
-                    'politics': '',
-                    'religion': '',
-                    'zodiac': '',
-                    'dating_intentions': ''
-                }
-                
-                if 'profile_fields' in user and user['profile_fields']:
-                    for field in user['profile_fields']:
-                        field_id = field.get('id', '')
-                        display_value = field.get('display_value', '')
-                        
-                        if 'education' in field_id:
-                            profile_data['education'] = display_value
-                        elif 'height' in field_id:
-                            profile_data['height'] = display_value
-                        elif 'smoking' in field_id:
-                            profile_data['smoking'] = display_value
-                        elif 'drinking' in field_id:
-                            profile_data['drinking'] = display_value
-                        elif 'exercise' in field_id:
-                            profile_data['exercise'] = display_value
-                        elif 'pets' in field_id:
-                            profile_data['pets'] = display_value
-                        elif 'politics' in field_id:
-                            profile_data['politics'] = display_value
-                        elif 'religion' in field_id:
-                            profile_data['religion'] = display_value
-                        elif 'zodiak' in field_id:
-                            profile_data['zodiac'] = display_value
-                        elif 'dating_intentions' in field_id:
-                            profile_data['dating_intentions'] = display_value
-                
-                # Extraer ciudad y país
-                city = user.get('city', {}).get('name', '') if 'city' in user else ''
-                country = user.get('country', {}).get('name', '') if 'country' in user else ''
-                
-                # Extraer distancia
-                distance_short = user.get('distance_short', '')
-                
-                # Estado online
-                online_status = user.get('online_status', 0)
-                
-                # Verificado
-                is_verified = user.get('is_verified', False)
-                
-                # Instagram conectado
-                instagram_connected = False
-                if 'albums' in user:
-                    for album in user['albums']:
-                        if album.get('album_type') == 12 and album.get('external_provider') == 12:
-                            instagram_connected = True
-                            break
-                
-                # Spotify
-                spotify_track = ''
-                if 'spotify_mood_song' in user and user['spotify_mood_song']:
-                    track = user['spotify_mood_song']
-                    if 'name' in track:
-                        spotify_track = f"{track.get('name', '')} - {track.get('artist_name', '')}"
-                
-                # Determinar si ya votaste (matches y conversaciones cuentan como votado)
-                has_voted = user_data.get('has_user_voted', False)
-                if not has_voted:
-                    # Si viene de connections/matches/conversations, marcar como votado
-                    has_voted = 'connections' in url.lower() or 'matches' in url.lower() or 'conversation' in url.lower()
-                
-                user_info = {
-                    'id': user_id,
-                    'name': user.get('name', 'Usuario'),
-                    'age': user.get('age', 0),
-                    'has_voted': has_voted,
-                    'photo': photo,
-                    'timestamp': datetime.now().strftime("%H:%M:%S %d/%m/%Y"),
-                    'interests': interests,
-                    'distance_short': distance_short,
-                    'online_status': online_status,
-                    'is_verified': is_verified,
-                    'instagram_connected': instagram_connected,
-                    'spotify_track': spotify_track,
-                    'city': city,
-                    'country': country,
-                    **profile_data
-                }
-                
-                # Detectar idioma para nombres en hebreo
-                display_name = user_info['name']
-                try:
-                    if detect(display_name) == 'he':
-                        display_name = display_name[::-1]
-                except:
-                    pass
-                
-                user_info['display_name'] = display_name
-                monitor_state['users'].append(user_info)
-                new_users += 1
-                
-                # Agregar al historial
-                add_to_history(user_info)
-                
-                # Determinar tipo de usuario
-                user_type = "Match" if has_voted else "Like Nuevo"
-                
-                # Registrar actividad en la base de datos
-                try:
-                    action_type = 'match' if has_voted else 'like_received'
-                    details = f"{user_info['age']} años, {city or 'ubicación desconocida'}"
-                    if user_info.get('is_verified'):
-                        details += ", verificada"
-                    db.log_activity(action_type, user_id, display_name, details)
-                except:
-                    pass
-                
-                # Log con más información
-                location_info = f"{city}" if city else "Ubicación desconocida"
-                if distance_short:
-                    location_info += f" ({distance_short})"
-                
-                log_message(f"{display_name}, {user_info['age']} años - {location_info} [{user_type}]", 'user')
-                
-                # Enviar nuevo usuario a los clientes
-                socketio.emit('new_user', user_info)
+                action_type = 'match' if has_voted else 'like_received'
+                details = f"{user_info['age']} años, {city or 'ubicación desconocida'}"
+                if user_info.get('is_verified'):
+                    details += ", verificada"
+                db.log_activity(action_type, user_id, display_name, details)
+            except:
+                pass
             
-            except Exception as e:
-                log_message(f"⚠️ Error procesando usuario: {str(e)}", 'warning')
-                continue
+            # Log con más información
+            location_info = f"{city}" if city else "Ubicación desconocida"
+            if distance_short:
+                location_info += f" ({distance_short})"
+            
+            log_message(f"{display_name}, {user_info['age']} años - {location_info} [{user_type}]", 'user')
+            
+            # Enviar nuevo usuario a los clientes
+            emit_new_user(user_info)
         
-        if new_users > 0:
-            update_stats()
-            log_message(f"+{new_users} usuarios nuevos agregados", 'success')
-                
-    except Exception as e:
-        log_message(f"Error procesando respuesta: {str(e)[:80]}", 'error')
+        except Exception as e:
+            log_message(f"⚠️ Error procesando usuario: {str(e)}", 'warning')
+            continue
+    
+    db.touch_users(unchanged)
+    if new_users > 0:
+        update_stats()
+        log_message(f"+{new_users} usuarios nuevos agregados", 'success')
+    return user_ids
 
 
 def load_existing_data(driver):
@@ -486,17 +443,17 @@ def load_existing_data(driver):
         # Navegar a la página de matches/beeline
         log_message("Navegando a Conexiones...", 'chrome')
         driver.get("https://bumble.com/app/connections")
-        sleep(4)
+        settle(4)
         
         # Capturar datos iniciales
         log_message("Analizando Conexiones...", 'api')
         get_likes(driver)
-        sleep(2)
+        settle(2)
         
         # Scroll para cargar más contenido
         try:
             driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-            sleep(2)
+            settle(2)
             get_likes(driver)
         except:
             pass
@@ -505,15 +462,15 @@ def load_existing_data(driver):
         try:
             log_message("Navegando a Beeline (personas que te dieron like)...", 'chrome')
             driver.get("https://bumble.com/app/beeline")
-            sleep(4)
+            settle(4)
             log_message("Analizando Beeline...", 'api')
             get_likes(driver)
-            sleep(2)
+            settle(2)
             
             # Scroll en beeline
             try:
                 driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-                sleep(2)
+                settle(2)
                 get_likes(driver)
             except:
                 pass
@@ -523,9 +480,9 @@ def load_existing_data(driver):
         # Volver al feed principal
         log_message("Volviendo al feed principal...", 'chrome')
         driver.get("https://bumble.com/app")
-        sleep(3)
+        settle(3)
         
-        log_message(f"Carga histórica completada - {len(monitor_state['users'])} usuarios totales", 'success')
+        log_message(f"Carga histórica completada - {len(session_users)} usuarios totales", 'success')
         
     except Exception as e:
         log_message(f"Error cargando datos históricos: {str(e)[:80]}", 'warning')
@@ -546,21 +503,25 @@ def monitor_thread():
         chrome_options.add_experimental_option("detach", True)
         chrome_options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
         
-        monitor_state['driver'] = webdriver.Chrome(options=chrome_options)
-        monitor_state['driver'].get(BUMBLE_URL)
+        driver = webdriver.Chrome(options=chrome_options)
+        if RECORD_FILE:
+            driver = RecordingDriver(driver, RECORD_FILE)
+            log_message(f"Grabando sesión en {RECORD_FILE}", 'debug')
+        monitor_state.update(driver=driver)
+        driver.get(BUMBLE_URL)
         sleep(2)
         
         # Manejar cookies
         cookies = db.load_cookies()
         if cookies:
             log_message("Sesión guardada encontrada", 'success')
-            load_cookies(monitor_state['driver'])
-            monitor_state['driver'].refresh()
+            load_cookies(driver)
+            driver.refresh()
             sleep(2)
         else:
             log_message("Primera ejecución detectada", 'warning')
             log_message("Inicia sesión manualmente en Chrome", 'warning')
-            create_cookies(monitor_state['driver'])
+            create_cookies(driver)
         
         log_message("Monitor activo y funcionando", 'success')
         socketio.emit('status_update', {'status': 'running'})
@@ -569,248 +530,73 @@ def monitor_thread():
         log_message("-" * 50, 'info')
         log_message("FASE 1: Cargando datos históricos", 'info')
         log_message("-" * 50, 'info')
-        load_existing_data(monitor_state['driver'])
+        load_existing_data(driver)
         
         log_message("-" * 50, 'info')
         log_message("FASE 2: Monitoreo en tiempo real activo", 'info')
         log_message("Navega por Bumble para detectar quién te dio like", 'info')
         log_message("-" * 50, 'info')
         
-        initial_page_source = monitor_state['driver'].page_source if monitor_state['driver'] else ''
-        check_counter = 0
-        autolike_counter = 0
+        page = {'source': driver.page_source if driver else '', 'autolike_attempts': 0}
         
-        while monitor_state['running']:
-            # Verificar que el driver sigue activo
-            if not monitor_state['driver']:
-                log_message("Driver no disponible, deteniendo...", 'error')
-                break
-            
+        def check_chrome():
+            # Verificar que Chrome sigue abierto
             try:
-                # Verificar que Chrome sigue abierto
-                if not monitor_state['driver'].service.process:
+                current_driver = monitor_state['driver']
+                if not current_driver or not current_driver.service.process:
                     log_message("Chrome se cerró, deteniendo monitor...", 'warning')
-                    break
+                    monitor_scheduler.stop()
             except:
                 log_message("Error verificando Chrome, deteniendo...", 'error')
-                break
-            
-            # Actualizar tiempo
-            update_stats()
-            
-            # Verificar logs cada vez
-            check_counter += 1
-            if check_counter % 2 == 0 and monitor_state['driver']:  # Cada 2 segundos
-                try:
-                    get_likes(monitor_state['driver'])
-                except Exception as e:
-                    log_message(f"Error obteniendo datos: {str(e)[:50]}", 'debug')
-            
-            # Autolike si está activado
-            if monitor_state['autolike_enabled'] and monitor_state['driver']:
-                autolike_counter += 1
-                # Ejecutar autolike según el delay configurado
-                if autolike_counter >= monitor_state['autolike_delay']:
-                    autolike_counter = 0
-                    try:
-                        # Sistema de autolike mejorado con múltiples estrategias
-                        script = """
-                            (function() {
-                                let likeBtn = null;
-                                let method = '';
-                                
-                                // ======== ESTRATEGIAS DE DETECCIÓN ========
-                                
-                                // Estrategia 1: data-qa-role (más confiable en Bumble 2024-2026)
-                                likeBtn = document.querySelector('[data-qa-role="encounters-action-like"]');
-                                if (likeBtn) method = 'data-qa-role';
-                                
-                                // Estrategia 2: Clase encounters-action--like
-                                if (!likeBtn) {
-                                    likeBtn = document.querySelector('.encounters-action--like');
-                                    if (likeBtn) method = 'encounters-action-class';
-                                }
-                                
-                                // Estrategia 3: aria-label específico
-                                if (!likeBtn) {
-                                    const ariaSelectors = [
-                                        '[aria-label="Me gusta"]',
-                                        '[aria-label="Like"]', 
-                                        '[aria-label="Yes"]',
-                                        '[aria-label*="like" i]',
-                                        '[aria-label*="gusta" i]'
-                                    ];
-                                    for (let sel of ariaSelectors) {
-                                        likeBtn = document.querySelector(sel);
-                                        if (likeBtn) {
-                                            method = 'aria-label';
-                                            break;
-                                        }
-                                    }
-                                }
-                                
-                                // Estrategia 4: Icono floating-action-yes
-                                if (!likeBtn) {
-                                    const likeIcon = document.querySelector('[data-qa-icon-name="floating-action-yes"]');
-                                    if (likeIcon) {
-                                        likeBtn = likeIcon.closest('[role="button"], button, .encounters-action');
-                                        if (likeBtn) method = 'floating-action-icon';
-                                    }
-                                }
-                                
-                                // Estrategia 5: Contenedor encounters-controls con múltiples botones
-                                if (!likeBtn) {
-                                    const containers = [
-                                        '.encounters-controls__action',
-                                        '.encounters-controls',
-                                        '.encounters-action-buttons'
-                                    ];
-                                    for (let cont of containers) {
-                                        const actions = document.querySelectorAll(cont + ' [role="button"]');
-                                        if (actions.length >= 2) {
-                                            // El like suele ser el último o segundo botón
-                                            likeBtn = actions[actions.length - 1] || actions[1];
-                                            method = 'encounters-controls-container';
-                                            break;
-                                        }
-                                    }
-                                }
-                                
-                                // Estrategia 6: Buscar botones con SVG de corazón o checkmark
-                                if (!likeBtn) {
-                                    const buttons = document.querySelectorAll('[role="button"], button');
-                                    for (let btn of buttons) {
-                                        const svg = btn.querySelector('svg');
-                                        if (svg) {
-                                            const path = svg.innerHTML.toLowerCase();
-                                            // Buscar paths típicos de corazón o checkmark
-                                            if (path.includes('heart') || path.includes('check') || 
-                                                path.includes('m12') || path.includes('like')) {
-                                                // Verificar que no sea el de superlike (estrella)
-                                                if (!path.includes('star')) {
-                                                    likeBtn = btn;
-                                                    method = 'svg-heart';
-                                                    break;
-                                                }
-                                            }
-                                        }
-                                    }
-                                }
-                                
-                                // Estrategia 7: Color verde característico de Bumble
-                                if (!likeBtn) {
-                                    const buttons = Array.from(document.querySelectorAll('[role="button"], button'));
-                                    for (let btn of buttons) {
-                                        const style = window.getComputedStyle(btn);
-                                        const bgColor = style.backgroundColor || '';
-                                        const color = style.color || '';
-                                        // Verde de Bumble: rgb(0, 217, 95) o similar
-                                        if (bgColor.includes('0, 217, 95') || color.includes('0, 217, 95') ||
-                                            bgColor.includes('0,217,95') || bgColor.includes('rgb(0, 210') ||
-                                            bgColor.includes('rgb(76, 217') || bgColor.includes('#00d95f')) {
-                                            likeBtn = btn;
-                                            method = 'green-color';
-                                            break;
-                                        }
-                                    }
-                                }
-                                
-                                // Estrategia 8: Keyboard shortcut simulation
-                                if (!likeBtn) {
-                                    // Algunos sitios responden a tecla de flecha derecha o Enter
-                                    const encounter = document.querySelector('.encounter, .encounters-story-profile');
-                                    if (encounter) {
-                                        // Marcar que intentamos keyboard
-                                        method = 'keyboard-fallback';
-                                    }
-                                }
-                                
-                                // ======== VERIFICACIÓN Y CLIC ========
-                                
-                                if (likeBtn) {
-                                    // Verificar que esté habilitado
-                                    const isDisabled = likeBtn.disabled || 
-                                                      likeBtn.getAttribute('aria-disabled') === 'true' ||
-                                                      likeBtn.getAttribute('tabindex') === '-1' ||
-                                                      likeBtn.classList.contains('disabled');
-                                    
-                                    if (!isDisabled) {
-                                        // Simular interacción más natural
-                                        likeBtn.focus();
-                                        
-                                        // Dispatch eventos para mejor compatibilidad
-                                        const events = ['mouseenter', 'mouseover', 'mousedown', 'mouseup', 'click'];
-                                        events.forEach(eventType => {
-                                            const event = new MouseEvent(eventType, {
-                                                view: window,
-                                                bubbles: true,
-                                                cancelable: true
-                                            });
-                                            likeBtn.dispatchEvent(event);
-                                        });
-                                        
-                                        return JSON.stringify({status: 'clicked', method: method});
-                                    }
-                                    return JSON.stringify({status: 'disabled', method: method});
-                                }
-                                
-                                // Información de debug
-                                const debugInfo = {
-                                    hasEncounters: !!document.querySelector('.encounters'),
-                                    hasControls: !!document.querySelector('.encounters-controls'),
-                                    buttonCount: document.querySelectorAll('[role="button"]').length,
-                                    url: window.location.pathname
-                                };
-                                
-                                return JSON.stringify({status: 'not_found', debug: debugInfo});
-                            })();
-                        """
-                        result_str = monitor_state['driver'].execute_script(script)
-                        result = json.loads(result_str) if result_str else {'status': 'error'}
-                        
-                        if result.get('status') == 'clicked':
-                            monitor_state['autolike_count'] += 1
-                            method_used = result.get('method', 'unknown')
-                            log_message(f"✅ Autolike #{monitor_state['autolike_count']} enviado (método: {method_used})", 'success')
-                            
-                            # Registrar en activity log
-                            try:
-                                db.log_activity('autolike', None, None, f"Autolike #{monitor_state['autolike_count']} via {method_used}")
-                            except:
-                                pass
-                            
-                            socketio.emit('autolike_status', {
-                                'enabled': monitor_state['autolike_enabled'],
-                                'delay': monitor_state['autolike_delay'],
-                                'count': monitor_state['autolike_count']
-                            })
-                            
-                        elif result.get('status') == 'disabled':
-                            if autolike_counter % 5 == 0:
-                                log_message(f"⏸ Botón encontrado ({result.get('method')}) pero deshabilitado", 'debug')
-                                
-                        else:
-                            # Log debug info cada 10 intentos
-                            if autolike_counter % 10 == 0:
-                                debug = result.get('debug', {})
-                                log_message(f"🔍 Buscando botón... (encounters:{debug.get('hasEncounters')}, buttons:{debug.get('buttonCount')})", 'debug')
-                                
-                    except Exception as e:
-                        log_message(f"Error en autolike: {str(e)[:50]}", 'debug')
-            
+                monitor_scheduler.stop()
+        
+        def capture():
+            try:
+                events, relevant = get_likes(driver, wait=0)
+            except Exception as e:
+                log_message(f"Error obteniendo datos: {str(e)[:50]}", 'debug')
+                return None
+            if relevant:
+                # Las respuestas llegan en ráfagas y la página suele cambiar con ellas
+                monitor_scheduler.wake('capture', CAPTURE_FOLLOWUP)
+                monitor_scheduler.wake('page_check')
+            return events > 0
+        
+        def check_page():
             # También verificar cambios en la página
             try:
-                if monitor_state['driver']:
-                    current_page_source = monitor_state['driver'].page_source
-                    
-                    if current_page_source != initial_page_source:
-                        log_message("Cambio en la página detectado, analizando...", 'debug')
-                        get_likes(monitor_state['driver'])
-                        initial_page_source = current_page_source
+                current_page_source = driver.page_source
             except Exception as e:
                 log_message(f"Error leyendo página: {str(e)[:30]}", 'debug')
-                
-            sleep(1)
+                return None
+            if current_page_source == page['source']:
+                return False
+            log_message("Cambio en la página detectado, analizando...", 'debug')
+            page['source'] = current_page_source
+            monitor_scheduler.wake('capture')
+            return True
+        
+        def autolike():
+            # Sin autolike activado la tarea se espacia; toggle_autolike la reprograma
+            if not monitor_state['autolike_enabled']:
+                return False
+            page['autolike_attempts'] += 1
+            run_autolike(driver, page['autolike_attempts'])
+            return True
+        
+        delay = monitor_state['autolike_delay']
+        monitor_scheduler.clear()
+        monitor_scheduler.add(scheduler.Task('chrome_check', check_chrome, CHROME_CHECK_INTERVAL))
+        monitor_scheduler.add(scheduler.Task('stats', update_stats, STATS_INTERVAL, on_pause=scheduler.SKIP))
+        monitor_scheduler.add(scheduler.Task('capture', capture, *CAPTURE_INTERVAL, on_pause=scheduler.SLOW))
+        monitor_scheduler.add(scheduler.Task('page_check', check_page, *PAGE_CHECK_INTERVAL, on_pause=scheduler.SLOW))
+        monitor_scheduler.add(scheduler.Task('autolike', autolike, delay, max(delay, AUTOLIKE_IDLE_INTERVAL)))
+        if backup.BACKUP_INTERVAL > 0:
+            monitor_scheduler.add(scheduler.Task('backup', scheduled_backup, BACKUP_CHECK_INTERVAL))
+        monitor_scheduler.add(scheduler.Task('retention', retention_step, *RETENTION_INTERVAL, idle=True))
+        monitor_scheduler.set_paused(not connected_clients)
+        if monitor_state['running']:
+            monitor_scheduler.run()
             
     except Exception as e:
         log_message(f"Error crítico: {str(e)[:100]}", 'error')
@@ -820,34 +606,254 @@ def monitor_thread():
             stop_monitoring()
 
 
+def run_autolike(driver, attempt):
+    """Pulsar el botón de like de la página actual (intento número `attempt`)"""
+    try:
+        # Sistema de autolike mejorado con múltiples estrategias
+        script = """
+            (function() {
+                let likeBtn = null;
+                let method = '';
+    
+                // ======== ESTRATEGIAS DE DETECCIÓN ========
+    
+                // Estrategia 1: data-qa-role (más confiable en Bumble 2024-2026)
+                likeBtn = document.querySelector('[data-qa-role="encounters-action-like"]');
+                if (likeBtn) method = 'data-qa-role';
+    
+                // Estrategia 2: Clase encounters-action--like
+                if (!likeBtn) {
+                    likeBtn = document.querySelector('.encounters-action--like');
+                    if (likeBtn) method = 'encounters-action-class';
+                }
+    
+                // Estrategia 3: aria-label específico
+                if (!likeBtn) {
+                    const ariaSelectors = [
+                        '[aria-label="Me gusta"]',
+                        '[aria-label="Like"]', 
+                        '[aria-label="Yes"]',
+                        '[aria-label*="like" i]',
+                        '[aria-label*="gusta" i]'
+                    ];
+                    for (let sel of ariaSelectors) {
+                        likeBtn = document.querySelector(sel);
+                        if (likeBtn) {
+                            method = 'aria-label';
+                            break;
+                        }
+                    }
+                }
+    
+                // Estrategia 4: Icono floating-action-yes
+                if (!likeBtn) {
+                    const likeIcon = document.querySelector('[data-qa-icon-name="floating-action-yes"]');
+                    if (likeIcon) {
+                        likeBtn = likeIcon.closest('[role="button"], button, .encounters-action');
+                        if (likeBtn) method = 'floating-action-icon';
+                    }
+                }
+    
+                // Estrategia 5: Contenedor encounters-controls con múltiples botones
+                if (!likeBtn) {
+                    const containers = [
+                        '.encounters-controls__action',
+                        '.encounters-controls',
+                        '.encounters-action-buttons'
+                    ];
+                    for (let cont of containers) {
+                        const actions = document.querySelectorAll(cont + ' [role="button"]');
+                        if (actions.length >= 2) {
+                            // El like suele ser el último o segundo botón
+                            likeBtn = actions[actions.length - 1] || actions[1];
+                            method = 'encounters-controls-container';
+                            break;
+                        }
+                    }
+                }
+    
+                // Estrategia 6: Buscar botones con SVG de corazón o checkmark
+                if (!likeBtn) {
+                    const buttons = document.querySelectorAll('[role="button"], button');
+                    for (let btn of buttons) {
+                        const svg = btn.querySelector('svg');
+                        if (svg) {
+                            const path = svg.innerHTML.toLowerCase();
+                            // Buscar paths típicos de corazón o checkmark
+                            if (path.includes('heart') || path.includes('check') || 
+                                path.includes('m12') || path.includes('like')) {
+                                // Verificar que no sea el de superlike (estrella)
+                                if (!path.includes('star')) {
+                                    likeBtn = btn;
+                                    method = 'svg-heart';
+                                    break;
+                                }
+                            }
+                        }
+                    }
+                }
+    
+                // Estrategia 7: Color verde característico de Bumble
+                if (!likeBtn) {
+                    const buttons = Array.from(document.querySelectorAll('[role="button"], button'));
+                    for (let btn of buttons) {
+                        const style = window.getComputedStyle(btn);
+                        const bgColor = style.backgroundColor || '';
+                        const color = style.color || '';
+                        // Verde de Bumble: rgb(0, 217, 95) o similar
+                        if (bgColor.includes('0, 217, 95') || color.includes('0, 217, 95') ||
+                            bgColor.includes('0,217,95') || bgColor.includes('rgb(0, 210') ||
+                            bgColor.includes('rgb(76, 217') || bgColor.includes('#00d95f')) {
+                            likeBtn = btn;
+                            method = 'green-color';
+                            break;
+                        }
+                    }
+                }
+    
+                // Estrategia 8: Keyboard shortcut simulation
+                if (!likeBtn) {
+                    // Algunos sitios responden a tecla de flecha derecha o Enter
+                    const encounter = document.querySelector('.encounter, .encounters-story-profile');
+                    if (encounter) {
+                        // Marcar que intentamos keyboard
+                        method = 'keyboard-fallback';
+                    }
+                }
+    
+                // ======== VERIFICACIÓN Y CLIC ========
+    
+                if (likeBtn) {
+                    // Verificar que esté habilitado
+                    const isDisabled = likeBtn.disabled || 
+                                      likeBtn.getAttribute('aria-disabled') === 'true' ||
+                                      likeBtn.getAttribute('tabindex') === '-1' ||
+                                      likeBtn.classList.contains('disabled');
+    
+                    if (!isDisabled) {
+                        // Simular interacción más natural
+                        likeBtn.focus();
+    
+                        // Dispatch eventos para mejor compatibilidad
+                        const events = ['mouseenter', 'mouseover', 'mousedown', 'mouseup', 'click'];
+                        events.forEach(eventType => {
+                            const event = new MouseEvent(eventType, {
+                                view: window,
+                                bubbles: true,
+                                cancelable: true
+                            });
+                            likeBtn.dispatchEvent(event);
+                        });
+    
+                        return JSON.stringify({status: 'clicked', method: method});
+                    }
+                    return JSON.stringify({status: 'disabled', method: method});
+                }
+    
+                // Información de debug
+                const debugInfo = {
+                    hasEncounters: !!document.querySelector('.encounters'),
+                    hasControls: !!document.querySelector('.encounters-controls'),
+                    buttonCount: document.querySelectorAll('[role="button"]').length,
+                    url: window.location.pathname
+                };
+    
+                return JSON.stringify({status: 'not_found', debug: debugInfo});
+            })();
+        """
+        result_str = driver.execute_script(script)
+        result = json.loads(result_str) if result_str else {'status': 'error'}
+    
+        if result.get('status') == 'clicked':
+            current = monitor_state.increment('autolike_count')
+            method_used = result.get('method', 'unknown')
+            log_message(f"✅ Autolike #{current.autolike_count} enviado (método: {method_used})", 'success')
+    
+            # Registrar en activity log
+            try:
+                db.log_activity('autolike', None, None, f"Autolike #{current.autolike_count} via {method_used}")
+            except:
+                pass
+    
+            socketio.emit('autolike_status', autolike_status(current))
+    
+        elif result.get('status') == 'disabled':
+            if attempt % 5 == 0:
+                log_message(f"⏸ Botón encontrado ({result.get('method')}) pero deshabilitado", 'debug')
+    
+        else:
+            # Log debug info cada 10 intentos
+            if attempt % 10 == 0:
+                debug = result.get('debug', {})
+                log_message(f"🔍 Buscando botón... (encounters:{debug.get('hasEncounters')}, buttons:{debug.get('buttonCount')})", 'debug')
+    
+    except Exception as e:
+        log_message(f"Error en autolike: {str(e)[:50]}", 'debug')
+
+def report_backup(status):
+    """Progreso de la copia de seguridad en curso, y un log al terminar"""
+    socketio.emit('backup_progress', status)
+    if status['running']:
+        return
+    if status['error']:
+        log_message(f"⚠️ Error en la copia de seguridad: {status['error']}", 'error')
+    else:
+        size = status['bytes'] / (1024 * 1024)
+        log_message(f"💾 Copia de seguridad creada: {os.path.basename(status['path'])} ({size:.1f} MB)", 'success')
+
+
+def scheduled_backup():
+    """Tarea del planificador: copia en su thread si la última tiene más de BACKUP_INTERVAL"""
+    if backup.due() and backup_job.start():
+        log_message("💾 Copia de seguridad programada iniciada", 'info')
+
+
+def retention_step():
+    """Tarea de reposo del planificador: un lote al archivo o un paso de vacuum (ver retention.py)"""
+    try:
+        done = retention.step()
+    except Exception as e:
+        log_message(f"⚠️ Error en la retención: {str(e)[:100]}", 'warning')
+        return False
+    if done.get('users'):
+        user_columns.invalidate()
+        current = monitor_state.update(history_total=db.count_users())
+        socketio.emit('history_update', {'total': current.history_total})
+    return bool(done)
+
+
 def stop_monitoring():
     """Detener el monitoreo"""
     log_message("=" * 50, 'info')
     log_message("DETENIENDO MONITOR", 'warning')
     log_message("=" * 50, 'info')
     
-    monitor_state['running'] = False
+    driver = monitor_state['driver']
+    if not monitor_state.compare_and_set('driver', driver, running=False, driver=None):
+        driver = None  # Otro stop_monitoring ya lo cerró
+    monitor_scheduler.stop()
+    db.flush_touches()
     
-    if monitor_state['driver']:
+    if driver:
         try:
-            monitor_state['driver'].quit()
+            driver.quit()
             log_message("Chrome cerrado correctamente", 'success')
         except:
             log_message("Error al cerrar Chrome", 'warning')
-        monitor_state['driver'] = None
     
-    log_message(f"Sesión finalizada - {len(monitor_state['users'])} usuarios totales", 'info')
+    log_message(f"Sesión finalizada - {len(session_users)} usuarios totales", 'info')
     socketio.emit('status_update', {'status': 'stopped'})
     log_message("⏸️ Monitoreo detenido", 'warning')
 
 
 def enrich_profiles():
     """Enriquecer perfiles con datos completos abriendo cada uno"""
-    if not monitor_state['running'] or not monitor_state['driver']:
+    current = monitor_state.snapshot()
+    if not current.running or not current.driver:
         log_message("Monitor no está activo", 'error')
         return
     
-    driver = monitor_state['driver']
+    driver = current.driver
     
     try:
         # Obtener usuarios sin datos completos (sin intereses)
@@ -1014,50 +1020,277 @@ def stats_page():
     return render_template('stats.html')
 
 
+@app.route('/metrics')
+def metrics_endpoint():
+    """Métricas de instrumentación en formato Prometheus"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+def users_page_response(route, matches_only):
+    """Página de usuarios (?cursor=&limit=) con ETag de la versión de users"""
+    cursor = request.args.get('cursor') or None
+    try:
+        db.parse_page_cursor(cursor)
+        limit = min(max(int(request.args.get('limit', API_PAGE_SIZE)), 1), API_MAX_PAGE_SIZE)
+    except ValueError:
+        return jsonify({'error': 'cursor o limit no válidos'}), 400
+    
+    def build():
+        users, next_cursor = db.get_users_page(cursor, limit, matches_only)
+        total = db.get_stats()['matches'] if matches_only else db.count_users()
+        return {'users': users, 'next_cursor': next_cursor, 'total': total}
+    return httpcache.json_response(httpcache.etag_for(route, ('users',), cursor, limit), build)
+
+
+@app.route('/api/history')
+def api_history():
+    """Historial completo por páginas (seguir next_cursor hasta null)"""
+    return users_page_response('history', matches_only=False)
+
+
+@app.route('/api/matches')
+def api_matches():
+    """Matches por páginas (seguir next_cursor hasta null)"""
+    return users_page_response('matches', matches_only=True)
+
+
+@app.route('/api/stats')
+def api_stats():
+    """El mismo payload que full_stats"""
+    etag = httpcache.etag_for('stats', ('users', 'activity_log'), monitor_state['autolike_count'])
+    return httpcache.json_response(etag, full_stats)
+
+
+def _time_param(name):
+    """?since= / ?until= como datetime (epoch o fecha ISO), None si falta; ValueError si no es válido"""
+    value = request.args.get(name)
+    return export.parse_time(value) if value else None
+
+
+@app.route('/api/users/seen')
+def api_users_seen():
+    """Usuarios vistos por última vez entre ?since= y ?until=, del más reciente al más antiguo"""
+    try:
+        since, until = _time_param('since'), _time_param('until')
+        limit = min(max(int(request.args.get('limit', API_PAGE_SIZE)), 1), API_MAX_PAGE_SIZE)
+    except ValueError:
+        return jsonify({'error': 'since, until o limit no válidos'}), 400
+    
+    etag = httpcache.etag_for('users_seen', ('users',), since, until, limit)
+    return httpcache.json_response(etag, lambda: {'users': db.get_users_seen_between(since, until, limit)})
+
+
+@app.route('/api/users/nearby')
+def api_users_nearby():
+    """Usuarios entre ?min_km= y ?max_km=, del más cercano al más lejano"""
+    try:
+        max_km = float(request.args['max_km'])
+        min_km = float(request.args.get('min_km', 0))
+        limit = min(max(int(request.args.get('limit', API_PAGE_SIZE)), 1), API_MAX_PAGE_SIZE)
+    except (KeyError, ValueError):
+        return jsonify({'error': 'max_km, min_km o limit no válidos'}), 400
+    
+    etag = httpcache.etag_for('users_nearby', ('users',), min_km, max_km, limit)
+    return httpcache.json_response(etag, lambda: {'users': db.get_users_within_km(max_km, min_km, limit)})
+
+
+@app.route('/api/detections/hourly')
+def api_detections_hourly():
+    """Usuarios nuevos por hora entre ?since= y ?until=: [[inicio de la hora en epoch, cantidad]]"""
+    try:
+        since, until = _time_param('since'), _time_param('until')
+    except ValueError:
+        return jsonify({'error': 'since o until no válidos'}), 400
+    
+    etag = httpcache.etag_for('detections_hourly', ('users',), since, until)
+    return httpcache.json_response(etag, lambda: {'hours': db.get_detections_per_hour(since, until)})
+
+
+EXPORT_PARAMS = ('columns', 'since', 'until', 'limit')  # el resto de parámetros son filtros
+
+
+@app.route('/export/<table>.<fmt>')
+def export_table(table, fmt):
+    """Exportar users, activity_log o stats en NDJSON o CSV, en streaming
+
+    ?columns=a,b&since=&until=&limit= y columna=valor como filtros de igualdad.
+    """
+    args = request.args
+    columns = args.get('columns')
+    filters = {key: value for key, value in args.items() if key not in EXPORT_PARAMS}
+    try:
+        lines = export.stream(table, fmt, columns.split(',') if columns else None, filters,
+                              args.get('since'), args.get('until'), args.get('limit'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    response = Response(lines, mimetype=export.MIMETYPES[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename="{export.filename(table, fmt)}"'
+    return response
+
+
+def stream_users(name, data, matches_only=False):
+    """Enviar usuarios al cliente en bloques de tamaño fijo leídos con un cursor
+    
+    Las peticiones del mismo stream que llegan antes del primer bloque se
+    unen a la que está en curso: una sola lectura, un envío por cliente.
+    """
+    stream = {
+        'sid': request.sid,
+        'stream_id': (data or {}).get('stream_id') or uuid.uuid4().hex,
+        'cancel': threading.Event(),
+        # Control de flujo: como mucho STREAM_WINDOW bloques sin confirmar en vuelo
+        'window': threading.Semaphore(STREAM_WINDOW),
+        'sent': 0
+    }
+    active_streams[(stream['sid'], stream['stream_id'])] = stream['cancel']
+    flight = stream_flights.join(name, stream)
+    if flight is None:
+        return  # Lo envía la petición que dirige el vuelo
+    
+    # Los matches se cachean hasta la próxima escritura (varias pestañas, una consulta);
+    # el historial completo se lee siempre con el cursor (memoria constante)
+    chunks = db.get_match_chunks() if matches_only else db.iter_users()
+    streams = None
+    try:
+        for index, chunk in enumerate(chunks):
+            if streams is None:
+                streams = stream_flights.close(flight)
+            encoded = {}  # un bloque se codifica una vez por formato
+            for stream in streams:
+                fmt = wire_formats.get(stream['sid'], wire.JSON)
+                if fmt not in encoded:
+                    encoded[fmt] = wire.encode_users(chunk, fmt)
+                send_chunk(name, stream, index, encoded[fmt], len(chunk))
+            if all(stream['cancel'].is_set() for stream in streams):
+                break
+    finally:
+        if streams is None:
+            streams = stream_flights.close(flight)
+        for stream in streams:
+            socketio.emit(f'{name}_done', {
+                'stream_id': stream['stream_id'],
+                'total': stream['sent'],
+                'cancelled': stream['cancel'].is_set()
+            }, to=stream['sid'])
+            active_streams.pop((stream['sid'], stream['stream_id']), None)
+
+
+def send_chunk(name, stream, index, users, count):
+    """Enviar un bloque a un cliente, esperando su confirmación si tiene la ventana llena"""
+    cancel = stream['cancel']
+    waited = 0
+    while not cancel.is_set() and not stream['window'].acquire(timeout=0.5):
+        waited += 0.5
+        if waited >= STREAM_ACK_TIMEOUT:
+            cancel.set()
+    if cancel.is_set():
+        return
+    socketio.emit(f'{name}_chunk', {
+        'stream_id': stream['stream_id'],
+        'index': index,
+        'users': users
+    }, to=stream['sid'], callback=stream['window'].release)
+    stream['sent'] += count
+
+
 @socketio.on('get_matches')
-def handle_get_matches():
-    """Obtener matches"""
-    matches = db.get_matches()
-    emit('matches_data', {'matches': matches})
+def handle_get_matches(data=None):
+    """Enviar matches en bloques"""
+    stream_users('matches', data, matches_only=True)
+
+
+@socketio.on('cancel_stream')
+def handle_cancel_stream(data):
+    """Cancelar un stream en curso de este cliente"""
+    cancel = active_streams.get((request.sid, data.get('stream_id')))
+    if cancel:
+        cancel.set()
 
 
 @socketio.on('get_full_stats')
 def handle_get_full_stats():
-    """Obtener estadísticas completas"""
-    stats = db.get_stats()
-    all_users = db.get_all_users()
+    """Obtener estadísticas completas con las series de los gráficos ya calculadas
     
-    # Distribución por edad
-    age_distribution = {}
-    city_distribution = {}
+    Con varias pestañas abiertas, cada new_user hace que todas las pidan a la
+    vez: la primera las calcula y se envían una sola vez a la sala de las que
+    esperaban.
+    """
+    flight = stats_flights.join('full_stats', request.sid)
+    if flight is None:
+        return
+    try:
+        event, payload = 'full_stats', full_stats()
+    except Exception as e:
+        # Las pestañas que esperaban este vuelo también reciben el error
+        log_message(f"Error calculando estadísticas: {str(e)[:100]}", 'error')
+        event, payload = 'full_stats_error', {'error': str(e)}
+    finally:
+        waiters = stats_flights.close(flight)
+    room = f'flight:full_stats:{id(flight)}'
+    for sid in waiters:
+        join_room(room, sid=sid)
+    socketio.emit(event, payload, to=room)
+    close_room(room)
+
+
+def full_stats():
+    """Payload de full_stats"""
+    stats = db.get_stats()
+    city_rows = db.get_city_distribution()
     
-    for user in all_users:
-        age = user.get('age', 0)
-        if age > 0:
-            age_distribution[age] = age_distribution.get(age, 0) + 1
-        
-        city = user.get('city', '')
-        if city:
-            city_distribution[city] = city_distribution.get(city, 0) + 1
+    # Edades, tramos, proporciones y horas sobre las columnas en memoria
+    analysis = user_columns.summary(expected_rows=stats['total'])
+    match_rate = round(stats['matches'] / stats['total'] * 100, 1) if stats['total'] else 0.0
     
     # Actividad reciente
     recent_activity = db.get_activity_log(50)
     
-    emit('full_stats', {
+    return {
         'stats': stats,
-        'age_distribution': age_distribution,
-        'city_distribution': city_distribution,
+        'age_series': analysis['age_series'],
+        'city_distribution': dict(city_rows),
+        'top_cities': city_rows[:TOP_CITIES],
+        'summary': {
+            'average_age': analysis['average_age'],
+            'median_age': analysis['median_age'],
+            'match_rate': match_rate
+        },
+        'age_percentiles': analysis['age_percentiles'],
+        'age_buckets': analysis['age_buckets'],
+        'ratios': analysis['ratios'],
+        'hours': analysis['hours'],
         'recent_activity': recent_activity,
         'autolike_count': monitor_state['autolike_count']
-    })
+    }
+
+
+@socketio.on('get_metrics')
+def handle_get_metrics():
+    """Enviar resumen de métricas para el panel en vivo"""
+    emit('metrics_data', metrics.snapshot())
+
+
+@socketio.on('set_log_levels')
+def handle_set_log_levels(data):
+    """Cambiar los niveles de log que recibe este cliente"""
+    added, removed = log_subscriptions.set(request.sid, data.get('types', logbuffer.DEFAULT_TYPES))
+    for msg_type in added:
+        join_room(logbuffer.room_for(msg_type))
+    for msg_type in removed:
+        leave_room(logbuffer.room_for(msg_type))
+    
+    if data.get('replay'):
+        emit('log_backlog', {
+            'entries': log_buffer.recent(logbuffer.BACKLOG_SIZE, log_subscriptions.get(request.sid))
+        })
 
 
 @socketio.on('start_monitoring')
 def handle_start_monitoring():
     """Iniciar monitoreo"""
-    if not monitor_state['running']:
-        monitor_state['running'] = True
-        monitor_state['start_time'] = datetime.now()
+    # Solo una transición a "running" aunque lo pidan dos pestañas a la vez
+    if monitor_state.compare_and_set('running', False, running=True, start_time=datetime.now()):
         
         # Cargar historial al iniciar
         load_history()
@@ -1080,7 +1313,8 @@ def handle_stop_monitoring():
 @socketio.on('clear_data')
 def handle_clear_data():
     """Limpiar datos"""
-    monitor_state['users'] = []
+    session_users.clear()
+    bodycache.clear()  # Volver a procesar las respuestas aunque se repitan
     log_message("🗑️ Datos limpiados", 'info')
     emit('data_cleared', broadcast=True)
     update_stats()
@@ -1098,10 +1332,24 @@ def handle_reset_cookies():
         emit('cookies_reset', {'success': False, 'message': 'Error eliminando cookies'})
 
 
+@socketio.on('create_backup')
+def handle_create_backup(data=None):
+    """Copia de seguridad manual; el progreso llega como backup_progress"""
+    compress = bool((data or {}).get('gzip', backup.BACKUP_GZIP))
+    if not backup_job.start(compress=compress):
+        emit('backup_progress', backup_job.status())
+
+
+@socketio.on('get_backups')
+def handle_get_backups():
+    """Copias existentes y la que esté en curso"""
+    emit('backups_list', {'backups': backup.list_backups(), 'status': backup_job.status()})
+
+
 @socketio.on('get_users')
 def handle_get_users():
-    """Enviar lista de usuarios actual"""
-    emit('users_list', {'users': monitor_state['users']})
+    """Enviar lista de usuarios actual (la ventana en memoria; total incluye los expulsados)"""
+    emit('users_list', {'users': users_payload(session_users.window()), 'total': len(session_users)})
 
 
 @socketio.on('enrich_profiles')
@@ -1118,67 +1366,81 @@ def handle_enrich_profiles():
 
 
 @socketio.on('get_history')
-def handle_get_history():
-    """Enviar historial de usuarios"""
-    # Obtener todos los usuarios de la base de datos
-    all_users = db.get_all_users()
-    
-    # Convertir a formato compatible con el frontend
-    users_data = []
-    for user in all_users:
-        user_dict = {
-            'id': user.get('id'),
-            'name': user.get('name'),
-            'age': user.get('age'),
-            'photo': user.get('photo'),
-            'interests': user.get('interests'),
-            'education': user.get('education'),
-            'politics': user.get('politics'),
-            'religion': user.get('religion'),
-            'height': user.get('height'),
-            'smoking': user.get('smoking'),
-            'drinking': user.get('drinking'),
-            'exercise': user.get('exercise'),
-            'pets': user.get('pets'),
-            'zodiac': user.get('zodiac'),
-            'dating_intentions': user.get('dating_intentions'),
-            'instagram_connected': user.get('instagram_connected'),
-            'spotify_track': user.get('spotify_track'),
-            'city': user.get('city'),
-            'country': user.get('country'),
-            'distance_short': user.get('distance_short'),
-            'online_status': user.get('online_status'),
-            'is_verified': user.get('is_verified'),
-            'detected_at': user.get('detected_at', datetime.now().isoformat())
-        }
-        users_data.append(user_dict)
-    
-    # Enviar al frontend
-    emit('history_data', {'users': users_data})
-    emit('history_list', {'history': monitor_state['history']})
+def handle_get_history(data=None):
+    """Enviar historial de usuarios en bloques"""
+    stream_users('history', data)
+
+
+def _int_param(value, default):
+    """Entero de un payload del cliente; `default` si falta o no es un número"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+@socketio.on('search_history')
+def handle_search_history(data=None):
+    """Buscar en el historial con el índice de texto completo"""
+    data = data or {}
+    query = str(data.get('query', ''))[:200]
+    limit = min(max(_int_param(data.get('limit'), db.SEARCH_LIMIT), 1), db.SEARCH_LIMIT)
+    offset = max(_int_param(data.get('offset'), 0), 0)
+
+    start = perf_counter()
+    result = db.search_users(query, limit=limit, offset=offset)
+
+    emit('search_results', {
+        'query': query,
+        'total': result['total'],
+        'offset': offset,
+        'users': result['users'],
+        'elapsed_ms': round((perf_counter() - start) * 1000, 1)
+    })
+
+
+@socketio.on('get_state')
+def handle_get_state(data=None):
+    """Estado del monitor; con `since` solo se envía si cambió desde esa versión"""
+    since = (data or {}).get('since')
+    current = monitor_state.changed_since(since)
+    if current is None:
+        emit('state', {'version': since, 'changed': False})
+    else:
+        emit('state', dict(state.to_dict(current), changed=True))
+
+
+@socketio.on('set_wire_format')
+def handle_set_wire_format(data=None):
+    """Elegir el formato de las listas de perfiles de este cliente (json, columnar, msgpack)"""
+    fmt = (data or {}).get('format', wire.JSON)
+    if fmt not in wire.FORMATS:
+        fmt = wire.JSON
+    leave_room(wire.room_for(wire_formats.get(request.sid, wire.JSON)))
+    join_room(wire.room_for(fmt))
+    wire_formats[request.sid] = fmt
+    emit('wire_format', {'format': fmt, 'available': list(wire.FORMATS)})
 
 
 @socketio.on('toggle_autolike')
 def handle_toggle_autolike(data):
     """Activar/desactivar autolike"""
-    monitor_state['autolike_enabled'] = data.get('enabled', False)
-    monitor_state['autolike_delay'] = data.get('delay', 3)
+    current = monitor_state.update(autolike_enabled=data.get('enabled', False), autolike_delay=data.get('delay', 3))
+    delay = current.autolike_delay
+    monitor_scheduler.set_interval('autolike', delay, max(delay, AUTOLIKE_IDLE_INTERVAL))
     
-    status = "activado" if monitor_state['autolike_enabled'] else "desactivado"
-    log_message(f"Autolike {status} (delay: {monitor_state['autolike_delay']}s)", 
-                'success' if monitor_state['autolike_enabled'] else 'warning')
+    status = "activado" if current.autolike_enabled else "desactivado"
+    log_message(f"Autolike {status} (delay: {delay}s)", 
+                'success' if current.autolike_enabled else 'warning')
     
-    emit('autolike_status', {
-        'enabled': monitor_state['autolike_enabled'],
-        'delay': monitor_state['autolike_delay'],
-        'count': monitor_state['autolike_count']
-    }, broadcast=True)
+    emit('autolike_status', autolike_status(current), broadcast=True)
 
 
 @socketio.on('do_autolike')
 def handle_do_autolike():
     """Ejecutar un autolike manualmente"""
-    if monitor_state['driver']:
+    driver = monitor_state['driver']
+    if driver:
         try:
             # Múltiples selectores para encontrar el botón de like
             script = """
@@ -1215,16 +1477,12 @@ def handle_do_autolike():
                 }
                 return false;
             """
-            result = monitor_state['driver'].execute_script(script)
+            result = driver.execute_script(script)
             
             if result:
-                monitor_state['autolike_count'] += 1
-                log_message(f"Like manual enviado (#{monitor_state['autolike_count']})", 'success')
-                emit('autolike_status', {
-                    'enabled': monitor_state['autolike_enabled'],
-                    'delay': monitor_state['autolike_delay'],
-                    'count': monitor_state['autolike_count']
-                }, broadcast=True)
+                current = monitor_state.increment('autolike_count')
+                log_message(f"Like manual enviado (#{current.autolike_count})", 'success')
+                emit('autolike_status', autolike_status(current), broadcast=True)
             else:
                 log_message("No se encontró botón de like en la página actual", 'warning')
         except Exception as e:
@@ -1235,28 +1493,60 @@ def handle_do_autolike():
 def handle_connect():
     """Cliente conectado"""
     log_message("👋 Cliente conectado", 'info')
-    # Cargar historial si no está cargado
-    if not monitor_state['history']:
+    connected_clients.add(request.sid)
+    monitor_scheduler.set_paused(False)
+    join_room(wire.room_for(wire.JSON))
+    
+    # Suscribir a los niveles por defecto y reenviar los últimos logs en un solo frame
+    added, _ = log_subscriptions.set(request.sid, logbuffer.DEFAULT_TYPES)
+    for msg_type in added:
+        join_room(logbuffer.room_for(msg_type))
+    emit('log_backlog', {
+        'entries': log_buffer.recent(logbuffer.BACKLOG_SIZE, logbuffer.DEFAULT_TYPES)
+    })
+    
+    # Contar el historial si no está contado
+    if not monitor_state['history_total']:
         load_history()
     
     # Si no hay usuarios activos, usar los más recientes del historial
-    users_to_send = monitor_state['users'] if monitor_state['users'] else monitor_state['history'][:50]
+    users_to_send = session_users.window() if len(session_users) else db.get_all_users(limit=50)
     
-    # Enviar estado actual
-    emit('users_list', {'users': users_to_send})
-    emit('history_list', {'history': monitor_state['history']})
+    # Enviar estado actual, todo de la misma instantánea
+    current = monitor_state.snapshot()
+    emit('users_list', {'users': users_payload(users_to_send), 'total': len(session_users)})
+    emit('history_update', {'total': current.history_total})
     emit('status_update', {
-        'status': 'running' if monitor_state['running'] else 'stopped'
-    })
-    emit('autolike_status', {
-        'enabled': monitor_state['autolike_enabled'],
-        'delay': monitor_state['autolike_delay'],
-        'count': monitor_state['autolike_count']
+        'status': 'running' if current.running else 'stopped',
+        'version': current.version
     })
+    emit('autolike_status', autolike_status(current))
+    if backup_job.status()['running']:
+        emit('backup_progress', backup_job.status())
     update_stats()
 
 
+@socketio.on('disconnect')
+def handle_disconnect():
+    """Cliente desconectado"""
+    log_subscriptions.forget(request.sid)
+    connected_clients.discard(request.sid)
+    wire_formats.pop(request.sid, None)
+    if not connected_clients:
+        monitor_scheduler.set_paused(True)
+    for (sid, _), cancel in list(active_streams.items()):
+        if sid == request.sid:
+            cancel.set()
+
+
 if __name__ == '__main__':
+    # Al arrancar y no al importar este módulo (benchmarks, replay)
+    db.init_database()
+    db.migrate_from_files()
+    session_users.clear()  # lo expulsado por un proceso anterior no es de esta sesión
+    # El pool de parseo antes de que SocketIO arranque sus threads
+    parsing.start_pool()
+    
     print("\n" + "="*60)
     print("🐝 BUMBLE LIKES VIEWER - WEB INTERFACE")
     print("="*60)
@@ -1264,4 +1554,7 @@ if __name__ == '__main__':
     print("⚠️  Usa Ctrl+C para detener el servidor\n")
     print("="*60 + "\n")
     
-    socketio.run(app, debug=False, host='0.0.0.0', port=5555, allow_unsafe_werkzeug=True)
+    try:
+        socketio.run(app, debug=False, host='0.0.0.0', port=5555, allow_unsafe_werkzeug=True)
+    finally:
+        parsing.shutdown_pool()
@@ -1,47 +1,89 @@
 import sqlite3
 import json
+import functools
+import hashlib
+import re
+import threading
+import atexit
+from contextlib import contextmanager
 from datetime import datetime
+from time import monotonic
 import os
+import metrics
+import querycache
+import schema
 
 DB_FILE = "bumble_data.db"
 
+# Tamaño de bloque para recorrer tablas grandes sin cargarlas enteras
+STREAM_CHUNK_SIZE = 500
+
+# Columnas de users indexadas para búsqueda de texto y su peso en bm25
+SEARCH_COLUMNS = (
+    ('name', 10.0),
+    ('display_name', 10.0),
+    ('city', 5.0),
+    ('country', 2.0),
+    ('education', 1.0),
+    ('interests', 3.0),
+    ('spotify_track', 1.0),
+    ('dating_intentions', 1.0)
+)
+SEARCH_LIMIT = 200
+
+# Marcas de la coincidencia en el fragmento de search_users: caracteres de control
+# en vez de <mark>, porque el texto es del perfil y el cliente lo pinta como texto
+SNIPPET_OPEN = '\x02'
+SNIPPET_CLOSE = '\x03'
+
+# Se desactiva en init_database si SQLite no está compilado con FTS5
+FTS_AVAILABLE = True
+
+# Formato del campo timestamp que guarda process_response
+TIMESTAMP_FORMAT = "%H:%M:%S %d/%m/%Y"
+
+# Detección de cambios en save_user (BUMBLE_CHANGE_DETECTION=0 para reescribir siempre)
+CHANGE_DETECTION = os.environ.get('BUMBLE_CHANGE_DETECTION', '1') != '0'
+TOUCH_BATCH_SIZE = 200       # last_seen pendientes antes de escribir el lote
+TOUCH_FLUSH_SECONDS = 30     # o tiempo máximo que un last_seen espera en memoria
+
+
+def _timed(func):
+    """Medir la duración de cada llamada a la base de datos"""
+    if not metrics.ENABLED:
+        return func
+    name = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with metrics.DB_CALL_SECONDS.time(name):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def _cached(*tables):
+    """Cachear una lectura de `tables` hasta la próxima escritura en ellas (ver querycache.py)"""
+    return querycache.cached(*tables, scope=lambda: DB_FILE)
+
+
+@_timed
 def init_database():
     """Inicializar la base de datos con las tablas necesarias"""
     conn = sqlite3.connect(DB_FILE)
     cursor = conn.cursor()
     
-    # Tabla de usuarios
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id TEXT PRIMARY KEY,
-            name TEXT NOT NULL,
-            display_name TEXT NOT NULL,
-            age INTEGER NOT NULL,
-            has_voted BOOLEAN NOT NULL,
-            photo TEXT,
-            timestamp TEXT NOT NULL,
-            first_seen TEXT NOT NULL,
-            last_seen TEXT NOT NULL,
-            distance_short TEXT,
-            online_status INTEGER,
-            is_verified INTEGER,
-            interests TEXT,
-            education TEXT,
-            height TEXT,
-            smoking TEXT,
-            drinking TEXT,
-            exercise TEXT,
-            pets TEXT,
-            politics TEXT,
-            religion TEXT,
-            zodiac TEXT,
-            dating_intentions TEXT,
-            instagram_connected INTEGER,
-            spotify_track TEXT,
-            city TEXT,
-            country TEXT
-        )
-    ''')
+    # Espacio libre devuelto por pasos con PRAGMA incremental_vacuum (ver
+    # retention.py); solo tiene efecto al crear la base de datos
+    cursor.execute('PRAGMA auto_vacuum=INCREMENTAL')
+    
+    # WAL: los cursores de lectura largos (streaming) no bloquean al escritor
+    cursor.execute('PRAGMA journal_mode=WAL')
+    
+    # Tabla de usuarios (columnas en schema.USER_SPEC)
+    cursor.execute(schema.CREATE_USERS_SQL)
+    
+    # Índice de texto completo sobre users, mantenido por triggers
+    _init_search_index(cursor)
     
     # Tabla de sesiones (cookies)
     cursor.execute('''
@@ -82,191 +124,717 @@ def init_database():
             action_type TEXT NOT NULL,
             user_id TEXT,
             user_name TEXT,
-            details TEXT
+            details TEXT,
+            ts INTEGER
+        )
+    ''')
+    
+    # Usuarios de la sesión de monitoreo expulsados de memoria (ver session.py)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS session_users (
+            seq INTEGER PRIMARY KEY,
+            id TEXT NOT NULL UNIQUE
         )
     ''')
     
+    # Columnas nuevas en bases de datos anteriores a su introducción
+    cursor.execute('PRAGMA table_info(users)')
+    existing = {info[1] for info in cursor.fetchall()}
+    for field in schema.USER_SPEC:
+        if field.name not in existing:
+            cursor.execute(f'ALTER TABLE users ADD COLUMN {schema.column_definition(field.name)}')
+    for table, column, column_type in ADDED_COLUMNS:
+        cursor.execute(f'PRAGMA table_info({table})')
+        if column not in [info[1] for info in cursor.fetchall()]:
+            cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {column_type}')
+    conn.commit()
+    
+    _backfill_numeric_columns(conn)
+    
+    # Índices de rango sobre las columnas numéricas (sustituyen al orden por texto)
+    cursor.execute('DROP INDEX IF EXISTS idx_users_last_seen')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_last_seen_ts ON users(last_seen_ts)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_first_seen_ts ON users(first_seen_ts)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_distance_km ON users(distance_km)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_activity_log_ts ON activity_log(ts)')
+    
     conn.commit()
     conn.close()
+    
+    # La base de datos puede ser otra con el mismo nombre (recreada o migrada)
+    querycache.bump('users', 'activity_log', 'stats')
+
+
+def _iso_to_epoch(value):
+    """Fecha ISO (datetime.isoformat) a segundos epoch"""
+    try:
+        return int(datetime.fromisoformat(value).timestamp())
+    except (TypeError, ValueError):
+        return None
+
+
+def _stamp_to_epoch(value):
+    """Campo timestamp ("%H:%M:%S %d/%m/%Y") a segundos epoch"""
+    try:
+        return int(datetime.strptime(value, TIMESTAMP_FORMAT).timestamp())
+    except (TypeError, ValueError):
+        return None
+
+
+_DISTANCE_RE = re.compile(r'(\d+(?:[.,]\d+)?)\s*(km|kilómetros?|kilometers?|millas?|miles?|mi|m)\b', re.IGNORECASE)
+
+
+def _distance_km(value):
+    """Distancia en km a partir del texto de Bumble ("5 km away", "Less than 1 km", "3 miles")"""
+    match = _DISTANCE_RE.search(value or '')
+    if not match:
+        return None
+    amount = float(match.group(1).replace(',', '.'))
+    unit = match.group(2).lower()
+    if unit.startswith('mi'):
+        amount *= 1.609344
+    elif unit == 'm':
+        amount /= 1000
+    return round(amount, 3)
+
+
+def _epoch(value):
+    """Aceptar datetime o número en las APIs de rango"""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return int(value.timestamp())
+    return int(value)
+
+
+# (tabla, columna, tipo, columna de origen, conversión) de las columnas numéricas
+NUMERIC_COLUMNS = (
+    ('users', 'first_seen_ts', 'INTEGER', 'first_seen', _iso_to_epoch),
+    ('users', 'last_seen_ts', 'INTEGER', 'last_seen', _iso_to_epoch),
+    ('users', 'detected_ts', 'INTEGER', 'timestamp', _stamp_to_epoch),
+    ('users', 'distance_km', 'REAL', 'distance_short', _distance_km),
+    ('activity_log', 'ts', 'INTEGER', 'timestamp', _iso_to_epoch),
+)
+
+# Columnas añadidas a otras tablas (las de users se migran desde schema.USER_SPEC)
+ADDED_COLUMNS = tuple(
+    (table, column, column_type) for table, column, column_type, _, _ in NUMERIC_COLUMNS if table != 'users'
+)
+
+
+def _backfill_numeric_columns(conn):
+    """Rellenar las columnas numéricas vacías a partir de su columna de texto
+    
+    Solo se recorren las filas añadidas desde el último relleno (rowid mayor que
+    el guardado en config): las que no se pueden convertir se quedan en NULL y
+    no se vuelven a intentar en cada arranque.
+    """
+    for table, column, _, source, convert in NUMERIC_COLUMNS:
+        key = f'backfill:{table}.{column}'
+        row = conn.execute('SELECT value FROM config WHERE key = ?', (key,)).fetchone()
+        done = int(row[0]) if row else 0
+        last = conn.execute(f'SELECT MAX(rowid) FROM {table}').fetchone()[0]
+        if last is None or last <= done:
+            continue
+        conn.create_function(convert.__name__, 1, convert, deterministic=True)
+        conn.execute(f'''
+            UPDATE {table} SET {column} = {convert.__name__}({source})
+            WHERE rowid > ? AND rowid <= ?
+              AND {column} IS NULL AND {source} IS NOT NULL AND {source} != ''
+        ''', (done, last))
+        conn.execute('INSERT OR REPLACE INTO config (key, value) VALUES (?, ?)', (key, str(last)))
+    conn.commit()
+
+
+@_timed
+def backfill_numeric_columns():
+    """Rellenar las columnas numéricas de filas insertadas sin ellas (importaciones en bloque)"""
+    conn = sqlite3.connect(DB_FILE)
+    try:
+        _backfill_numeric_columns(conn)
+    finally:
+        conn.close()
+    querycache.bump('users', 'activity_log')
+
+
+def _init_search_index(cursor):
+    """Crear la tabla FTS5 users_fts y sus triggers (y rellenarla la primera vez)"""
+    global FTS_AVAILABLE
+    
+    columns = [name for name, _ in SEARCH_COLUMNS]
+    column_list = ', '.join(columns)
+    new_values = ', '.join(f'new.{name}' for name in columns)
+    old_values = ', '.join(f'old.{name}' for name in columns)
+    
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'users_fts'")
+    exists = cursor.fetchone() is not None
+    
+    try:
+        # Tabla de contenido externo: el texto vive en users, aquí solo el índice
+        cursor.execute(f'''
+            CREATE VIRTUAL TABLE IF NOT EXISTS users_fts USING fts5(
+                {column_list},
+                content='users', content_rowid='rowid',
+                tokenize='unicode61 remove_diacritics 2'
+            )
+        ''')
+    except sqlite3.OperationalError:
+        FTS_AVAILABLE = False
+        return
+    FTS_AVAILABLE = True
+    
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS users_fts_insert AFTER INSERT ON users BEGIN
+            INSERT INTO users_fts(rowid, {column_list}) VALUES (new.rowid, {new_values});
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS users_fts_delete AFTER DELETE ON users BEGIN
+            INSERT INTO users_fts(users_fts, rowid, {column_list}) VALUES ('delete', old.rowid, {old_values});
+        END
+    ''')
+    # Solo si cambia una columna indexada (no en cada actualización de last_seen)
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS users_fts_update AFTER UPDATE OF {column_list} ON users BEGIN
+            INSERT INTO users_fts(users_fts, rowid, {column_list}) VALUES ('delete', old.rowid, {old_values});
+            INSERT INTO users_fts(rowid, {column_list}) VALUES (new.rowid, {new_values});
+        END
+    ''')
+    
+    if not exists:
+        cursor.execute("INSERT INTO users_fts(users_fts) VALUES ('rebuild')")
+
+
+# Columnas de contenido: forman la huella del perfil y se comparan al actualizar
+CONTENT_COLUMNS = schema.CONTENT_COLUMNS
+
+# Huellas en memoria (id -> huella) de la base de datos en uso
+_fingerprints = {}
+_fingerprints_db = None
+# Perfiles sin cambios pendientes de actualizar last_seen (id -> valores)
+_pending_touches = {}
+_last_touch_flush = monotonic()
+_change_lock = threading.Lock()
+
+
+def _fingerprint(values):
+    """Huella del contenido de un perfil"""
+    content = json.dumps([values[column] for column in CONTENT_COLUMNS], ensure_ascii=False, default=str)
+    return hashlib.blake2b(content.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def _load_fingerprints():
+    """Cargar las huellas de la BD en uso (se recarga si cambia DB_FILE)"""
+    global _fingerprints, _fingerprints_db
+    if _fingerprints_db == DB_FILE:
+        return
+    conn = sqlite3.connect(DB_FILE)
+    try:
+        _fingerprints = dict(conn.execute('SELECT id, fingerprint FROM users'))
+    finally:
+        conn.close()
+    _fingerprints_db = DB_FILE
+
+
+def _take_touches(force=False):
+    """Sacar el lote de last_seen pendiente si toca escribirlo (llamar con _change_lock)"""
+    global _pending_touches, _last_touch_flush
+    if not _pending_touches:
+        return None
+    due = (len(_pending_touches) >= TOUCH_BATCH_SIZE
+           or monotonic() - _last_touch_flush >= TOUCH_FLUSH_SECONDS)
+    if not (force or due):
+        return None
+    batch = _pending_touches
+    _pending_touches = {}
+    _last_touch_flush = monotonic()
+    return _fingerprints_db, batch
+
 
+def _write_touches(taken):
+    """Escribir un lote de last_seen en una sola transacción"""
+    if not taken:
+        return
+    db_file, batch = taken
+    conn = sqlite3.connect(db_file)
+    try:
+        conn.executemany('''
+            UPDATE users SET last_seen = ?, last_seen_ts = ?, timestamp = ?, detected_ts = ?
+            WHERE id = ?
+        ''', [values + (user_id,) for user_id, values in batch.items()])
+        conn.commit()
+    finally:
+        conn.close()
+    querycache.bump('users')
+    metrics.ROWS_TOUCHED.inc(len(batch))
+
+
+@_timed
+def flush_touches():
+    """Escribir ya los last_seen pendientes (al parar el monitor o antes de medir)"""
+    with _change_lock:
+        taken = _take_touches(force=True)
+    _write_touches(taken)
+
+
+atexit.register(flush_touches)
+
+
+def forget_users(user_ids):
+    """Olvidar huella y last_seen pendiente de usuarios que ya no están en users (archivados)
 
+    Si vuelven a aparecer se guardan de nuevo enteros.
+    """
+    with _change_lock:
+        for user_id in user_ids:
+            _fingerprints.pop(user_id, None)
+            _pending_touches.pop(user_id, None)
+
+
+def touch_users(user_ids):
+    """Encolar last_seen de perfiles vistos otra vez sin cambios (respuesta repetida)"""
+    if not user_ids:
+        return
+    now_dt = datetime.now()
+    stamp = now_dt.strftime(TIMESTAMP_FORMAT)
+    seen = (now_dt.isoformat(), int(now_dt.timestamp()), stamp, _stamp_to_epoch(stamp))
+    
+    with _change_lock:
+        taken = None
+        if _fingerprints_db != DB_FILE:
+            taken = _take_touches(force=True)
+            _load_fingerprints()
+        for user_id in user_ids:
+            _pending_touches[user_id] = seen
+        taken = taken or _take_touches()
+    _write_touches(taken)
+
+
+@_timed
 def save_user(user_info):
-    """Guardar o actualizar un usuario en la base de datos"""
+    """Guardar o actualizar un usuario en la base de datos (True si es nuevo)
+    
+    Con detección de cambios, un perfil igual al guardado solo encola su
+    last_seen (se escribe por lotes) y uno modificado solo reescribe las
+    columnas que han cambiado.
+    """
+    if not CHANGE_DETECTION:
+        return _save_user_full(user_info)
+    
+    values = schema.content_values(user_info)
+    fingerprint = _fingerprint(values)
+    
+    now_dt = datetime.now()
+    seen = (now_dt.isoformat(), int(now_dt.timestamp()),
+            user_info['timestamp'], _stamp_to_epoch(user_info['timestamp']))
+    
+    with _change_lock:
+        if _fingerprints_db != DB_FILE:
+            taken = _take_touches(force=True)
+            _load_fingerprints()
+        else:
+            taken = None
+        
+        if _fingerprints.get(user_info['id']) == fingerprint:
+            # Sin cambios: solo last_seen, en el próximo lote
+            _pending_touches[user_info['id']] = seen
+            taken = taken or _take_touches()
+            unchanged = True
+        else:
+            _pending_touches.pop(user_info['id'], None)
+            unchanged = False
+    _write_touches(taken)
+    if unchanged:
+        return False
+    
     conn = sqlite3.connect(DB_FILE)
     cursor = conn.cursor()
     
-    now = datetime.now().isoformat()
+    cursor.execute(f'SELECT {", ".join(CONTENT_COLUMNS)} FROM users WHERE id = ?', (user_info['id'],))
+    result = cursor.fetchone()
+    
+    if result:
+        # Solo las columnas que han cambiado (más last_seen y la huella)
+        changed = {column: values[column] for column, old in zip(CONTENT_COLUMNS, result) if old != values[column]}
+        if 'distance_short' in changed:
+            changed['distance_km'] = _distance_km(values['distance_short'])
+        changed.update({
+            'last_seen': seen[0], 'last_seen_ts': seen[1], 'timestamp': seen[2], 'detected_ts': seen[3],
+            'fingerprint': fingerprint
+        })
+        assignments = ', '.join(f'{column} = ?' for column in changed)
+        cursor.execute(f'UPDATE users SET {assignments} WHERE id = ?', list(changed.values()) + [user_info['id']])
+        metrics.ROWS_UPDATED.inc()
+    else:
+        row = dict(values, id=user_info['id'], timestamp=seen[2], first_seen=seen[0], last_seen=seen[0],
+                   first_seen_ts=seen[1], last_seen_ts=seen[1], detected_ts=seen[3],
+                   distance_km=_distance_km(values['distance_short']), fingerprint=fingerprint)
+        cursor.execute(
+            f'INSERT INTO users ({", ".join(row)}) VALUES ({", ".join("?" * len(row))})',
+            list(row.values())
+        )
+        metrics.ROWS_INSERTED.inc()
+    
+    conn.commit()
+    conn.close()
+    querycache.bump('users')
+    
+    with _change_lock:
+        if _fingerprints_db == DB_FILE:
+            _fingerprints[user_info['id']] = fingerprint
+    return result is None
+
+
+def _save_user_full(user_info):
+    """Guardar o actualizar un usuario reescribiendo todas sus columnas (sin detección de cambios)"""
+    conn = sqlite3.connect(DB_FILE)
+    cursor = conn.cursor()
+    
+    now_dt = datetime.now()
+    now = now_dt.isoformat()
+    now_ts = int(now_dt.timestamp())
+    
+    row = schema.content_values(user_info)
+    row.update({
+        'timestamp': user_info['timestamp'], 'last_seen': now, 'last_seen_ts': now_ts,
+        'detected_ts': _stamp_to_epoch(user_info['timestamp']),
+        'distance_km': _distance_km(row['distance_short']), 'fingerprint': None
+    })
     
     # Verificar si el usuario ya existe
     cursor.execute('SELECT id, first_seen FROM users WHERE id = ?', (user_info['id'],))
     result = cursor.fetchone()
     
-    # Convertir intereses a JSON string si es una lista
-    interests = user_info.get('interests', [])
-    if isinstance(interests, list):
-        interests = json.dumps(interests, ensure_ascii=False)
-    
     if result:
         # Actualizar usuario existente
-        cursor.execute('''
-            UPDATE users 
-            SET name = ?, display_name = ?, age = ?, has_voted = ?, 
-                photo = ?, timestamp = ?, last_seen = ?,
-                distance_short = ?, online_status = ?, is_verified = ?,
-                interests = ?, education = ?, height = ?, smoking = ?,
-                drinking = ?, exercise = ?, pets = ?, politics = ?,
-                religion = ?, zodiac = ?, dating_intentions = ?,
-                instagram_connected = ?, spotify_track = ?, city = ?, country = ?
-            WHERE id = ?
-        ''', (
-            user_info['name'],
-            user_info['display_name'],
-            user_info['age'],
-            user_info['has_voted'],
-            user_info.get('photo'),
-            user_info['timestamp'],
-            now,
-            user_info.get('distance_short', ''),
-            user_info.get('online_status', 0),
-            user_info.get('is_verified', 0),
-            interests,
-            user_info.get('education', ''),
-            user_info.get('height', ''),
-            user_info.get('smoking', ''),
-            user_info.get('drinking', ''),
-            user_info.get('exercise', ''),
-            user_info.get('pets', ''),
-            user_info.get('politics', ''),
-            user_info.get('religion', ''),
-            user_info.get('zodiac', ''),
-            user_info.get('dating_intentions', ''),
-            user_info.get('instagram_connected', 0),
-            user_info.get('spotify_track', ''),
-            user_info.get('city', ''),
-            user_info.get('country', ''),
-            user_info['id']
-        ))
+        cursor.execute(schema.update_sql(list(row)), list(row.values()) + [user_info['id']])
+        metrics.ROWS_UPDATED.inc()
     else:
         # Insertar nuevo usuario
-        cursor.execute('''
-            INSERT INTO users (id, name, display_name, age, has_voted, photo, timestamp, first_seen, last_seen,
-                             distance_short, online_status, is_verified, interests, education, height,
-                             smoking, drinking, exercise, pets, politics, religion, zodiac, dating_intentions,
-                             instagram_connected, spotify_track, city, country)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            user_info['id'],
-            user_info['name'],
-            user_info['display_name'],
-            user_info['age'],
-            user_info['has_voted'],
-            user_info.get('photo'),
-            user_info['timestamp'],
-            now,
-            now,
-            user_info.get('distance_short', ''),
-            user_info.get('online_status', 0),
-            user_info.get('is_verified', 0),
-            interests,
-            user_info.get('education', ''),
-            user_info.get('height', ''),
-            user_info.get('smoking', ''),
-            user_info.get('drinking', ''),
-            user_info.get('exercise', ''),
-            user_info.get('pets', ''),
-            user_info.get('politics', ''),
-            user_info.get('religion', ''),
-            user_info.get('zodiac', ''),
-            user_info.get('dating_intentions', ''),
-            user_info.get('instagram_connected', 0),
-            user_info.get('spotify_track', ''),
-            user_info.get('city', ''),
-            user_info.get('country', '')
-        ))
+        row.update({'id': user_info['id'], 'first_seen': now, 'first_seen_ts': now_ts})
+        cursor.execute(schema.insert_sql(list(row)), list(row.values()))
+        metrics.ROWS_INSERTED.inc()
     
     conn.commit()
     conn.close()
+    querycache.bump('users')
+    return result is None
+
+
+# Columnas que se devuelven al leer un usuario y su conversor fila -> diccionario
+USER_SELECT = schema.select_sql()
+_row_to_user = schema.row_mapper(detected_at=True)
 
+# Versiones reducidas: lista de recientes y vista de matches
+RECENT_COLUMNS = ('id', 'name', 'display_name', 'age', 'has_voted', 'photo', 'timestamp', 'first_seen', 'last_seen')
+RECENT_SELECT = schema.select_sql(RECENT_COLUMNS)
+_row_to_recent = schema.row_mapper(RECENT_COLUMNS)
 
-def get_all_users():
-    """Obtener todos los usuarios de la base de datos"""
+MATCH_COLUMNS = RECENT_COLUMNS + ('distance_short', 'online_status', 'is_verified', 'interests', 'city', 'country')
+MATCH_SELECT = schema.select_sql(MATCH_COLUMNS)
+_row_to_match = schema.row_mapper(MATCH_COLUMNS)
+
+
+@_cached('users')
+@_timed
+def get_all_users(limit=-1):
+    """Obtener todos los usuarios de la base de datos (los `limit` más recientes)"""
     conn = sqlite3.connect(DB_FILE)
     cursor = conn.cursor()
     
-    cursor.execute('SELECT * FROM users ORDER BY last_seen DESC')
+    cursor.execute(f'SELECT {USER_SELECT} FROM users ORDER BY last_seen_ts DESC LIMIT ?', (limit,))
     rows = cursor.fetchall()
     
-    users = []
-    for row in rows:
-        # Parsear intereses de JSON string
-        interests = row[12] if len(row) > 12 else '[]'
-        if interests and isinstance(interests, str):
-            try:
-                interests = json.loads(interests)
-            except:
-                interests = []
-        
-        users.append({
-            'id': row[0],
-            'name': row[1],
-            'display_name': row[2],
-            'age': row[3],
-            'has_voted': row[4],
-            'photo': row[5],
-            'timestamp': row[6],
-            'first_seen': row[7],
-            'last_seen': row[8],
-            'distance_short': row[9] if len(row) > 9 else '',
-            'online_status': row[10] if len(row) > 10 else 0,
-            'is_verified': row[11] if len(row) > 11 else 0,
-            'interests': interests,
-            'education': row[13] if len(row) > 13 else '',
-            'height': row[14] if len(row) > 14 else '',
-            'smoking': row[15] if len(row) > 15 else '',
-            'drinking': row[16] if len(row) > 16 else '',
-            'exercise': row[17] if len(row) > 17 else '',
-            'pets': row[18] if len(row) > 18 else '',
-            'politics': row[19] if len(row) > 19 else '',
-            'religion': row[20] if len(row) > 20 else '',
-            'zodiac': row[21] if len(row) > 21 else '',
-            'dating_intentions': row[22] if len(row) > 22 else '',
-            'instagram_connected': row[23] if len(row) > 23 else 0,
-            'spotify_track': row[24] if len(row) > 24 else '',
-            'city': row[25] if len(row) > 25 else '',
-            'country': row[26] if len(row) > 26 else '',
-            'detected_at': row[7] if len(row) > 7 else ''  # first_seen como detected_at
-        })
+    users = [_row_to_user(row) for row in rows]
     
     conn.close()
     return users
 
 
-def get_recent_users(limit=50):
-    """Obtener los usuarios más recientes"""
+@_cached('users')
+def count_users():
+    """Número de usuarios guardados"""
+    conn = sqlite3.connect(DB_FILE)
+    count = conn.execute('SELECT COUNT(*) FROM users').fetchone()[0]
+    conn.close()
+    return count
+
+
+def spill_session_users(user_ids):
+    """Apuntar usuarios de la sesión expulsados de memoria, en orden de llegada"""
+    conn = sqlite3.connect(DB_FILE)
+    conn.executemany('INSERT OR IGNORE INTO session_users (id) VALUES (?)', [(i,) for i in user_ids])
+    conn.commit()
+    conn.close()
+
+
+def get_session_user(user_id):
+    """Usuario expulsado de la sesión, desde users (None si no está)"""
+    conn = sqlite3.connect(DB_FILE)
+    row = conn.execute(
+        f'SELECT {USER_SELECT} FROM session_users JOIN users ON users.id = session_users.id '
+        'WHERE session_users.id = ?', (user_id,)
+    ).fetchone()
+    conn.close()
+    return _row_to_user(row) if row else None
+
+
+def get_session_users(offset=0, limit=-1):
+    """Usuarios expulsados de la sesión en orden de llegada"""
+    conn = sqlite3.connect(DB_FILE)
+    rows = conn.execute(
+        f'SELECT {USER_SELECT} FROM session_users JOIN users ON users.id = session_users.id '
+        'ORDER BY session_users.seq LIMIT ? OFFSET ?', (limit, offset)
+    ).fetchall()
+    conn.close()
+    return [_row_to_user(row) for row in rows]
+
+
+def clear_session_users():
+    conn = sqlite3.connect(DB_FILE)
+    conn.execute('DELETE FROM session_users')
+    conn.commit()
+    conn.close()
+
+
+def iter_users(matches_only=False, chunk_size=STREAM_CHUNK_SIZE):
+    """Recorrer usuarios en bloques de tamaño fijo con un cursor (memoria constante)"""
+    conn = sqlite3.connect(DB_FILE)
+    try:
+        cursor = conn.cursor()
+        where = ' WHERE has_voted = 1' if matches_only else ''
+        cursor.execute(f'SELECT {USER_SELECT} FROM users{where} ORDER BY last_seen_ts DESC')
+        
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield [_row_to_user(row) for row in rows]
+    finally:
+        conn.close()
+
+
+@contextmanager
+def read_snapshot(path=None):
+    """Conexión con una transacción de lectura abierta mientras dura el bloque
+
+    Todo lo que se lee dentro ve la base de datos tal como estaba al entrar;
+    en WAL el monitor sigue escribiendo sin esperar. Se cierra al salir.
+    """
+    conn = sqlite3.connect(path or DB_FILE)
+    try:
+        conn.execute('BEGIN')
+        # La transacción de lectura empieza con la primera lectura
+        conn.execute('SELECT 1 FROM sqlite_master LIMIT 1').fetchall()
+        yield conn
+    finally:
+        conn.close()
+
+
+# Columnas de users que carga analytics.py (la hora de detección, en hora local)
+ANALYTICS_SELECT = ("id, age, has_voted, is_verified, instagram_connected, "
+                    "CAST(strftime('%H', first_seen_ts, 'unixepoch', 'localtime') AS INTEGER)")
+
+
+def iter_analytics_rows(chunk_size=10000):
+    """Bloques de (id, edad, match, verificada, instagram, hora de detección o None) de todos los usuarios"""
+    with read_snapshot() as conn:
+        cursor = conn.execute(f'SELECT {ANALYTICS_SELECT} FROM users')
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield rows
+
+
+def parse_page_cursor(cursor):
+    """Cursor de get_users_page ("<last_seen_ts>.<rowid>") -> tupla, None si está vacío
+
+    ValueError si no es válido.
+    """
+    if not cursor:
+        return None
+    ts, rowid = cursor.split('.')
+    return int(ts), int(rowid)
+
+
+@_cached('users')
+@_timed
+def get_users_page(cursor=None, limit=STREAM_CHUNK_SIZE, matches_only=False):
+    """Una página de usuarios por keyset, del más al menos reciente
+
+    Ordena por (last_seen_ts, rowid) descendente, que recorre el índice de
+    last_seen_ts sin ordenar aparte, y continúa después de `cursor` (el de la
+    página anterior). Devuelve (usuarios, cursor de la siguiente página o None).
+    """
+    conditions = ['has_voted = 1'] if matches_only else []
+    params = []
+    after = parse_page_cursor(cursor)
+    if after is not None:
+        conditions.append('(last_seen_ts < ? OR (last_seen_ts = ? AND rowid < ?))')
+        params += [after[0], after[0], after[1]]
+    where = f' WHERE {" AND ".join(conditions)}' if conditions else ''
+    
+    conn = sqlite3.connect(DB_FILE)
+    rows = conn.execute(
+        f'SELECT rowid, {USER_SELECT} FROM users{where} ORDER BY last_seen_ts DESC, rowid DESC LIMIT ?',
+        params + [limit + 1]
+    ).fetchall()
+    conn.close()
+    
+    more = len(rows) > limit
+    rows = rows[:limit]
+    users = [_row_to_user(row[1:]) for row in rows]
+    next_cursor = f'{users[-1]["last_seen_ts"]}.{rows[-1][0]}' if more else None
+    return users, next_cursor
+
+
+@_cached('users')
+def get_match_chunks(chunk_size=STREAM_CHUNK_SIZE):
+    """Matches completos en bloques, como iter_users(matches_only=True), en una lista"""
+    return list(iter_users(matches_only=True, chunk_size=chunk_size))
+
+
+def _fts_query(text):
+    """Convertir el texto del buscador en una consulta FTS5 por prefijos ("mad"* "caf"*)"""
+    terms = [term.replace('"', '""') for term in text.split()]
+    return ' '.join(f'"{term}"*' for term in terms if term)
+
+
+@_timed
+def search_users(text, limit=SEARCH_LIMIT, offset=0):
+    """Buscar perfiles por texto: prefijos, ranking bm25 y fragmento con la coincidencia"""
+    query = _fts_query(text or '')
+    if not query:
+        return {'total': 0, 'users': []}
+    
     conn = sqlite3.connect(DB_FILE)
     cursor = conn.cursor()
     
-    cursor.execute('SELECT * FROM users ORDER BY last_seen DESC LIMIT ?', (limit,))
-    rows = cursor.fetchall()
+    try:
+        if FTS_AVAILABLE:
+            weights = ', '.join(str(weight) for _, weight in SEARCH_COLUMNS)
+            cursor.execute('SELECT COUNT(*) FROM users_fts WHERE users_fts MATCH ?', (query,))
+            total = cursor.fetchone()[0]
+            cursor.execute(f'''
+                SELECT snippet(users_fts, -1, ?, ?, '…', 8),
+                       bm25(users_fts, {weights}) AS rank,
+                       {USER_SELECT}
+                FROM users_fts JOIN users ON users.rowid = users_fts.rowid
+                WHERE users_fts MATCH ?
+                ORDER BY rank
+                LIMIT ? OFFSET ?
+            ''', (SNIPPET_OPEN, SNIPPET_CLOSE, query, limit, offset))
+        else:
+            # Sin FTS5: LIKE por columna (lento, pero la búsqueda sigue funcionando)
+            terms = text.split()
+            condition = ' AND '.join(
+                '(' + ' OR '.join(f'{name} LIKE ?' for name, _ in SEARCH_COLUMNS) + ')'
+                for _ in terms
+            )
+            params = [f'%{term}%' for term in terms for _ in SEARCH_COLUMNS]
+            cursor.execute(f'SELECT COUNT(*) FROM users WHERE {condition}', params)
+            total = cursor.fetchone()[0]
+            cursor.execute(
+                f"SELECT '', 0, {USER_SELECT} FROM users WHERE {condition} ORDER BY last_seen_ts DESC LIMIT ? OFFSET ?",
+                params + [limit, offset]
+            )
+        rows = cursor.fetchall()
+    except sqlite3.OperationalError:
+        # Consulta que FTS5 no acepta
+        rows, total = [], 0
+    finally:
+        conn.close()
     
     users = []
     for row in rows:
-        users.append({
-            'id': row[0],
-            'name': row[1],
-            'display_name': row[2],
-            'age': row[3],
-            'has_voted': bool(row[4]),
-            'photo': row[5],
-            'timestamp': row[6],
-            'first_seen': row[7],
-            'last_seen': row[8]
-        })
+        # Las dos primeras columnas son el fragmento y el rank
+        user = _row_to_user(row[2:])
+        user['snippet'] = row[0]
+        user['rank'] = row[1]
+        users.append(user)
+    return {'total': total, 'users': users}
+
+
+@_cached('users')
+@_timed
+def get_recent_users(limit=50):
+    """Obtener los usuarios más recientes"""
+    conn = sqlite3.connect(DB_FILE)
+    cursor = conn.cursor()
+    
+    cursor.execute(f'SELECT {RECENT_SELECT} FROM users ORDER BY last_seen_ts DESC LIMIT ?', (limit,))
+    users = [_row_to_recent(row) for row in cursor.fetchall()]
+    for user in users:
+        user['has_voted'] = bool(user['has_voted'])
+    
+    conn.close()
+    return users
+
+
+def _range_condition(column, start, end):
+    """WHERE para un rango [start, end) sobre una columna indexada"""
+    conditions, params = [f'{column} IS NOT NULL'], []
+    if start is not None:
+        conditions.append(f'{column} >= ?')
+        params.append(_epoch(start))
+    if end is not None:
+        conditions.append(f'{column} < ?')
+        params.append(_epoch(end))
+    return ' AND '.join(conditions), params
+
+
+@_timed
+def get_users_seen_between(start=None, end=None, limit=-1):
+    """Usuarios vistos por última vez entre start y end (epoch o datetime), del más reciente al más antiguo"""
+    conn = sqlite3.connect(DB_FILE)
+    cursor = conn.cursor()
+    
+    where, params = _range_condition('last_seen_ts', start, end)
+    cursor.execute(f'SELECT {USER_SELECT} FROM users WHERE {where} ORDER BY last_seen_ts DESC LIMIT ?', params + [limit])
+    users = [_row_to_user(row) for row in cursor.fetchall()]
     
     conn.close()
     return users
 
 
+@_timed
+def get_users_within_km(max_km, min_km=0, limit=-1):
+    """Usuarios a una distancia entre min_km y max_km, del más cercano al más lejano"""
+    conn = sqlite3.connect(DB_FILE)
+    cursor = conn.cursor()
+    
+    cursor.execute(f'''
+        SELECT {USER_SELECT} FROM users
+        WHERE distance_km BETWEEN ? AND ?
+        ORDER BY distance_km
+        LIMIT ?
+    ''', (min_km, max_km, limit))
+    users = [_row_to_user(row) for row in cursor.fetchall()]
+    
+    conn.close()
+    return users
+
+
+@_timed
+def get_detections_per_hour(start=None, end=None):
+    """Usuarios detectados por primera vez en cada hora: [(inicio de la hora en epoch, cantidad)]"""
+    conn = sqlite3.connect(DB_FILE)
+    cursor = conn.cursor()
+    
+    where, params = _range_condition('first_seen_ts', start, end)
+    cursor.execute(f'''
+        SELECT (first_seen_ts / 3600) * 3600 AS hour, COUNT(*)
+        FROM users WHERE {where}
+        GROUP BY hour ORDER BY hour
+    ''', params)
+    rows = cursor.fetchall()
+    
+    conn.close()
+    return rows
+
+
+@_timed
 def save_cookies(cookies):
     """Guardar cookies en la base de datos"""
     conn = sqlite3.connect(DB_FILE)
@@ -288,6 +856,7 @@ def save_cookies(cookies):
     conn.close()
 
 
+@_timed
 def load_cookies():
     """Cargar cookies desde la base de datos"""
     conn = sqlite3.connect(DB_FILE)
@@ -303,6 +872,7 @@ def load_cookies():
     return None
 
 
+@_timed
 def delete_cookies():
     """Eliminar cookies de la base de datos"""
     conn = sqlite3.connect(DB_FILE)
@@ -314,6 +884,8 @@ def delete_cookies():
     conn.close()
 
 
+@_cached('users')
+@_timed
 def get_stats():
     """Obtener estadísticas de la base de datos"""
     conn = sqlite3.connect(DB_FILE)
@@ -349,67 +921,64 @@ def get_stats():
     }
 
 
-def get_matches():
-    """Obtener usuarios que son matches (has_voted = True)"""
+@_cached('users')
+@_timed
+def get_city_distribution():
+    """Usuarios por ciudad como [(ciudad, cantidad)] de la más a la menos común"""
     conn = sqlite3.connect(DB_FILE)
     cursor = conn.cursor()
     
-    cursor.execute('SELECT * FROM users WHERE has_voted = 1 ORDER BY last_seen DESC')
+    cursor.execute("""
+        SELECT city, COUNT(*) AS total FROM users
+        WHERE city IS NOT NULL AND city != ''
+        GROUP BY city ORDER BY total DESC, city
+    """)
     rows = cursor.fetchall()
     
-    users = []
-    for row in rows:
-        interests = row[12] if len(row) > 12 else '[]'
-        if interests and isinstance(interests, str):
-            try:
-                interests = json.loads(interests)
-            except:
-                interests = []
-        
-        users.append({
-            'id': row[0],
-            'name': row[1],
-            'display_name': row[2],
-            'age': row[3],
-            'has_voted': row[4],
-            'photo': row[5],
-            'timestamp': row[6],
-            'first_seen': row[7],
-            'last_seen': row[8],
-            'distance_short': row[9] if len(row) > 9 else '',
-            'online_status': row[10] if len(row) > 10 else 0,
-            'is_verified': row[11] if len(row) > 11 else 0,
-            'interests': interests,
-            'city': row[25] if len(row) > 25 else '',
-            'country': row[26] if len(row) > 26 else ''
-        })
+    conn.close()
+    return rows
+
+
+@_cached('users')
+@_timed
+def get_matches():
+    """Obtener usuarios que son matches (has_voted = True)"""
+    conn = sqlite3.connect(DB_FILE)
+    cursor = conn.cursor()
+    
+    cursor.execute(f'SELECT {MATCH_SELECT} FROM users WHERE has_voted = 1 ORDER BY last_seen_ts DESC')
+    users = [_row_to_match(row) for row in cursor.fetchall()]
     
     conn.close()
     return users
 
 
+@_timed
 def log_activity(action_type, user_id=None, user_name=None, details=None):
     """Registrar actividad en la base de datos"""
     conn = sqlite3.connect(DB_FILE)
     cursor = conn.cursor()
     
-    now = datetime.now().isoformat()
+    now = datetime.now()
     
     cursor.execute('''
-        INSERT INTO activity_log (timestamp, action_type, user_id, user_name, details)
-        VALUES (?, ?, ?, ?, ?)
-    ''', (now, action_type, user_id, user_name, details))
+        INSERT INTO activity_log (timestamp, action_type, user_id, user_name, details, ts)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', (now.isoformat(), action_type, user_id, user_name, details, int(now.timestamp())))
     
     conn.commit()
     conn.close()
+    querycache.bump('activity_log')
 
 
+@_cached('activity_log')
+@_timed
 def get_activity_log(limit=100):
     """Obtener log de actividad reciente"""
     conn = sqlite3.connect(DB_FILE)
     cursor = conn.cursor()
     
-    cursor.execute('SELECT * FROM activity_log ORDER BY timestamp DESC LIMIT ?', (limit,))
+    cursor.execute('SELECT * FROM activity_log ORDER BY ts DESC, id DESC LIMIT ?', (limit,))
     rows = cursor.fetchall()
     
     activities = []
@@ -427,6 +996,7 @@ def get_activity_log(limit=100):
     return activities
 
 
+@_timed
 def save_daily_stats(likes_received=0, likes_sent=0, matches=0, profiles_viewed=0, session_duration=0):
     """Guardar estadísticas diarias"""
     conn = sqlite3.connect(DB_FILE)
@@ -458,8 +1028,11 @@ def save_daily_stats(likes_received=0, likes_sent=0, matches=0, profiles_viewed=
     
     conn.commit()
     conn.close()
+    querycache.bump('stats')
 
 
+@_cached('stats')
+@_timed
 def get_daily_stats(days=7):
     """Obtener estadísticas de los últimos N días"""
     conn = sqlite3.connect(DB_FILE)
@@ -483,16 +1056,27 @@ def get_daily_stats(days=7):
     return stats
 
 
+@_timed
 def clear_all_data():
     """Limpiar todos los datos de la base de datos"""
+    global _fingerprints_db
     conn = sqlite3.connect(DB_FILE)
     cursor = conn.cursor()
     
     cursor.execute('DELETE FROM users')
     cursor.execute('DELETE FROM session')
+    cursor.execute('DELETE FROM session_users')
+    cursor.execute('DELETE FROM activity_log')
+    cursor.execute('DELETE FROM stats')
     
     conn.commit()
     conn.close()
+    querycache.bump('users', 'activity_log', 'stats')
+    
+    # Las huellas y los last_seen pendientes ya no corresponden a ninguna fila
+    with _change_lock:
+        _pending_touches.clear()
+        _fingerprints_db = None
 
 
 # Migrar datos existentes si existen
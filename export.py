@@ -0,0 +1,203 @@
+"""Exportación en streaming de users, activity_log y stats (NDJSON o CSV)
+
+Las filas se leen con un cursor, en bloques de EXPORT_CHUNK_SIZE, dentro de
+una transacción de lectura (database.read_snapshot): la memoria no depende del
+tamaño de la tabla, la exportación ve los datos tal como estaban al empezar y
+el monitor sigue escribiendo mientras tanto (WAL). Cada tabla se recorre en el
+orden de un índice, sin ordenar aparte.
+
+    python export.py users --format csv --columns id,name,age --where city=Madrid
+    python export.py activity_log --since 2026-01-01 -o actividad.ndjson
+"""
+import argparse
+import csv
+import io
+import json
+import sys
+from datetime import datetime
+
+import database as db
+import metrics
+import schema
+
+NDJSON = 'ndjson'
+CSV = 'csv'
+FORMATS = (NDJSON, CSV)
+MIMETYPES = {NDJSON: 'application/x-ndjson', CSV: 'text/csv'}
+
+EXPORT_CHUNK_SIZE = 1000
+
+EXPORT_ROWS = metrics.counter('bumble_export_rows_total', 'Filas exportadas')
+
+
+class ExportTable:
+    """Tabla exportable
+
+    columns:  columnas que se pueden pedir (y filtrar por igualdad)
+    default:  columnas exportadas si no se piden otras
+    order:    ORDER BY (sobre un índice, para no ordenar en memoria)
+    time:     columna de since/until y cómo se convierte el valor pedido
+    """
+
+    def __init__(self, name, columns, order, time, to_time, default=None):
+        self.name = name
+        self.columns = tuple(columns)
+        self.default = tuple(default or columns)
+        self.order = order
+        self.time = time
+        self.to_time = to_time
+
+
+def parse_time(value):
+    """Epoch, fecha o fecha y hora ISO -> datetime"""
+    if isinstance(value, datetime):
+        return value
+    value = str(value).strip()
+    try:
+        if value.isdigit():
+            return datetime.fromtimestamp(int(value))
+        return datetime.fromisoformat(value)
+    except (OverflowError, OSError, ValueError):
+        raise ValueError(f'Fecha no válida: {value}')
+
+
+TABLES = {table.name: table for table in (
+    ExportTable(
+        'users',
+        columns=tuple(field.name for field in schema.USER_SPEC) + tuple(
+            column for table, column, *_ in db.NUMERIC_COLUMNS if table == 'users'
+        ),
+        default=schema.PUBLIC_COLUMNS,
+        order='last_seen_ts DESC',
+        time='last_seen_ts', to_time=lambda value: int(value.timestamp())
+    ),
+    ExportTable(
+        'activity_log',
+        columns=('id', 'timestamp', 'action_type', 'user_id', 'user_name', 'details', 'ts'),
+        order='id',
+        time='ts', to_time=lambda value: int(value.timestamp())
+    ),
+    ExportTable(
+        'stats',
+        columns=('date', 'likes_received', 'likes_sent', 'matches', 'profiles_viewed', 'session_duration'),
+        order='date',
+        time='date', to_time=lambda value: value.strftime('%Y-%m-%d')
+    ),
+)}
+
+
+def build_query(table, columns=None, filters=None, since=None, until=None, limit=None):
+    """SELECT de la exportación: (sql, params, columnas)
+
+    ValueError si la tabla, una columna o una fecha no son válidas. Los
+    nombres se comprueban contra la lista de la tabla; los valores van como
+    parámetros.
+    """
+    spec = TABLES.get(table)
+    if spec is None:
+        raise ValueError(f'Tabla no exportable: {table}')
+    columns = tuple(columns or spec.default)
+    unknown = [column for column in (*columns, *(filters or {})) if column not in spec.columns]
+    if unknown:
+        raise ValueError(f"Columnas desconocidas en {table}: {', '.join(unknown)}")
+
+    conditions, params = [], []
+    for column, value in (filters or {}).items():
+        conditions.append(f'{column} = ?')
+        params.append(value)
+    if since is not None:
+        conditions.append(f'{spec.time} >= ?')
+        params.append(spec.to_time(parse_time(since)))
+    if until is not None:
+        conditions.append(f'{spec.time} < ?')
+        params.append(spec.to_time(parse_time(until)))
+
+    sql = f'SELECT {", ".join(columns)} FROM {table}'
+    if conditions:
+        sql += ' WHERE ' + ' AND '.join(conditions)
+    sql += f' ORDER BY {spec.order} LIMIT ?'
+    params.append(-1 if limit is None else int(limit))
+    return sql, params, columns
+
+
+def iter_rows(sql, params, chunk_size=EXPORT_CHUNK_SIZE):
+    """Bloques de filas de la consulta, leídos de una instantánea de la base de datos"""
+    with db.read_snapshot() as conn:
+        cursor = conn.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            EXPORT_ROWS.inc(len(rows))
+            yield rows
+
+
+def _ndjson_lines(table, columns, chunks):
+    # Las listas guardadas como JSON (intereses...) se exportan como listas
+    to_dict = schema.row_mapper(columns) if table == 'users' else lambda row: dict(zip(columns, row))
+    for rows in chunks:
+        yield ''.join(json.dumps(to_dict(row), ensure_ascii=False) + '\n' for row in rows)
+
+
+def _csv_lines(columns, chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for rows in chunks:
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def stream(table, fmt=NDJSON, columns=None, filters=None, since=None, until=None, limit=None):
+    """Generador de texto con la exportación (valida los parámetros antes de empezar)"""
+    if fmt not in FORMATS:
+        raise ValueError(f'Formato no soportado: {fmt}')
+    sql, params, columns = build_query(table, columns, filters, since, until, limit)
+    chunks = iter_rows(sql, params)
+    if fmt == CSV:
+        return _csv_lines(columns, chunks)
+    return _ndjson_lines(table, columns, chunks)
+
+
+def filename(table, fmt):
+    return f"{table}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.{fmt}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Exportar una tabla en NDJSON o CSV')
+    parser.add_argument('table', choices=sorted(TABLES))
+    parser.add_argument('--format', choices=FORMATS, default=NDJSON)
+    parser.add_argument('--columns', help='Columnas separadas por comas')
+    parser.add_argument('--where', action='append', default=[], metavar='COLUMNA=VALOR',
+                        help='Filtro de igualdad (se puede repetir)')
+    parser.add_argument('--since', help='Desde (epoch o fecha ISO)')
+    parser.add_argument('--until', help='Hasta, sin incluir (epoch o fecha ISO)')
+    parser.add_argument('--limit', type=int)
+    parser.add_argument('--db', default=None, help=f'Base de datos (por defecto {db.DB_FILE})')
+    parser.add_argument('-o', '--output', help='Archivo de salida (por defecto, la salida estándar)')
+    args = parser.parse_args()
+    if args.db:
+        db.DB_FILE = args.db
+
+    try:
+        filters = dict(condition.split('=', 1) for condition in args.where)
+        lines = stream(args.table, args.format, args.columns.split(',') if args.columns else None,
+                       filters, args.since, args.until, args.limit)
+    except ValueError as e:
+        parser.error(str(e))
+
+    out = open(args.output, 'w', encoding='utf-8', newline='') if args.output else sys.stdout
+    try:
+        for text in lines:
+            out.write(text)
+    finally:
+        if args.output:
+            out.close()
+
+
+if __name__ == '__main__':
+    main()
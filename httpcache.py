@@ -0,0 +1,82 @@
+"""Respuestas JSON cacheables para la API REST: ETag, 304 y compresión
+
+El ETag se deriva de las versiones de las tablas que lee cada ruta (ver
+querycache.py), así que se calcula sin tocar la base de datos: un
+If-None-Match que coincide se responde con 304 sin ejecutar la consulta.
+Los cuerpos ya codificados y comprimidos se guardan por ETag y codificación.
+"""
+import gzip
+import hashlib
+import json
+import os
+import uuid
+
+from flask import Response, request
+
+import bodycache
+import querycache
+
+try:
+    import brotli  # opcional: pip install brotli
+except ImportError:
+    brotli = None
+
+# Las versiones de datos empiezan de cero en cada arranque
+BOOT_ID = uuid.uuid4().hex[:8]
+
+COMPRESS_MIN_BYTES = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+# Cuerpos codificados por (ETag, codificación)
+API_CACHE_ENTRIES = int(os.environ.get('BUMBLE_API_CACHE_ENTRIES', 64))
+API_CACHE_BYTES = int(os.environ.get('BUMBLE_API_CACHE_BYTES', 32 * 1024 * 1024))
+encoded_cache = bodycache.LRUCache('api', API_CACHE_ENTRIES, API_CACHE_BYTES)
+
+
+def etag_for(route, tables, *parts):
+    """ETag débil de una ruta: versión de sus tablas más los parámetros de la petición"""
+    key = '|'.join(map(str, (BOOT_ID, route, *querycache.versions(tables), *parts)))
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:20]
+
+
+def _encoding():
+    """Codificación preferida por el cliente entre las disponibles (None: sin comprimir)"""
+    accept = request.accept_encodings
+    if brotli is not None and accept['br'] and accept['br'] >= accept['gzip']:
+        return 'br'
+    if accept['gzip']:
+        return 'gzip'
+    return None
+
+
+def _encode(payload, encoding):
+    body = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    if len(body) < COMPRESS_MIN_BYTES:
+        return body, None
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY), 'br'
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=GZIP_LEVEL), 'gzip'
+    return body, None
+
+
+def json_response(etag, build):
+    """304 si el cliente ya tiene `etag`; si no, build() como JSON (comprimido)"""
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        encoding = _encoding()
+        entry = encoded_cache.get((etag, encoding))
+        if entry is None:
+            entry = _encode(build(), encoding)
+            encoded_cache.put((etag, encoding), entry, len(entry[0]))
+        body, content_encoding = entry
+        response = Response(body, mimetype='application/json')
+        if content_encoding:
+            response.headers['Content-Encoding'] = content_encoding
+    response.set_etag(etag, weak=True)
+    # El navegador guarda la respuesta pero revalida siempre (barato: 304)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.vary.add('Accept-Encoding')
+    return response
@@ -0,0 +1,105 @@
+"""Logs del monitor: buffer circular, suscripciones por nivel y salida por consola
+
+Las últimas BUFFER_SIZE entradas viven en memoria para reenviarlas a quien
+se conecta tarde. Cada tipo de log va a su sala de SocketIO (room_for) y
+cada cliente se une solo a las de los niveles que pidió, así los tipos
+ruidosos (debug, api) no salen del servidor si nadie los mira. La consola
+se escribe desde un thread aparte a través de una cola.
+"""
+import atexit
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+from collections import deque
+
+# Emojis por tipo de log
+LOG_TYPES = {
+    'success': '✅',
+    'error': '❌',
+    'warning': '⚠️',
+    'info': '🔵',
+    'debug': '🔍',
+    'chrome': '🌐',
+    'api': '📡',
+    'user': '👤'
+}
+
+# Tipos ruidosos (por usuario/por respuesta): solo se envían a clientes suscritos
+VERBOSE_TYPES = frozenset({'debug', 'api'})
+DEFAULT_TYPES = frozenset(LOG_TYPES) - VERBOSE_TYPES
+
+BUFFER_SIZE = 500     # entradas guardadas en memoria
+BACKLOG_SIZE = 100    # entradas reenviadas a un cliente que se conecta tarde
+
+
+class LogBuffer:
+    """Buffer circular de tamaño fijo con las últimas entradas de log"""
+
+    def __init__(self, maxlen=BUFFER_SIZE):
+        self.entries = deque(maxlen=maxlen)
+        self.seq = 0
+        self.lock = threading.Lock()
+
+    def append(self, entry):
+        with self.lock:
+            self.seq += 1
+            entry['seq'] = self.seq
+            self.entries.append(entry)
+        return entry
+
+    def recent(self, limit=BACKLOG_SIZE, types=None):
+        """Últimas `limit` entradas (de la más antigua a la más nueva) filtradas por tipo"""
+        with self.lock:
+            entries = list(self.entries)
+        if types is not None:
+            entries = [e for e in entries if e['type'] in types]
+        return entries[-limit:] if limit else entries
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+def room_for(msg_type):
+    """Sala de SocketIO a la que se envía un tipo de log"""
+    return f"log:{msg_type if msg_type in LOG_TYPES else 'info'}"
+
+
+class Subscriptions:
+    """Niveles de log a los que está suscrito cada cliente (por sid)"""
+
+    def __init__(self):
+        self.levels = {}
+        self.lock = threading.Lock()
+
+    def set(self, sid, types):
+        """Guardar los niveles de un cliente y devolver (añadidos, quitados)"""
+        types = frozenset(t for t in types if t in LOG_TYPES)
+        with self.lock:
+            previous = self.levels.get(sid, frozenset())
+            self.levels[sid] = types
+        return types - previous, previous - types
+
+    def get(self, sid):
+        with self.lock:
+            return self.levels.get(sid, DEFAULT_TYPES)
+
+    def forget(self, sid):
+        with self.lock:
+            self.levels.pop(sid, None)
+
+
+# Salida por consola a través de una cola: log_message nunca bloquea en stdout
+_console_queue = queue.SimpleQueue()
+console = logging.getLogger('bumble')
+console.setLevel(logging.INFO)
+console.propagate = False
+console.addHandler(logging.handlers.QueueHandler(_console_queue))
+
+_stdout_handler = logging.StreamHandler(sys.stdout)
+_stdout_handler.setFormatter(logging.Formatter('%(message)s'))
+_listener = logging.handlers.QueueListener(_console_queue, _stdout_handler)
+_listener.start()
+atexit.register(_listener.stop)
@@ -0,0 +1,236 @@
+"""Métricas del proceso (contadores, gauges e histogramas) sin dependencias
+
+Cada módulo registra las suyas con counter()/gauge()/histogram() al
+importarse; el registro es global y se sirve en /metrics con el formato de
+texto de Prometheus (render) y como resumen JSON para el panel de /stats
+(snapshot). Los histogramas tienen buckets fijos y, como mucho, una etiqueta
+(función, evento, tarea). Con BUMBLE_METRICS=0 las observaciones no hacen nada.
+"""
+import os
+import threading
+from bisect import bisect_left
+from time import perf_counter
+
+# Activar/desactivar instrumentación (BUMBLE_METRICS=0 para desactivar)
+ENABLED = os.environ.get('BUMBLE_METRICS', '1') != '0'
+
+# Buckets por defecto en segundos (de 0.1 ms a 10 s)
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+_registry = {}
+_lock = threading.Lock()
+
+
+class Counter:
+    """Contador monotónico"""
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self.value = 0
+
+    def inc(self, amount=1):
+        if not ENABLED:
+            return
+        with _lock:
+            self.value += amount
+
+    def render(self):
+        return [
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} counter",
+            f"{self.name} {self.value}"
+        ]
+
+    def snapshot(self):
+        return self.value
+
+
+class Gauge:
+    """Valor que sube y baja (tamaño de una caché, elementos en cola...)"""
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self.value = 0
+
+    def set(self, value):
+        if not ENABLED:
+            return
+        self.value = value
+
+    def render(self):
+        return [
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} gauge",
+            f"{self.name} {self.value}"
+        ]
+
+    def snapshot(self):
+        return self.value
+
+
+class Histogram:
+    """Histograma con buckets fijos y una etiqueta opcional"""
+
+    def __init__(self, name, help_text, label=None, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label = label
+        self.buckets = tuple(sorted(buckets))
+        self.series = {}  # valor de etiqueta -> [counts por bucket, suma, total]
+
+    def observe(self, value, label_value=''):
+        if not ENABLED:
+            return
+        with _lock:
+            series = self.series.get(label_value)
+            if series is None:
+                series = [[0] * len(self.buckets), 0.0, 0]
+                self.series[label_value] = series
+            # Índice del primer bucket >= valor (el resto cae en +Inf)
+            index = bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def time(self, label_value=''):
+        """Context manager que mide la duración del bloque"""
+        if not ENABLED:
+            return _NOOP_TIMER
+        return _Timer(self, label_value)
+
+    def _labels(self, label_value, extra=None):
+        pairs = []
+        if self.label:
+            pairs.append(f'{self.label}="{_escape(label_value)}"')
+        if extra:
+            pairs.append(extra)
+        return '{' + ','.join(pairs) + '}' if pairs else ''
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} histogram"
+        ]
+        with _lock:
+            items = [(k, list(v[0]), v[1], v[2]) for k, v in self.series.items()]
+        for label_value, counts, total_sum, count in sorted(items):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{self._labels(label_value, le)} {cumulative}")
+            le_inf = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{self._labels(label_value, le_inf)} {count}")
+            lines.append(f"{self.name}_sum{self._labels(label_value)} {total_sum:.6f}")
+            lines.append(f"{self.name}_count{self._labels(label_value)} {count}")
+        return lines
+
+    def snapshot(self):
+        with _lock:
+            return {
+                label_value: {
+                    'count': series[2],
+                    'sum': round(series[1], 6),
+                    'avg_ms': round(series[1] / series[2] * 1000, 3) if series[2] else 0
+                }
+                for label_value, series in self.series.items()
+            }
+
+
+class _Timer:
+    __slots__ = ('histogram', 'label_value', 'start')
+
+    def __init__(self, histogram, label_value):
+        self.histogram = histogram
+        self.label_value = label_value
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(perf_counter() - self.start, self.label_value)
+        return False
+
+
+class _NoopTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP_TIMER = _NoopTimer()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def counter(name, help_text):
+    """Registrar (o recuperar) un contador"""
+    with _lock:
+        if name not in _registry:
+            _registry[name] = Counter(name, help_text)
+        return _registry[name]
+
+
+def gauge(name, help_text):
+    """Registrar (o recuperar) un gauge"""
+    with _lock:
+        if name not in _registry:
+            _registry[name] = Gauge(name, help_text)
+        return _registry[name]
+
+
+def histogram(name, help_text, label=None, buckets=DEFAULT_BUCKETS):
+    """Registrar (o recuperar) un histograma"""
+    with _lock:
+        if name not in _registry:
+            _registry[name] = Histogram(name, help_text, label, buckets)
+        return _registry[name]
+
+
+def render():
+    """Exportar todas las métricas en formato de texto de Prometheus"""
+    lines = []
+    for metric in list(_registry.values()):
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def snapshot():
+    """Resumen de todas las métricas para el panel en vivo"""
+    return {
+        'enabled': ENABLED,
+        'metrics': {name: metric.snapshot() for name, metric in list(_registry.items())}
+    }
+
+
+# Métricas del pipeline Chrome -> BD -> navegador
+GET_LOG_SECONDS = histogram('bumble_get_log_seconds', 'Duración de driver.get_log("performance")')
+LOG_PARSE_SECONDS = histogram('bumble_log_entry_parse_seconds', 'Duración del parseo JSON por entrada de log')
+RESPONSE_BODY_SECONDS = histogram('bumble_get_response_body_seconds', 'Duración de Network.getResponseBody')
+PROCESS_RESPONSE_SECONDS = histogram('bumble_process_response_seconds', 'Duración de process_response por payload')
+PARSE_BATCH_SECONDS = histogram('bumble_parse_batch_seconds', 'Duración de decodificar las respuestas de un lote de log')
+DB_CALL_SECONDS = histogram('bumble_db_call_seconds', 'Duración de cada llamada a database.py', label='function')
+EMIT_SECONDS = histogram('bumble_socketio_emit_seconds', 'Duración de cada emit de SocketIO', label='event')
+
+USERS_INGESTED = counter('bumble_users_ingested_total', 'Usuarios nuevos ingeridos')
+DUPLICATES_SKIPPED = counter('bumble_duplicates_skipped_total', 'Usuarios duplicados omitidos')
+RESPONSES_PROCESSED = counter('bumble_responses_processed_total', 'Respuestas de la API procesadas')
+
+# Escrituras en la tabla users (para medir la amplificación de escritura)
+ROWS_INSERTED = counter('bumble_db_rows_inserted_total', 'Filas de users insertadas')
+ROWS_UPDATED = counter('bumble_db_rows_updated_total', 'Filas de users con contenido actualizado')
+ROWS_TOUCHED = counter('bumble_db_rows_touched_total', 'Filas de users con solo last_seen actualizado (por lotes)')
+
+# Planificador del monitor (scheduler.py)
+SCHEDULER_TASK_SECONDS = histogram('bumble_scheduler_task_seconds', 'Duración de cada tarea del planificador', label='task')
+SCHEDULER_WAKEUPS = counter('bumble_scheduler_wakeups_total', 'Veces que el thread del monitor despierta')
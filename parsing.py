@@ -0,0 +1,283 @@
+"""Decodificación y normalización de respuestas de la API de Bumble
+
+Funciones puras (sin Flask, BD ni estado): se pueden ejecutar en un pool de
+procesos (BUMBLE_PARSE_WORKERS) para sacar el trabajo de CPU del thread del
+monitor y del GIL que comparte con los threads de SocketIO.
+"""
+import atexit
+import json
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+import types
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from time import sleep
+
+import schema
+
+# Procesos del pool de parseo (0 = en el propio thread del monitor)
+PARSE_WORKERS = int(os.environ.get('BUMBLE_PARSE_WORKERS', 0))
+
+# Columnas leídas directamente de una ruta del usuario de la API (schema.USER_SPEC)
+SOURCE_FIELDS = tuple(field for field in schema.USER_SPEC if field.source)
+# Columnas calculadas aquí
+COMPUTED_COLUMNS = ('has_voted', 'photo', 'interests', 'instagram_connected', 'spotify_track')
+
+# Orden de los campos en las tuplas que devuelve parse_body
+USER_FIELDS = tuple(field.name for field in SOURCE_FIELDS) + COMPUTED_COLUMNS + schema.PROFILE_COLUMNS
+
+
+def extract_results(response):
+    """Lista de usuarios de una respuesta decodificada (None si no hay)"""
+    results = None
+    
+    # Estructura 1: encounters
+    if 'body' in response and isinstance(response['body'], list) and len(response['body']) > 0:
+        body = response['body'][0]
+        
+        # Client encounters (principal para swipe/feed)
+        if 'client_encounters' in body:
+            results = body['client_encounters'].get('results', [])
+        # Client user list (lista de usuarios, beeline)
+        elif 'client_user_list' in body:
+            user_list = body['client_user_list']
+            if 'section' in user_list:
+                section = user_list['section']
+                if 'users' in section:
+                    results = section['users']
+                elif 'items' in section:
+                    results = section['items']
+            elif 'users' in user_list:
+                results = user_list['users']
+        # Encounters directo
+        elif 'encounters' in body:
+            results = body['encounters']
+        # Sections (beeline alternativo)
+        elif 'section' in body or 'sections' in body:
+            sections = body.get('sections', [body.get('section', {})])
+            for section in sections:
+                if isinstance(section, dict):
+                    if 'users' in section:
+                        results = section['users']
+                        break
+                    elif 'items' in section:
+                        results = section['items']
+                        break
+        # User list directo
+        elif 'users' in body:
+            results = body['users']
+        # Conversations/Matches
+        elif 'results' in body:
+            results = body['results']
+        # Connections
+        elif 'connections' in body:
+            connections = body['connections']
+            results = []
+            for conn in connections:
+                if 'user' in conn:
+                    user_data = {
+                        'user': conn['user'],
+                        'has_user_voted': conn.get('has_conversation', False) or conn.get('is_match', True)
+                    }
+                    results.append(user_data)
+    
+    # Estructura 2: directa
+    if not results and 'encounters' in response:
+        results = response['encounters']
+        
+    # Estructura 3: beeline
+    if not results and 'beeline' in response:
+        results = response['beeline']
+    
+    # Estructura 4: matches
+    if not results and 'matches' in response:
+        matches = response['matches']
+        results = []
+        for match in matches:
+            if 'user' in match:
+                results.append({'user': match['user'], 'has_user_voted': True})
+    
+    # Estructura 5: conversations
+    if not results and 'conversations' in response:
+        conversations = response['conversations']
+        results = []
+        for conv in conversations:
+            if 'person' in conv:
+                results.append({'user': conv['person'], 'has_user_voted': True})
+            elif 'user' in conv:
+                results.append({'user': conv['user'], 'has_user_voted': True})
+    
+    return results or None
+
+
+def normalize_user(user_data, url=""):
+    """Tupla (en el orden de USER_FIELDS) de un usuario de la API, o None"""
+    # Extraer información del usuario - manejar diferentes estructuras
+    user = user_data.get('user', user_data)
+    
+    if not user or 'user_id' not in user:
+        return None
+    
+    # Extraer foto
+    photo = None
+    if 'albums' in user and user['albums']:
+        if 'photos' in user['albums'][0] and user['albums'][0]['photos']:
+            photo_url = user['albums'][0]['photos'][0].get('large_url', '')
+            if photo_url:
+                photo = 'https://' + photo_url[2:] if photo_url.startswith('//') else photo_url
+    
+    # Extraer intereses de Facebook
+    interests = []
+    if 'interests' in user and user['interests']:
+        interests = [interest.get('name', '') for interest in user['interests'][:10]]  # Primeros 10
+    
+    # Campos de perfil (profile_fields): una búsqueda por campo
+    profile_data = dict.fromkeys(schema.PROFILE_COLUMNS, '')
+    for field in user.get('profile_fields') or ():
+        column = schema.profile_column(field.get('id', ''))
+        if column:
+            profile_data[column] = field.get('display_value', '')
+    
+    # Instagram conectado
+    instagram_connected = False
+    if 'albums' in user:
+        for album in user['albums']:
+            if album.get('album_type') == 12 and album.get('external_provider') == 12:
+                instagram_connected = True
+                break
+    
+    # Spotify
+    spotify_track = ''
+    if 'spotify_mood_song' in user and user['spotify_mood_song']:
+        track = user['spotify_mood_song']
+        if 'name' in track:
+            spotify_track = f"{track.get('name', '')} - {track.get('artist_name', '')}"
+    
+    # Determinar si ya votaste (matches y conversaciones cuentan como votado)
+    has_voted = user_data.get('has_user_voted', False)
+    if not has_voted:
+        # Si viene de connections/matches/conversations, marcar como votado
+        has_voted = 'connections' in url.lower() or 'matches' in url.lower() or 'conversation' in url.lower()
+    
+    return (
+        tuple(schema.get_path(user, field.source, field.default) for field in SOURCE_FIELDS)
+        + (has_voted, photo, interests, instagram_connected, spotify_track)
+        + tuple(profile_data[column] for column in schema.PROFILE_COLUMNS)
+    )
+
+
+def parse_body(data, url=""):
+    """Cuerpo crudo (str o bytes) -> lista de tuplas de usuario, o None si no hay datos"""
+    results = extract_results(json.loads(data))
+    if not results:
+        return None
+    users = []
+    for user_data in results:
+        try:
+            user = normalize_user(user_data, url)
+        except Exception:
+            continue  # Un usuario mal formado no invalida el resto
+        if user is not None:
+            users.append(user)
+    return users
+
+
+def parse_safe(data, url):
+    """parse_body para el pool: los errores vuelven como valor, no como excepción"""
+    try:
+        return parse_body(data, url), None
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _context():
+    """forkserver donde exista, si no spawn; nunca fork
+
+    El servidor ya tiene threads (SocketIO, logbuffer, monitor) y un fork
+    copiaría sus locks tal como estén en ese momento (logging, sqlite): un
+    proceso podría quedarse bloqueado para siempre. El forkserver es un
+    proceso aparte de un solo thread con este módulo ya importado.
+    """
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload(['parsing'])
+        return context
+    return multiprocessing.get_context('spawn')
+
+
+@contextmanager
+def _bare_main():
+    """__main__ vacío mientras se arrancan los procesos del pool
+
+    forkserver y spawn preparan cada proceso importando el __main__ de quien
+    lo arranca (bumble_web: Flask, selenium, el thread de logbuffer...); con
+    uno vacío solo importan parsing, que es lo único que usa parse_safe.
+    """
+    main = sys.modules['__main__']
+    sys.modules['__main__'] = types.ModuleType('__main__')
+    try:
+        yield
+    finally:
+        sys.modules['__main__'] = main
+
+
+def _init_worker():
+    """Ctrl+C llega a todo el grupo de procesos: lo atiende el servidor, que
+    cierra el pool al salir (un proceso interrumpido a medias deja semáforos)"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None and PARSE_WORKERS > 0:
+            pool = ProcessPoolExecutor(PARSE_WORKERS, mp_context=_context(), initializer=_init_worker)
+            # Todos los procesos ya, con __main__ vacío: submit() solo crea los que falten
+            # (uno por tarea sin proceso libre), y esos sí importarían el script principal
+            with _bare_main():
+                list(pool.map(sleep, [0.05] * PARSE_WORKERS))
+            _pool = pool
+        return _pool
+
+
+def start_pool():
+    """Crear el pool y arrancar sus procesos (desde __main__, antes de los threads)"""
+    return _get_pool()
+
+
+def parse_all(items):
+    """Parsear [(cuerpo, url)] en orden -> [(usuarios | None, error | None)]
+
+    Con pool, los cuerpos se reparten entre los procesos y el thread que llama
+    solo espera (sin el GIL); si el pool falla se parsea aquí mismo.
+    """
+    if not items:
+        return []
+    pool = _get_pool()
+    if pool is not None:
+        try:
+            bodies, urls = zip(*items)
+            return list(pool.map(parse_safe, bodies, urls))
+        except BrokenProcessPool:
+            shutdown_pool()
+    return [parse_safe(data, url) for data, url in items]
+
+
+def shutdown_pool():
+    """Cerrar el pool (al salir o si se rompe); se vuelve a crear al usarlo"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+atexit.register(shutdown_pool)
@@ -0,0 +1,138 @@
+"""Caché de resultados de consultas con invalidación por versión de tabla
+
+Cada tabla tiene un contador de versión que el camino de escritura de
+database.py sube tras cada commit (bump). Un resultado se guarda junto a las
+versiones de las tablas que lee, tomadas antes de ejecutar la consulta, y solo
+se sirve mientras ninguna de ellas haya cambiado: una escritura invalida
+exactamente las consultas de su tabla y una escritura concurrente con la
+consulta deja el resultado ya caducado.
+"""
+import functools
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+import metrics
+
+# BUMBLE_QUERY_CACHE_ENTRIES=0 desactiva la caché
+QUERY_CACHE_ENTRIES = int(os.environ.get('BUMBLE_QUERY_CACHE_ENTRIES', 128))
+# Límite de memoria (aproximada) de todos los resultados; uno mayor no se guarda
+QUERY_CACHE_BYTES = int(os.environ.get('BUMBLE_QUERY_CACHE_BYTES', 32 * 1024 * 1024))
+SIZE_SAMPLE = 32  # elementos medidos de una lista larga para estimar su tamaño
+
+HITS = metrics.counter('bumble_query_cache_hits_total', 'Consultas servidas desde la caché')
+MISSES = metrics.counter('bumble_query_cache_misses_total', 'Consultas ejecutadas en SQLite (sin entrada o caducada)')
+STALE = metrics.counter('bumble_query_cache_stale_total', 'Entradas descartadas por escrituras en sus tablas')
+EVICTIONS = metrics.counter('bumble_query_cache_evictions_total', 'Entradas expulsadas por límite de tamaño')
+ENTRIES = metrics.gauge('bumble_query_cache_entries', 'Entradas en la caché de consultas')
+BYTES = metrics.gauge('bumble_query_cache_bytes', 'Bytes (aproximados) de los resultados en la caché')
+HIT_RATIO = metrics.gauge('bumble_query_cache_hit_ratio', 'Aciertos / consultas de la caché desde el arranque')
+
+_versions = {}
+_entries = OrderedDict()  # (función, ámbito, args) -> (versiones, resultado, bytes)
+_bytes = 0
+_lock = threading.Lock()
+
+
+def bump(*tables):
+    """Marcar tablas como escritas (invalida las consultas que las leen)"""
+    with _lock:
+        for table in tables:
+            _versions[table] = _versions.get(table, 0) + 1
+
+
+def versions(tables):
+    return tuple(_versions.get(table, 0) for table in tables)
+
+
+def sizeof(value):
+    """Tamaño aproximado en bytes de un resultado (listas largas por muestreo)"""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        return size + sum(sizeof(key) + sizeof(item) for key, item in value.items())
+    if isinstance(value, (list, tuple)) and value:
+        sample = value[:SIZE_SAMPLE]
+        return size + sum(sizeof(item) for item in sample) * len(value) // len(sample)
+    return size
+
+
+def _drop(key):
+    """Quitar una entrada (con el lock)"""
+    global _bytes
+    _bytes -= _entries.pop(key)[2]
+
+
+def _update_gauges():
+    ENTRIES.set(len(_entries))
+    BYTES.set(_bytes)
+
+
+def _record(hit):
+    (HITS if hit else MISSES).inc()
+    total = HITS.value + MISSES.value
+    HIT_RATIO.set(round(HITS.value / total, 4) if total else 0.0)
+
+
+def cached(*tables, scope=None):
+    """Decorador: cachear el resultado por función y argumentos
+
+    `tables` son las tablas que lee la consulta y `scope` una función que
+    distingue bases de datos (el archivo actual). El resultado se comparte
+    entre llamadas: quien lo reciba no debe modificarlo. La función original
+    queda en `__wrapped__` (p. ej. para medir la consulta sin caché).
+    """
+    def decorator(func):
+        name = func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if QUERY_CACHE_ENTRIES <= 0:
+                return func(*args, **kwargs)
+            key = (name, scope() if scope else None, args, tuple(sorted(kwargs.items())))
+            with _lock:
+                current = versions(tables)
+                entry = _entries.get(key)
+                if entry is not None:
+                    if entry[0] == current:
+                        _entries.move_to_end(key)
+                    else:
+                        _drop(key)
+                        STALE.inc()
+                        entry = None
+            if entry is not None:
+                _record(True)
+                return entry[1]
+
+            _record(False)
+            result = func(*args, **kwargs)
+            size = sizeof(result)
+            with _lock:
+                # Una escritura durante la consulta: el resultado ya no vale.
+                # Un resultado mayor que el límite (la tabla entera) no se guarda
+                if versions(tables) == current and size <= QUERY_CACHE_BYTES:
+                    _store(key, current, result, size)
+                _update_gauges()
+            return result
+        return wrapper
+    return decorator
+
+
+def _store(key, current, result, size):
+    """Guardar una entrada y expulsar las más antiguas que sobren (con el lock)"""
+    global _bytes
+    if key in _entries:
+        _drop(key)
+    _entries[key] = (current, result, size)
+    _bytes += size
+    while len(_entries) > QUERY_CACHE_ENTRIES or _bytes > QUERY_CACHE_BYTES:
+        _drop(next(iter(_entries)))
+        EVICTIONS.inc()
+
+
+def clear():
+    global _bytes
+    with _lock:
+        _entries.clear()
+        _bytes = 0
+        _update_gauges()
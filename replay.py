@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+🎞️ Grabación y reproducción offline de sesiones
+===============================================
+
+Modo grabación: con BUMBLE_RECORD=sesion.ndjson el monitor envuelve el
+driver de Chrome en un RecordingDriver que guarda cada lote de logs de
+performance, cada respuesta de Network.getResponseBody y los cambios de
+página en un archivo NDJSON.
+
+Modo reproducción: ReplayDriver implementa get_log, execute_cdp_cmd,
+page_source y current_url contra ese archivo, a máxima velocidad o al
+ritmo real de la sesión grabada.
+
+Además del throughput informa de las filas escritas por hora de sesión y
+del crecimiento del WAL; con --no-change-detection se mide sin la
+detección de cambios de save_user para comparar.
+
+Uso:
+    python replay.py sesion.ndjson [--realtime] [--db bench.db] [--no-change-detection]
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+from time import monotonic, perf_counter, sleep
+from types import SimpleNamespace
+
+try:
+    import resource  # solo en Unix: memoria máxima del proceso
+except ImportError:
+    resource = None
+
+
+class RecordingDriver:
+    """Envoltorio de un WebDriver que graba lo que ve la sesión"""
+
+    def __init__(self, driver, path):
+        self._driver = driver
+        self._file = open(path, 'a', encoding='utf-8')
+        self._lock = threading.Lock()
+        self._start = monotonic()
+        self._last_page = None
+
+    def __getattr__(self, name):
+        return getattr(self._driver, name)
+
+    def _write(self, record):
+        record['t'] = round(monotonic() - self._start, 4)
+        with self._lock:
+            self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+            self._file.flush()
+
+    def get_log(self, log_type):
+        entries = self._driver.get_log(log_type)
+        if log_type == 'performance':
+            self._write({'kind': 'log', 'entries': entries})
+        return entries
+
+    def execute_cdp_cmd(self, cmd, cmd_args):
+        result = self._driver.execute_cdp_cmd(cmd, cmd_args)
+        if cmd == 'Network.getResponseBody':
+            self._write({'kind': 'body', 'requestId': cmd_args.get('requestId'), 'result': result})
+        return result
+
+    @property
+    def page_source(self):
+        source = self._driver.page_source
+        page = (self._driver.current_url, source)
+        if page != self._last_page:
+            self._last_page = page
+            self._write({'kind': 'page', 'url': page[0], 'page_source': source})
+        return source
+
+    @property
+    def current_url(self):
+        return self._driver.current_url
+
+    def quit(self):
+        try:
+            self._driver.quit()
+        finally:
+            with self._lock:
+                self._file.close()
+
+
+class ReplayDriver:
+    """WebDriver falso que reproduce una sesión grabada"""
+
+    def __init__(self, path, realtime=False):
+        self.realtime = realtime
+        self.batches = []   # [(t, entries)]
+        self.bodies = {}    # requestId -> resultado de getResponseBody
+        self.pages = []     # [(t, url, page_source)]
+
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                kind = record.get('kind')
+                if kind == 'log':
+                    self.batches.append((record['t'], record['entries']))
+                elif kind == 'body':
+                    self.bodies[record['requestId']] = record['result']
+                elif kind == 'page':
+                    self.pages.append((record['t'], record['url'], record['page_source']))
+
+        self.position = 0
+        self.clock = 0.0
+        self._start = None
+        self.service = SimpleNamespace(process=True)
+
+    @property
+    def exhausted(self):
+        return self.position >= len(self.batches)
+
+    def get_log(self, log_type):
+        if log_type != 'performance' or self.exhausted:
+            if self.exhausted:
+                self.service.process = None
+            return []
+
+        t, entries = self.batches[self.position]
+        self.position += 1
+        self.clock = t
+
+        if self.realtime:
+            if self._start is None:
+                self._start = monotonic() - t
+            delay = t - (monotonic() - self._start)
+            if delay > 0:
+                sleep(delay)
+        return entries
+
+    def execute_cdp_cmd(self, cmd, cmd_args):
+        if cmd == 'Network.getResponseBody':
+            request_id = cmd_args.get('requestId')
+            if request_id not in self.bodies:
+                raise Exception('No data found for resource with given identifier')
+            return self.bodies[request_id]
+        return {}
+
+    def _page(self):
+        current = ('', '')
+        for t, url, source in self.pages:
+            if t > self.clock:
+                break
+            current = (url, source)
+        return current
+
+    @property
+    def page_source(self):
+        return self._page()[1]
+
+    @property
+    def current_url(self):
+        return self._page()[0] or 'https://bumble.com/app'
+
+    # Operaciones de navegación: no-op durante la reproducción
+    def get(self, url):
+        pass
+
+    def refresh(self):
+        pass
+
+    def execute_script(self, script, *args):
+        return None
+
+    def get_cookies(self):
+        return []
+
+    def add_cookie(self, cookie):
+        pass
+
+    def quit(self):
+        self.service.process = None
+
+
+def run_benchmark(path, realtime=False, db_file=None, change_detection=True):
+    """Reproducir una sesión por el pipeline completo captura -> BD -> emit"""
+    import database as db
+    import metrics
+
+    if db_file is None:
+        fd, db_file = tempfile.mkstemp(prefix='bumble_replay_', suffix='.db')
+        os.close(fd)
+        os.remove(db_file)
+    db.DB_FILE = db_file
+    db.CHANGE_DETECTION = change_detection
+
+    import bumble_web
+
+    db.init_database()
+    bumble_web.SETTLE_SCALE = 0
+    bumble_web.session_users.clear()
+    bumble_web.bodycache.clear()
+
+    counters = (metrics.ROWS_INSERTED, metrics.ROWS_UPDATED, metrics.ROWS_TOUCHED)
+    written_before = [c.value for c in counters]
+    cache_before = (bumble_web.bodycache.body_cache.hits.value, bumble_web.bodycache.request_cache.hits.value)
+    # Una transacción de lectura abierta impide que SQLite reinicie o borre el
+    # WAL: al final su tamaño son todos los bytes escritos en la reproducción
+    wal_file = db_file + '-wal'
+    pin = sqlite3.connect(db_file)
+    pin.execute('BEGIN')
+    pin.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()
+    wal_before = os.path.getsize(wal_file) if os.path.exists(wal_file) else 0
+
+    driver = ReplayDriver(path, realtime=realtime)
+    start = perf_counter()
+    polls = 0
+    while not driver.exhausted:
+        bumble_web.get_likes(driver)
+        polls += 1
+    db.flush_touches()
+    elapsed = perf_counter() - start
+
+    inserted, updated, touched = (c.value - before for c, before in zip(counters, written_before))
+    body_hits = bumble_web.bodycache.body_cache.hits.value - cache_before[0]
+    request_hits = bumble_web.bodycache.request_cache.hits.value - cache_before[1]
+    wal_after = os.path.getsize(wal_file) if os.path.exists(wal_file) else 0
+    pin.rollback()
+    pin.close()
+    # Horas de la sesión grabada (no del tiempo de reproducción)
+    session_hours = driver.clock / 3600
+
+    users = len(bumble_web.session_users)
+    store = bumble_web.session_users
+    return {
+        'batches': len(driver.batches),
+        'bodies': len(driver.bodies),
+        'polls': polls,
+        'users': users,
+        'seconds': round(elapsed, 4),
+        'users_per_sec': round(users / elapsed, 1) if elapsed > 0 else 0.0,
+        'rows_inserted': inserted,
+        'rows_updated': updated,
+        'rows_touched': touched,
+        'rows_per_hour': round((inserted + updated + touched) / session_hours, 1) if session_hours > 0 else None,
+        'wal_growth_bytes': wal_after - wal_before,
+        'body_cache_hits': body_hits,
+        'request_cache_hits': request_hits,
+        'session_resident_users': len(store.resident),
+        'session_resident_bytes': store.bytes,
+        'session_spilled_users': store.spilled,
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else None,
+        'change_detection': change_detection,
+        'db_file': db_file
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Reproducir una sesión grabada y medir throughput')
+    parser.add_argument('session', help='Archivo NDJSON grabado con BUMBLE_RECORD')
+    parser.add_argument('--realtime', action='store_true', help='Respetar el ritmo original de la sesión')
+    parser.add_argument('--db', default=None, help='Base de datos de destino (por defecto, temporal)')
+    parser.add_argument('--no-change-detection', action='store_true',
+                        help='Reescribir todas las columnas en cada save_user (para comparar)')
+    args = parser.parse_args()
+
+    result = run_benchmark(args.session, realtime=args.realtime, db_file=args.db,
+                           change_detection=not args.no_change_detection)
+
+    print("\n" + "=" * 60)
+    print("🎞️ REPRODUCCIÓN OFFLINE")
+    print("=" * 60)
+    print(f"Lotes de log:       {result['batches']}")
+    print(f"Respuestas:         {result['bodies']}")
+    print(f"Usuarios ingeridos: {result['users']}")
+    print(f"Tiempo:             {result['seconds']}s")
+    print(f"Throughput:         {result['users_per_sec']} usuarios/s")
+    print(f"Detección cambios:  {'sí' if result['change_detection'] else 'no'}")
+    print(f"Filas escritas:     {result['rows_inserted']} insertadas, {result['rows_updated']} actualizadas, "
+          f"{result['rows_touched']} solo last_seen")
+    print(f"Filas por hora:     {result['rows_per_hour'] if result['rows_per_hour'] is not None else 'n/d'}")
+    print(f"Crecimiento WAL:    {result['wal_growth_bytes'] / 1024:.1f} KB")
+    print(f"Caché de cuerpos:   {result['body_cache_hits']} repetidos, {result['request_cache_hits']} requestId ya leídos")
+    print(f"Sesión en memoria:  {result['session_resident_users']} usuarios "
+          f"({result['session_resident_bytes'] / 1024:.1f} KB), {result['session_spilled_users']} en SQLite")
+    print(f"Memoria máxima:     {result['peak_rss_kb'] / 1024:.1f} MB" if result['peak_rss_kb'] else "Memoria máxima:     n/d")
+    print(f"Base de datos:      {result['db_file']}")
+    print("=" * 60 + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+"""Retención: archivar filas antiguas de users y activity_log y devolver espacio
+
+Cada política elige las filas que sobran de una tabla, por antigüedad
+(max_days) o por número de filas (max_rows, se archivan las más antiguas).
+Las filas se mueven por lotes de ARCHIVE_BATCH a otra base de datos
+(BUMBLE_ARCHIVE_FILE), con las mismas columnas, en una transacción por lote.
+El espacio que dejan se devuelve al sistema con PRAGMA incremental_vacuum, de
+VACUUM_PAGES páginas por paso.
+
+step() hace un único paso (un lote o un vacuum) y es lo que ejecuta el
+planificador del monitor en sus huecos libres. Desde la línea de comandos,
+con el servidor parado (sus cachés en memoria no se enteran de lo archivado
+desde otro proceso):
+
+    python retention.py                  # archivar y compactar todo lo pendiente
+    python retention.py --dry-run        # cuántas filas se archivarían
+    python retention.py --enable-incremental-vacuum   # una vez, en BD antiguas
+
+Las bases de datos creadas antes de auto_vacuum=INCREMENTAL necesitan un
+VACUUM completo para activarlo (--enable-incremental-vacuum, con el servidor
+parado); hasta entonces se archiva igual, pero el archivo no se reduce.
+"""
+import argparse
+import os
+import sqlite3
+from time import time
+
+import bodycache
+import database as db
+import metrics
+import querycache
+
+ARCHIVE_FILE = os.environ.get('BUMBLE_ARCHIVE_FILE', 'bumble_archive.db')
+
+# 0 desactiva cada límite
+USERS_MAX_DAYS = float(os.environ.get('BUMBLE_RETENTION_USERS_DAYS', 0))
+USERS_MAX_ROWS = int(os.environ.get('BUMBLE_RETENTION_USERS_ROWS', 0))
+ACTIVITY_MAX_DAYS = float(os.environ.get('BUMBLE_RETENTION_ACTIVITY_DAYS', 0))
+ACTIVITY_MAX_ROWS = int(os.environ.get('BUMBLE_RETENTION_ACTIVITY_ROWS', 0))
+# Los matches no se archivan (BUMBLE_RETENTION_KEEP_MATCHES=0 para archivarlos también)
+KEEP_MATCHES = os.environ.get('BUMBLE_RETENTION_KEEP_MATCHES', '1') != '0'
+
+ARCHIVE_BATCH = 500     # filas por transacción
+VACUUM_PAGES = 256      # páginas devueltas por paso de incremental_vacuum
+
+INCREMENTAL = 2         # valor de PRAGMA auto_vacuum
+
+ARCHIVED_USERS = metrics.counter('bumble_retention_users_archived_total', 'Usuarios movidos al archivo')
+ARCHIVED_ACTIVITY = metrics.counter('bumble_retention_activity_archived_total', 'Entradas de actividad movidas al archivo')
+VACUUMED_PAGES = metrics.counter('bumble_retention_vacuumed_pages_total', 'Páginas devueltas con incremental_vacuum')
+FREELIST_PAGES = metrics.gauge('bumble_db_freelist_pages', 'Páginas libres en la base de datos')
+
+
+class Policy:
+    """Qué filas de una tabla se archivan
+
+    time_column: columna (indexada) que ordena de más antigua a más reciente
+    max_days:    archivar las filas de hace más de max_days días
+    max_rows:    archivar las más antiguas que pasen de max_rows filas
+    keep:        condición SQL de las filas que nunca se archivan
+    """
+
+    def __init__(self, table, time_column, max_days=0, max_rows=0, keep=None, counter=None):
+        self.table = table
+        self.time_column = time_column
+        self.max_days = max_days
+        self.max_rows = max_rows
+        self.keep = keep
+        self.counter = counter
+
+    @property
+    def enabled(self):
+        return self.max_days > 0 or self.max_rows > 0
+
+    def _oldest(self, conn, conditions, params, limit):
+        where = ' AND '.join([f'{self.time_column} IS NOT NULL'] + conditions)
+        rows = conn.execute(
+            f'SELECT rowid FROM {self.table} WHERE {where} ORDER BY {self.time_column} LIMIT ?',
+            params + [limit]
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def select_batch(self, conn, limit=None):
+        """rowids del próximo lote a archivar, los más antiguos primero (limit=None: todos)"""
+        keep = [f'NOT ({self.keep})'] if self.keep else []
+        if self.max_rows > 0:
+            # Por número de filas: como mucho las que pasan de max_rows
+            excess = conn.execute(f'SELECT COUNT(*) FROM {self.table}').fetchone()[0] - self.max_rows
+            if excess > 0:
+                rowids = self._oldest(conn, keep, [], excess if limit is None else min(limit, excess))
+                if rowids:
+                    return rowids
+        if self.max_days > 0:
+            cutoff = int(time() - self.max_days * 86400)
+            return self._oldest(conn, keep + [f'{self.time_column} < ?'], [cutoff], -1 if limit is None else limit)
+        return []
+
+
+def policies():
+    return (
+        Policy('users', 'last_seen_ts', USERS_MAX_DAYS, USERS_MAX_ROWS,
+               keep='has_voted = 1' if KEEP_MATCHES else None, counter=ARCHIVED_USERS),
+        Policy('activity_log', 'ts', ACTIVITY_MAX_DAYS, ACTIVITY_MAX_ROWS, counter=ARCHIVED_ACTIVITY),
+    )
+
+
+def _connect():
+    conn = sqlite3.connect(db.DB_FILE, isolation_level=None)
+    conn.execute('ATTACH DATABASE ? AS archive', (ARCHIVE_FILE,))
+    return conn
+
+
+def _prepare_archive(conn, table):
+    """Crear la tabla en el archivo con el mismo CREATE y añadirle columnas nuevas; devuelve las columnas"""
+    columns = [(info[1], info[2]) for info in conn.execute(f'PRAGMA main.table_info({table})')]
+    archived = {info[1] for info in conn.execute(f'PRAGMA archive.table_info({table})')}
+    if not archived:
+        sql = conn.execute("SELECT sql FROM main.sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()[0]
+        conn.execute(sql.replace('CREATE TABLE ', 'CREATE TABLE archive.', 1))
+    else:
+        for name, column_type in columns:
+            if name not in archived:
+                conn.execute(f'ALTER TABLE archive.{table} ADD COLUMN {name} {column_type}')
+    return [name for name, _ in columns]
+
+
+def archive_batch(policy, limit=ARCHIVE_BATCH):
+    """Mover un lote de filas de la política al archivo; devuelve cuántas"""
+    conn = _connect()
+    try:
+        columns = ', '.join(_prepare_archive(conn, policy.table))
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            rowids = policy.select_batch(conn, limit)
+            if not rowids:
+                conn.execute('ROLLBACK')
+                return 0
+            where = f'rowid IN ({", ".join("?" * len(rowids))})'
+            user_ids = ([row[0] for row in conn.execute(f'SELECT id FROM users WHERE {where}', rowids)]
+                        if policy.table == 'users' else [])
+            # Primero copiar: si algo falla a medias la fila queda en los dos sitios, nunca en ninguno
+            conn.execute(f'INSERT OR REPLACE INTO archive.{policy.table} ({columns}) '
+                         f'SELECT {columns} FROM main.{policy.table} WHERE {where}', rowids)
+            conn.execute(f'DELETE FROM main.{policy.table} WHERE {where}', rowids)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+    finally:
+        conn.close()
+
+    if user_ids:
+        # Una respuesta repetida con estos usuarios no debe quedarse en touch_users
+        # (UPDATE sobre filas que ya no están): se vuelve a procesar y se guardan
+        db.forget_users(user_ids)
+        bodycache.forget_users(user_ids)
+    querycache.bump(policy.table)
+    if policy.counter is not None:
+        policy.counter.inc(len(rowids))
+    return len(rowids)
+
+
+def vacuum_step(pages=VACUUM_PAGES):
+    """Devolver hasta `pages` páginas libres; devuelve cuántas (0 sin auto_vacuum incremental)"""
+    conn = sqlite3.connect(db.DB_FILE)
+    try:
+        free = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        if free and conn.execute('PRAGMA auto_vacuum').fetchone()[0] == INCREMENTAL:
+            conn.execute(f'PRAGMA incremental_vacuum({int(pages)})').fetchall()
+            conn.commit()
+            remaining = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        else:
+            remaining = free
+    finally:
+        conn.close()
+    FREELIST_PAGES.set(remaining)
+    VACUUMED_PAGES.inc(free - remaining)
+    return free - remaining
+
+
+def step():
+    """Un paso de mantenimiento: un lote de la primera política con filas que archivar o,
+    si no queda ninguna, un paso de vacuum. Devuelve {tabla o 'vacuum': cantidad}, vacío si no
+    había nada que hacer.
+    """
+    for policy in policies():
+        if policy.enabled:
+            moved = archive_batch(policy)
+            if moved:
+                return {policy.table: moved}
+    freed = vacuum_step()
+    return {'vacuum': freed} if freed else {}
+
+
+def run():
+    """Archivar y compactar hasta que no quede nada pendiente; totales por tabla"""
+    totals = {}
+    while True:
+        done = step()
+        if not done:
+            return totals
+        for key, count in done.items():
+            totals[key] = totals.get(key, 0) + count
+
+
+def pending():
+    """Filas que archivaría cada política ahora (sin mover nada)"""
+    conn = sqlite3.connect(db.DB_FILE)
+    try:
+        return {policy.table: len(policy.select_batch(conn)) for policy in policies() if policy.enabled}
+    finally:
+        conn.close()
+
+
+def enable_incremental_vacuum():
+    """Activar auto_vacuum=INCREMENTAL en una base de datos antigua (VACUUM completo)"""
+    conn = sqlite3.connect(db.DB_FILE, isolation_level=None)
+    try:
+        if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != INCREMENTAL:
+            conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+            conn.execute('VACUUM')
+        return conn.execute('PRAGMA auto_vacuum').fetchone()[0] == INCREMENTAL
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Archivar filas antiguas y compactar la base de datos (con el servidor parado)')
+    parser.add_argument('--db', default=None, help=f'Base de datos (por defecto {db.DB_FILE})')
+    parser.add_argument('--dry-run', action='store_true', help='Solo contar las filas que se archivarían')
+    parser.add_argument('--enable-incremental-vacuum', action='store_true',
+                        help='Activar auto_vacuum incremental (VACUUM completo, con el servidor parado)')
+    args = parser.parse_args()
+    if args.db:
+        db.DB_FILE = args.db
+
+    if args.enable_incremental_vacuum:
+        print('✅ auto_vacuum incremental activado' if enable_incremental_vacuum() else '⚠️ No se pudo activar')
+    elif args.dry_run:
+        for table, count in pending().items():
+            print(f'{table}: {count} filas a archivar en {ARCHIVE_FILE}')
+    else:
+        size = os.path.getsize(db.DB_FILE)
+        totals = run()
+        for table in ('users', 'activity_log'):
+            print(f'{table}: {totals.get(table, 0)} filas archivadas en {ARCHIVE_FILE}')
+        print(f'{totals.get("vacuum", 0)} páginas devueltas '
+              f'({size / 1024 / 1024:.1f} MB -> {os.path.getsize(db.DB_FILE) / 1024 / 1024:.1f} MB)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+"""Planificador de las tareas periódicas del monitor en un solo thread
+
+Cada tarea tiene su intervalo y lo alarga (hasta un máximo) mientras no
+encuentra trabajo; el thread duerme hasta la próxima tarea vencida en vez
+de sondear a ritmo fijo. Sin clientes conectados se pausan o espacian las
+tareas que solo sirven a la página, y las tareas de mantenimiento (idle)
+solo ocupan los huecos entre las demás.
+"""
+import threading
+from time import monotonic
+
+import metrics
+
+# Espera máxima sin revisar si hay que parar (stop() despierta antes)
+MAX_WAIT = 5.0
+
+# Hueco mínimo hasta la próxima tarea normal para ejecutar una de reposo
+IDLE_SLOT = 0.2
+
+# Qué hace una tarea mientras no hay clientes conectados
+RUN = 'run'    # nada cambia
+SKIP = 'skip'  # no se ejecuta (solo sirve a los clientes)
+SLOW = 'slow'  # se ejecuta a su intervalo máximo
+
+
+class Task:
+    """Tarea periódica con intervalo propio y espera creciente en reposo
+
+    La función devuelve True si hubo actividad (vuelve al intervalo base),
+    False si no la hubo (el intervalo se multiplica por `backoff` hasta
+    `max_interval`) o None para mantener el intervalo actual.
+
+    Una tarea `idle` (mantenimiento) solo se ejecuta en un hueco: cuando
+    ninguna tarea normal toca en los próximos IDLE_SLOT segundos, y de una
+    en una. Debe hacer un paso corto de su trabajo cada vez.
+    """
+
+    def __init__(self, name, fn, interval, max_interval=None, backoff=2.0, on_pause=RUN, idle=False):
+        self.name = name
+        self.fn = fn
+        self.interval = interval
+        self.max_interval = max(max_interval or interval, interval)
+        self.backoff = backoff
+        self.on_pause = on_pause
+        self.idle = idle
+        self.current = interval
+        self.next_run = 0.0
+
+
+class Scheduler:
+    """Ejecuta tareas periódicas en un único thread, durmiendo hasta la próxima"""
+
+    def __init__(self):
+        self.tasks = {}
+        self.lock = threading.Lock()
+        self.event = threading.Event()
+        self.paused = False
+        self.running = False
+
+    def add(self, task):
+        with self.lock:
+            self.tasks[task.name] = task
+        self.event.set()
+        return task
+
+    def clear(self):
+        with self.lock:
+            self.tasks.clear()
+
+    def set_interval(self, name, interval, max_interval=None):
+        """Cambiar el intervalo de una tarea (p. ej. el delay del autolike)
+
+        La siguiente ejecución queda a un intervalo de ahora.
+        """
+        with self.lock:
+            task = self.tasks.get(name)
+            if task is None:
+                return
+            task.interval = interval
+            task.max_interval = max(max_interval or interval, interval)
+            task.current = interval
+        self.wake(name, interval)
+
+    def wake(self, name=None, delay=0.0):
+        """Adelantar una tarea (o todas) para que se ejecute dentro de `delay` segundos"""
+        at = monotonic() + delay
+        with self.lock:
+            tasks = self.tasks.values() if name is None else [self.tasks[name]] if name in self.tasks else []
+            for task in tasks:
+                task.current = task.interval
+                task.next_run = min(task.next_run, at)
+        self.event.set()
+
+    def set_paused(self, paused):
+        """Sin clientes: las tareas SKIP no se ejecutan y las SLOW van a su intervalo máximo"""
+        if paused == self.paused:
+            return
+        self.paused = paused
+        if paused:
+            self.event.set()
+        else:
+            self.wake()
+
+    def _next_regular(self):
+        """Próxima ejecución de una tarea normal (llamar con el lock)"""
+        return min((t.next_run for t in self.tasks.values() if not t.idle), default=float('inf'))
+
+    def stop(self):
+        self.running = False
+        self.event.set()
+
+    def run(self):
+        """Bucle principal: ejecutar las tareas vencidas y dormir hasta la siguiente"""
+        self.running = True
+        while self.running:
+            self.event.clear()
+            now = monotonic()
+            with self.lock:
+                due = [t for t in self.tasks.values() if t.next_run <= now and not t.idle]
+                if not due and self._next_regular() - now >= IDLE_SLOT:
+                    due = [t for t in self.tasks.values() if t.next_run <= now and t.idle][:1]
+                for task in due:
+                    # Un wake() durante la ejecución adelanta la siguiente
+                    task.next_run = float('inf')
+
+            for task in due:
+                if not self.running:
+                    break
+                if self.paused and task.on_pause == SKIP:
+                    result = None
+                else:
+                    with metrics.SCHEDULER_TASK_SECONDS.time(task.name):
+                        result = task.fn()
+
+                with self.lock:
+                    if result is True:
+                        task.current = task.interval
+                    elif result is False:
+                        task.current = min(task.current * task.backoff, task.max_interval)
+                    interval = task.max_interval if self.paused and task.on_pause == SLOW else task.current
+                    task.next_run = min(task.next_run, now + interval)
+
+            with self.lock:
+                next_regular = self._next_regular()
+                next_idle = min((t.next_run for t in self.tasks.values() if t.idle), default=float('inf'))
+            now = monotonic()
+            if next_idle <= now and next_regular - now < IDLE_SLOT:
+                next_idle = next_regular  # sin hueco ahora: después de la tarea normal
+            timeout = min(max(0.0, min(next_regular, next_idle) - now), MAX_WAIT)
+            if timeout > 0:
+                self.event.wait(timeout)
+                metrics.SCHEDULER_WAKEUPS.inc()
@@ -0,0 +1,204 @@
+"""Especificación de las columnas de un perfil (tabla users)
+
+Cada atributo se declara una sola vez en USER_SPEC: columna y tipo SQL, de
+dónde sale en la respuesta de la API y cómo se guarda y se lee. A partir de
+ella se generan el CREATE TABLE, las sentencias de guardado, los SELECT y los
+conversores fila -> diccionario, y la tabla id de profile_field -> columna.
+Añadir un atributo es añadir una línea aquí (la columna se crea sola en las
+bases de datos existentes).
+"""
+import json
+
+# Tipos de valor: cómo se guarda en SQLite y cómo se devuelve
+TEXT = 'text'
+INT = 'int'
+BOOL = 'bool'    # entero 0/1 en la BD
+JSON = 'json'    # lista serializada en la BD, lista al leer
+REAL = 'real'
+
+SQL_TYPES = {TEXT: 'TEXT', INT: 'INTEGER', BOOL: 'BOOLEAN', JSON: 'TEXT', REAL: 'REAL'}
+
+
+class Field:
+    """Un atributo del perfil
+
+    source:  ruta en el usuario de la API, p. ej. ('city', 'name'); None si
+             se calcula en parsing.py (foto, intereses, Instagram...)
+    profile: fragmentos del id de profile_fields que rellenan la columna
+    content: forma parte del contenido comparado al actualizar (huella)
+    public:  se devuelve a los clientes al leer la fila
+    """
+
+    def __init__(self, name, kind=TEXT, default='', required=False, source=None, profile=(),
+                 content=True, public=True, primary_key=False):
+        self.name = name
+        self.kind = kind
+        self.default = default
+        self.required = required
+        self.source = source
+        self.profile = profile
+        self.content = content
+        self.public = public
+        self.primary_key = primary_key
+
+    @property
+    def sql(self):
+        sql = f'{self.name} {SQL_TYPES[self.kind]}'
+        if self.primary_key:
+            return sql + ' PRIMARY KEY'
+        return sql + ' NOT NULL' if self.required else sql
+
+
+def _profile(name):
+    """Columna rellenada desde profile_fields (id de Bumble: lifestyle_<name>)"""
+    return Field(name, profile=(name,))
+
+
+# Orden = orden de las columnas en la tabla
+USER_SPEC = (
+    Field('id', primary_key=True, source=('user_id',), content=False),
+    Field('name', required=True, default='Usuario', source=('name',)),
+    Field('display_name', required=True),
+    Field('age', INT, default=0, required=True, source=('age',)),
+    Field('has_voted', BOOL, default=False, required=True),
+    Field('photo', default=None),
+    Field('timestamp', required=True, content=False),
+    Field('first_seen', required=True, content=False),
+    Field('last_seen', required=True, content=False),
+    Field('distance_short', source=('distance_short',)),
+    Field('online_status', INT, default=0, source=('online_status',)),
+    Field('is_verified', INT, default=False, source=('is_verified',)),
+    Field('interests', JSON, default=()),
+    _profile('education'),
+    _profile('height'),
+    _profile('smoking'),
+    _profile('drinking'),
+    _profile('exercise'),
+    _profile('pets'),
+    _profile('politics'),
+    _profile('religion'),
+    # Bumble lo escribe "zodiak"
+    Field('zodiac', profile=('zodiak', 'zodiac')),
+    _profile('dating_intentions'),
+    Field('instagram_connected', INT, default=False),
+    Field('spotify_track'),
+    Field('city', source=('city', 'name')),
+    Field('country', source=('country', 'name')),
+    # Columnas numéricas derivadas (ver database.NUMERIC_COLUMNS)
+    Field('first_seen_ts', INT, default=None, content=False),
+    Field('last_seen_ts', INT, default=None, content=False),
+    Field('detected_ts', INT, default=None, content=False),
+    Field('distance_km', REAL, default=None, content=False),
+    Field('fingerprint', default=None, content=False, public=False),
+)
+
+FIELDS = {field.name: field for field in USER_SPEC}
+
+# Columnas de contenido: forman la huella del perfil y se comparan al actualizar
+CONTENT_COLUMNS = tuple(field.name for field in USER_SPEC if field.content)
+PROFILE_COLUMNS = tuple(field.name for field in USER_SPEC if field.profile)
+PUBLIC_COLUMNS = tuple(field.name for field in USER_SPEC if field.public)
+
+
+# ---------------------------------------------------------------------------
+# SQL generado
+# ---------------------------------------------------------------------------
+
+CREATE_USERS_SQL = 'CREATE TABLE IF NOT EXISTS users (\n    ' + ',\n    '.join(
+    field.sql for field in USER_SPEC
+) + '\n)'
+
+
+def column_definition(name):
+    """Definición para ALTER TABLE ADD COLUMN (sin NOT NULL: las filas antiguas no tienen valor)"""
+    return f'{name} {SQL_TYPES[FIELDS[name].kind]}'
+
+
+def select_sql(columns=PUBLIC_COLUMNS, table='users'):
+    """Lista de columnas para un SELECT (con prefijo de tabla, para los JOIN)"""
+    return ', '.join(f'{table}.{column}' for column in columns)
+
+
+def insert_sql(columns):
+    return f'INSERT INTO users ({", ".join(columns)}) VALUES ({", ".join("?" * len(columns))})'
+
+
+def update_sql(columns):
+    return f'UPDATE users SET {", ".join(f"{column} = ?" for column in columns)} WHERE id = ?'
+
+
+# ---------------------------------------------------------------------------
+# Conversión de valores
+# ---------------------------------------------------------------------------
+
+def to_db(field, value):
+    """Valor de Python -> valor guardado en SQLite"""
+    if field.kind == JSON:
+        return value if isinstance(value, str) else json.dumps(list(value or ()), ensure_ascii=False)
+    if isinstance(value, bool):
+        return int(value)
+    return value
+
+
+def content_values(user_info):
+    """Valores de las columnas de contenido tal y como se guardan en la BD"""
+    return {
+        column: to_db(FIELDS[column], user_info.get(column, FIELDS[column].default))
+        for column in CONTENT_COLUMNS
+    }
+
+
+def _load_json(value):
+    if value and isinstance(value, str):
+        try:
+            return json.loads(value)
+        except ValueError:
+            return []
+    return value or []
+
+
+def row_mapper(columns=PUBLIC_COLUMNS, detected_at=False):
+    """Función fila -> diccionario para un SELECT de `columns`"""
+    json_positions = [i for i, column in enumerate(columns) if FIELDS[column].kind == JSON]
+    alias = detected_at and 'first_seen' in columns
+
+    def to_user(row):
+        user = dict(zip(columns, row))
+        for i in json_positions:
+            user[columns[i]] = _load_json(row[i])
+        if alias:
+            user['detected_at'] = user['first_seen']  # first_seen como detected_at
+        return user
+    return to_user
+
+
+# ---------------------------------------------------------------------------
+# Extracción desde la API
+# ---------------------------------------------------------------------------
+
+# id de profile_field -> columna. Se rellena con los ids de Bumble conocidos
+# y se completa (también con los que no corresponden a ninguna) la primera vez
+# que aparece cada id, así cada campo de un perfil cuesta una búsqueda.
+_profile_lookup = {
+    f'lifestyle_{fragment}': field.name for field in USER_SPEC for fragment in field.profile
+}
+
+
+def profile_column(field_id):
+    """Columna de un id de profile_fields (None si no se guarda)"""
+    try:
+        return _profile_lookup[field_id]
+    except KeyError:
+        column = next((field.name for field in USER_SPEC if field.profile
+                       and any(fragment in field_id for fragment in field.profile)), None)
+        _profile_lookup[field_id] = column
+        return column
+
+
+def get_path(data, path, default=''):
+    """data[path[0]][path[1]]... o `default` si falta algún nivel"""
+    for key in path:
+        if not isinstance(data, dict) or key not in data:
+            return default
+        data = data[key]
+    return data
@@ -0,0 +1,112 @@
+"""Usuarios de la sesión de monitoreo: ventana en memoria y resto en SQLite
+
+La sesión puede durar horas y ver decenas de miles de perfiles: los más
+recientes se quedan en memoria (límite de usuarios y de bytes) y los más
+antiguos se expulsan por lotes a la tabla session_users, desde donde se
+siguen leyendo con la misma API.
+"""
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import database as db
+import metrics
+
+# Ventana en memoria (BUMBLE_SESSION_MAX_USERS / BUMBLE_SESSION_MAX_BYTES)
+SESSION_MAX_USERS = int(os.environ.get('BUMBLE_SESSION_MAX_USERS', 2000))
+SESSION_MAX_BYTES = int(os.environ.get('BUMBLE_SESSION_MAX_BYTES', 8 * 1024 * 1024))
+# Al pasar del límite se expulsa hasta quedar en esta fracción: un lote por
+# escritura en vez de una fila por usuario nuevo
+SPILL_LOW_WATER = 0.9
+
+RESIDENT_USERS = metrics.gauge('bumble_session_resident_users', 'Usuarios de la sesión en memoria')
+RESIDENT_BYTES = metrics.gauge('bumble_session_resident_bytes', 'Bytes (JSON) de los usuarios de la sesión en memoria')
+SPILLED_USERS = metrics.gauge('bumble_session_spilled_users', 'Usuarios de la sesión expulsados a SQLite')
+
+
+class SessionStore:
+    """Usuarios vistos en la sesión de monitoreo, en orden de llegada
+
+    Los más recientes viven en memoria, hasta max_users entradas o max_bytes
+    (tamaño en JSON). Los más antiguos se expulsan a la tabla session_users y
+    se siguen sirviendo desde SQLite con la misma API: todos los usuarios de
+    la sesión ya están guardados en users, así que expulsar solo apunta su id.
+    """
+
+    def __init__(self, max_users=SESSION_MAX_USERS, max_bytes=SESSION_MAX_BYTES):
+        self.max_users = max_users
+        self.max_bytes = max_bytes
+        self.resident = OrderedDict()  # id -> (usuario, bytes)
+        self.bytes = 0
+        self.spilled = 0               # usuarios expulsados a session_users
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return self.spilled + len(self.resident)
+
+    def __contains__(self, user_id):
+        return self.get(user_id) is not None
+
+    def add(self, user):
+        """Añadir un usuario nuevo en la sesión (expulsa los más antiguos si no cabe)"""
+        size = len(json.dumps(user, ensure_ascii=False, default=str))
+        evicted = []
+        with self.lock:
+            previous = self.resident.pop(user['id'], None)
+            if previous is not None:
+                self.bytes -= previous[1]
+            self.resident[user['id']] = (user, size)
+            self.bytes += size
+            if len(self.resident) > self.max_users or self.bytes > self.max_bytes:
+                max_users = int(self.max_users * SPILL_LOW_WATER)
+                max_bytes = int(self.max_bytes * SPILL_LOW_WATER)
+                while len(self.resident) > 1 and (len(self.resident) > max_users or self.bytes > max_bytes):
+                    user_id, (_, evicted_size) = self.resident.popitem(last=False)
+                    self.bytes -= evicted_size
+                    evicted.append(user_id)
+            if evicted:
+                # Dentro del lock: page() no ve el contador antes que las filas
+                db.spill_session_users(evicted)
+                self.spilled += len(evicted)
+            self._update_gauges()
+
+    def get(self, user_id):
+        """Usuario de la sesión (de memoria o de SQLite) o None"""
+        entry = self.resident.get(user_id)
+        if entry is not None:
+            return entry[0]
+        if self.spilled:
+            return db.get_session_user(user_id)
+        return None
+
+    def window(self):
+        """Usuarios en memoria (los más recientes), en orden de llegada"""
+        with self.lock:
+            return [user for user, _ in self.resident.values()]
+
+    def page(self, offset=0, limit=None):
+        """Usuarios de la sesión en orden de llegada, de SQLite y de memoria"""
+        with self.lock:
+            spilled = self.spilled
+            resident = [user for user, _ in self.resident.values()]
+        users = []
+        if offset < spilled:
+            count = spilled - offset if limit is None else min(limit, spilled - offset)
+            users = db.get_session_users(offset, count)
+        start = max(0, offset - spilled)
+        remaining = None if limit is None else limit - len(users)
+        return users + resident[start:None if remaining is None else start + remaining]
+
+    def _update_gauges(self):
+        RESIDENT_USERS.set(len(self.resident))
+        RESIDENT_BYTES.set(self.bytes)
+        SPILLED_USERS.set(self.spilled)
+
+    def clear(self):
+        with self.lock:
+            self.resident.clear()
+            self.bytes = 0
+            self.spilled = 0
+            self._update_gauges()
+        db.clear_session_users()
@@ -0,0 +1,61 @@
+"""Agrupación de peticiones idénticas en curso (single-flight)
+
+La primera petición de una clave dirige el vuelo: hace el trabajo y entrega el
+resultado a todas las que se unieron mientras tanto. Las demás solo se apuntan
+y vuelven enseguida, sin ocupar la base de datos ni bloquear su thread.
+"""
+import os
+import threading
+
+import metrics
+
+# BUMBLE_SINGLE_FLIGHT=0: cada petición hace su propio trabajo (para comparar)
+ENABLED = os.environ.get('BUMBLE_SINGLE_FLIGHT', '1') != '0'
+
+FLIGHTS = metrics.counter('bumble_singleflight_flights_total', 'Peticiones que hicieron el trabajo')
+COALESCED = metrics.counter('bumble_singleflight_coalesced_total', 'Peticiones servidas por un vuelo ya en curso')
+
+
+class Flight:
+    """Un trabajo en curso y quienes esperan su resultado"""
+
+    def __init__(self, key, waiter):
+        self.key = key
+        self.waiters = [waiter]
+        self.open = True  # admite más esperas
+
+
+class Group:
+    def __init__(self):
+        self.flights = {}
+        self.lock = threading.Lock()
+
+    def join(self, key, waiter):
+        """Unirse al vuelo de `key`
+
+        Devuelve el vuelo si quien llama lo dirige (debe hacer el trabajo y
+        llamar a close) o None si se apuntó a uno en curso.
+        """
+        with self.lock:
+            flight = self.flights.get(key) if ENABLED else None
+            if flight is not None and flight.open:
+                flight.waiters.append(waiter)
+                COALESCED.inc()
+                return None
+            flight = Flight(key, waiter)
+            if ENABLED:
+                self.flights[key] = flight
+        FLIGHTS.inc()
+        return flight
+
+    def close(self, flight):
+        """Cerrar el vuelo a nuevas esperas y devolver quienes esperan
+
+        Las peticiones que lleguen después empiezan un vuelo nuevo: un
+        resultado ya calculado puede no reflejar lo que las motivó.
+        """
+        with self.lock:
+            flight.open = False
+            if self.flights.get(flight.key) is flight:
+                del self.flights[flight.key]
+            return list(flight.waiters)
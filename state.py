@@ -0,0 +1,103 @@
+"""Estado global del monitor como instantáneas inmutables con versión
+
+Sustituye al diccionario compartido: los threads leen una instantánea
+completa sin lock, las escrituras publican una nueva con la versión
+siguiente y los clientes preguntan "¿cambió desde la versión v?".
+"""
+import threading
+from collections import namedtuple
+
+# Instantánea inmutable del estado del monitor
+MonitorState = namedtuple('MonitorState', (
+    'version',           # sube en cada escritura ("¿cambió desde v?")
+    'running',
+    'driver',
+    'start_time',
+    'history_total',     # usuarios en la BD (se cuenta, no se carga)
+    'autolike_enabled',
+    'autolike_delay',    # segundos entre likes
+    'autolike_count',
+))
+
+INITIAL_STATE = MonitorState(
+    version=0,
+    running=False,
+    driver=None,
+    start_time=None,
+    history_total=0,
+    autolike_enabled=False,
+    autolike_delay=3,
+    autolike_count=0,
+)
+
+# Campos que se envían a los clientes (el driver no)
+PUBLIC_FIELDS = tuple(field for field in MonitorState._fields if field != 'driver')
+
+
+class StateStore:
+    """Estado compartido con copia en escritura
+
+    Los lectores toman la instantánea actual (una lectura de referencia, sin
+    lock) y ven siempre un estado completo. Las escrituras se serializan con un
+    lock, construyen una instantánea nueva con la versión siguiente y la
+    publican sustituyendo la referencia.
+    """
+
+    def __init__(self, initial=INITIAL_STATE):
+        self._snapshot = initial
+        self._lock = threading.Lock()
+
+    def snapshot(self):
+        return self._snapshot
+
+    def __getitem__(self, field):
+        """Un campo de la instantánea actual (para varios campos, usar snapshot())"""
+        return getattr(self._snapshot, field)
+
+    @property
+    def version(self):
+        return self._snapshot.version
+
+    def update(self, **changes):
+        """Escribir varios campos a la vez; devuelve la nueva instantánea"""
+        with self._lock:
+            current = self._snapshot
+            if all(getattr(current, field) == value for field, value in changes.items()):
+                return current
+            self._snapshot = current._replace(version=current.version + 1, **changes)
+            return self._snapshot
+
+    def increment(self, field, amount=1):
+        """Sumar a un contador; devuelve la nueva instantánea"""
+        with self._lock:
+            current = self._snapshot
+            self._snapshot = current._replace(
+                version=current.version + 1, **{field: getattr(current, field) + amount}
+            )
+            return self._snapshot
+
+    def compare_and_set(self, field, expected, **changes):
+        """Escribir `changes` solo si `field` vale `expected` (True si se escribió)
+
+        Para transiciones que no deben ocurrir dos veces, p. ej. arrancar el
+        monitor desde dos pestañas a la vez.
+        """
+        with self._lock:
+            current = self._snapshot
+            if getattr(current, field) != expected:
+                return False
+            self._snapshot = current._replace(version=current.version + 1, **changes)
+            return True
+
+    def changed_since(self, version):
+        """Instantánea actual si cambió desde `version`, None si no"""
+        snapshot = self._snapshot
+        return snapshot if snapshot.version != version else None
+
+
+def to_dict(snapshot):
+    """Campos públicos de una instantánea, serializables en JSON"""
+    data = {field: getattr(snapshot, field) for field in PUBLIC_FIELDS}
+    if data['start_time'] is not None:
+        data['start_time'] = data['start_time'].isoformat()
+    return data
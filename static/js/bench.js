@@ -0,0 +1,95 @@
+// Mediciones del frontend, fuera de las páginas normales: las plantillas solo
+// cargan este script (y sus llamadas) con ?bench=N o ?bench_events=N.
+//
+//   /historial?bench=50000       primer frame de una tabla de 50k filas
+//   /?bench_events=5000          5k new_user a ráfagas (también en /historial)
+
+// Número pedido en la URL para una medición (0 si no se pidió)
+function benchParam(name) {
+    return parseInt(new URLSearchParams(location.search).get(name)) || 0;
+}
+
+// Medición: pintar `count` usuarios sintéticos con render(users) y medir el
+// tiempo hasta el primer frame, el heap de JS (solo Chrome) y las filas que
+// quedan en el DOM. Resultado en consola y en el título de la página.
+function benchFirstFrame(render, count = 50000) {
+    const t0 = performance.now();
+    const cities = ['Madrid', 'Barcelona', 'Valencia', 'Sevilla', 'Bilbao'];
+    const now = Date.now();
+    const users = [];
+    for (let i = 0; i < count; i++) {
+        users.push({
+            id: `bench${i}`,
+            name: `Usuario ${i}`,
+            age: 18 + (i % 27),
+            city: cities[i % cities.length],
+            country: 'España',
+            distance_short: `${i % 80} km`,
+            interests: JSON.stringify(['Viajar', 'Café', 'Cine'].slice(0, i % 4)),
+            is_verified: i % 3 === 0,
+            online_status: i % 5 === 0 ? 1 : 0,
+            photo: null,
+            detected_at: new Date(now - i * 60000).toISOString()
+        });
+    }
+    render(users);
+    requestAnimationFrame(() => requestAnimationFrame(() => {
+        const paint = (performance.now() - t0).toFixed(1);
+        const heap = performance.memory ? (performance.memory.usedJSHeapSize / 1048576).toFixed(1) + ' MB' : 'n/d';
+        const rows = document.querySelectorAll('tbody tr:not(.virtual-spacer)').length;
+        const result = `bench ${count} usuarios: primer frame ${paint} ms, heap ${heap}, ${rows} filas en el DOM`;
+        console.log(`⏱️ ${result}`);
+        document.title = result;
+    }));
+}
+
+// Medición: reproducir `count` eventos new_user sintéticos a ráfagas y medir
+// la duración de los frames mientras llegan. Resultado en consola y en el
+// título de la página.
+function benchNewUsers(onNewUser, count = 5000, burst = 25, interval = 4) {
+    const frames = [];
+    let sent = 0;
+    let last = performance.now();
+    let running = true;
+
+    const tick = (now) => {
+        frames.push(now - last);
+        last = now;
+        if (running) requestAnimationFrame(tick);
+    };
+    requestAnimationFrame(tick);
+
+    const start = performance.now();
+    const timer = setInterval(() => {
+        for (let i = 0; i < burst && sent < count; i++, sent++) {
+            onNewUser({
+                id: `bench${sent}`,
+                display_name: `Usuario ${sent}`,
+                age: 18 + (sent % 30),
+                photo: '',
+                has_voted: sent % 3 === 0,
+                is_verified: sent % 5 === 0,
+                online_status: sent % 2,
+                city: ['Madrid', 'Barcelona', 'Valencia', 'Sevilla'][sent % 4],
+                distance_short: `${sent % 50} km`,
+                interests: [],
+                timestamp: new Date().toLocaleTimeString('es-ES'),
+                is_new: true
+            });
+        }
+        if (sent >= count) {
+            clearInterval(timer);
+            // Un frame más para que se aplique el último flush
+            requestAnimationFrame(() => requestAnimationFrame(() => {
+                running = false;
+                const total = Math.round(performance.now() - start);
+                const sorted = frames.slice(1).sort((a, b) => a - b);
+                const pct = (p) => sorted.length ? sorted[Math.min(sorted.length - 1, Math.floor(sorted.length * p))].toFixed(1) : '0';
+                const avg = sorted.length ? (sorted.reduce((a, b) => a + b, 0) / sorted.length).toFixed(1) : '0';
+                const result = `bench ${count} new_user: ${total} ms, ${sorted.length} frames, media ${avg} ms, p95 ${pct(0.95)} ms, máx ${pct(1)} ms, ${document.getElementsByTagName('*').length} nodos`;
+                console.log(`⏱️ ${result}`);
+                document.title = result;
+            }));
+        }
+    }, interval);
+}
@@ -0,0 +1,110 @@
+// Almacén de usuarios con clave compartido por las páginas
+//
+// Los eventos (new_user, chunks de streams...) solo modifican el almacén y
+// encolan el cambio; los cambios se entregan a las vistas en un único flush
+// por frame (requestAnimationFrame). Así una ráfaga de 200 new_user cuesta un
+// parche del DOM, no 200 re-renderizados.
+class KeyedStore {
+    constructor(key = 'id') {
+        this.key = key;
+        this.items = [];        // orden de llegada (el más reciente al final)
+        this.index = new Map(); // clave -> posición en items
+        this.changes = null;
+        this.listeners = [];
+        this.pending = false;
+    }
+
+    get size() {
+        return this.items.length;
+    }
+
+    get(id) {
+        const position = this.index.get(id);
+        return position === undefined ? undefined : this.items[position];
+    }
+
+    has(id) {
+        return this.index.has(id);
+    }
+
+    // Vista: fn({inserted, updated, removed, reset}) una vez por frame
+    subscribe(fn) {
+        this.listeners.push(fn);
+        return () => { this.listeners = this.listeners.filter(l => l !== fn); };
+    }
+
+    // Sustituir todo el contenido (lista inicial, datos limpiados)
+    reset(items = []) {
+        this.items = [];
+        this.index.clear();
+        items.forEach(item => this.append(item));
+        this.pendingChanges().reset = true;
+        this.schedule();
+    }
+
+    // Añadir al final sin notificar (carga inicial por chunks)
+    append(item) {
+        const id = item[this.key];
+        if (this.index.has(id)) return false;
+        this.index.set(id, this.items.length);
+        this.items.push(item);
+        return true;
+    }
+
+    // Insertar o actualizar un item. Devuelve 'insert' o 'update'
+    upsert(item) {
+        const id = item[this.key];
+        const position = this.index.get(id);
+        const changes = this.pendingChanges();
+
+        if (position === undefined) {
+            this.append(item);
+            changes.inserted.push(item);
+            this.schedule();
+            return 'insert';
+        }
+
+        // Objeto nuevo en la misma posición: las vistas solo repintan ese nodo
+        const previous = this.items[position];
+        const merged = { ...previous, ...item };
+        this.items[position] = merged;
+        changes.updated.push({ item: merged, previous });
+        this.schedule();
+        return 'update';
+    }
+
+    remove(id) {
+        const position = this.index.get(id);
+        if (position === undefined) return false;
+        const [item] = this.items.splice(position, 1);
+        this.index.delete(id);
+        for (let i = position; i < this.items.length; i++) {
+            this.index.set(this.items[i][this.key], i);
+        }
+        this.pendingChanges().removed.push(item);
+        this.schedule();
+        return true;
+    }
+
+    pendingChanges() {
+        if (!this.changes) {
+            this.changes = { inserted: [], updated: [], removed: [], reset: false };
+        }
+        return this.changes;
+    }
+
+    schedule() {
+        if (this.pending) return;
+        this.pending = true;
+        requestAnimationFrame(() => this.flush());
+    }
+
+    // Entregar los cambios acumulados desde el último frame
+    flush() {
+        this.pending = false;
+        const changes = this.changes;
+        this.changes = null;
+        if (!changes) return;
+        this.listeners.forEach(fn => fn(changes));
+    }
+}
@@ -0,0 +1,100 @@
+// Recepción de listas enviadas por bloques (get_history / get_matches, o la API REST)
+//
+// El servidor envía '<name>_chunk' con un callback de confirmación y no manda
+// más de unos pocos bloques sin confirmar, así que confirmamos después de
+// renderizar cada bloque: el servidor nunca va más rápido que la página.
+class ListStream {
+    constructor(socket, name, handlers) {
+        this.socket = socket;
+        this.name = name;
+        this.handlers = handlers;
+        this.current = null;
+
+        socket.on(`${name}_chunk`, (data, ack) => {
+            if (data.stream_id === this.current && this.handlers.onChunk) {
+                const users = typeof Wire !== 'undefined' ? Wire.users(data.users) : data.users;
+                this.handlers.onChunk(users, data.index);
+            }
+            if (ack) ack();
+        });
+
+        socket.on(`${name}_done`, (data) => {
+            if (data.stream_id !== this.current) return;
+            this.current = null;
+            if (this.handlers.onDone) this.handlers.onDone(data.total, data.cancelled);
+        });
+
+        // Cancelar al salir de la página
+        window.addEventListener('beforeunload', () => this.cancel());
+    }
+
+    start(params = {}) {
+        this.cancel();
+        this.current = `${this.name}-${Date.now()}-${Math.random().toString(36).slice(2, 8)}`;
+        if (this.handlers.onStart) this.handlers.onStart();
+        this.socket.emit(`get_${this.name}`, { ...params, stream_id: this.current });
+    }
+
+    cancel() {
+        if (!this.current) return;
+        this.socket.emit('cancel_stream', { stream_id: this.current });
+        this.current = null;
+    }
+}
+
+// La misma interfaz sobre la API REST paginada (/api/history, /api/matches)
+//
+// Sigue next_cursor página a página. Cada página lleva ETag: al recargar o
+// reconectar, el navegador revalida y las páginas sin cambios llegan como 304
+// desde su caché, sin volver a descargarlas.
+class PagedFetch {
+    constructor(url, handlers, limit = 500) {
+        this.url = url;
+        this.handlers = handlers;
+        this.limit = limit;
+        this.controller = null;
+    }
+
+    async start() {
+        this.cancel();
+        const controller = this.controller = new AbortController();
+        if (this.handlers.onStart) this.handlers.onStart();
+        let cursor = '';
+        let index = 0;
+        let total = 0;
+        try {
+            do {
+                const params = new URLSearchParams({ limit: this.limit });
+                if (cursor) params.set('cursor', cursor);
+                const response = await fetch(`${this.url}?${params}`, { signal: controller.signal });
+                if (!response.ok) throw new Error(`${this.url}: ${response.status}`);
+                const page = await response.json();
+                if (controller !== this.controller) return;
+                if (this.handlers.onChunk && page.users.length) this.handlers.onChunk(page.users, index++);
+                total += page.users.length;
+                cursor = page.next_cursor;
+            } while (cursor);
+        } catch (error) {
+            if (error.name === 'AbortError') return;
+            console.error(error);
+        }
+        if (controller !== this.controller) return;
+        this.controller = null;
+        if (this.handlers.onDone) this.handlers.onDone(total, false);
+    }
+
+    cancel() {
+        if (!this.controller) return;
+        this.controller.abort();
+        this.controller = null;
+    }
+}
+
+// Cargador de una lista: la API REST por defecto; con ?load=socket, el stream
+// por SocketIO (se recuerda en localStorage; ?load=rest vuelve a la API)
+function listLoader(socket, name, url, handlers) {
+    const requested = new URLSearchParams(window.location.search).get('load');
+    if (requested) localStorage.setItem('listLoad', requested);
+    const mode = requested || localStorage.getItem('listLoad') || 'rest';
+    return mode === 'socket' ? new ListStream(socket, name, handlers) : new PagedFetch(url, handlers);
+}
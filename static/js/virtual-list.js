@@ -0,0 +1,191 @@
+// Lista virtualizada compartida por las páginas
+//
+// Solo existen nodos para las filas visibles (más un margen) y se reciclan
+// al hacer scroll: con 50k usuarios el DOM sigue teniendo unas decenas de
+// elementos. Funciona con contenedores en bloque/flex, con grid (las columnas
+// se leen de grid-template-columns) y con <tbody>.
+//
+// Los nodos se asocian al item que muestran: si un item sigue visible tras un
+// cambio, su nodo no se toca (insertar un usuario arriba = pintar un nodo).
+class VirtualList {
+    constructor(options) {
+        this.container = options.container;                  // donde van los nodos
+        this.scroller = options.scroller || options.container; // elemento con scroll
+        this.renderItem = options.renderItem;                 // (item, node|null) => node
+        this.createSpacer = options.createSpacer || (() => document.createElement('div'));
+        this.emptyHtml = options.emptyHtml || '';
+        this.overscan = options.overscan ?? 4;               // filas extra arriba y abajo
+        this.rowHeight = options.rowHeight || 0;             // se mide si no se indica
+        this.reversed = options.reversed || false;           // mostrar items del último al primero
+
+        this.items = [];
+        this.nodes = [];
+        this.start = 0;
+        this.columns = 1;
+        this.pending = false;
+        this.topSpacer = null;
+        this.bottomSpacer = null;
+
+        this.scroller.addEventListener('scroll', () => this.schedule(), { passive: true });
+        if (window.ResizeObserver) {
+            new ResizeObserver(() => {
+                this.rowHeight = options.rowHeight || 0;
+                this.schedule();
+            }).observe(this.scroller);
+        }
+    }
+
+    itemAt(index) {
+        return this.items[this.reversed ? this.items.length - 1 - index : index];
+    }
+
+    setItems(items) {
+        this.items = items;
+        this.schedule();
+    }
+
+    // Repintar en el siguiente frame (varias llamadas seguidas = un repintado)
+    schedule() {
+        if (this.pending) return;
+        this.pending = true;
+        requestAnimationFrame(() => {
+            this.pending = false;
+            this.render();
+        });
+    }
+
+    // Forzar el repintado de los nodos visibles aunque el item no haya cambiado
+    refresh() {
+        this.nodes.forEach(node => { node.__item = undefined; });
+        this.schedule();
+    }
+
+    render() {
+        if (this.items.length === 0) {
+            this.reset();
+            this.container.innerHTML = this.emptyHtml;
+            return;
+        }
+        if (!this.topSpacer) {
+            this.reset();
+            this.container.innerHTML = '';
+            this.topSpacer = this.createSpacer();
+            this.bottomSpacer = this.createSpacer();
+            this.container.appendChild(this.topSpacer);
+            this.container.appendChild(this.bottomSpacer);
+        }
+
+        const style = getComputedStyle(this.container);
+        this.columns = style.display.includes('grid')
+            ? Math.max(1, style.gridTemplateColumns.split(' ').filter(Boolean).length)
+            : 1;
+        const gap = parseFloat(style.rowGap) || 0;
+
+        // Primera pasada sin medida: pintar una fila para poder medirla
+        if (!this.rowHeight) {
+            this.paint(0, Math.min(this.items.length, this.columns), gap);
+            const first = this.nodes[0];
+            this.rowHeight = (first && first.offsetHeight) ? first.offsetHeight + gap : 60;
+        }
+
+        const totalRows = Math.ceil(this.items.length / this.columns);
+        const scrollerRect = this.scroller.getBoundingClientRect();
+        const offset = this.container === this.scroller
+            ? 0
+            : this.container.getBoundingClientRect().top - scrollerRect.top + this.scroller.scrollTop;
+        const viewTop = Math.max(0, this.scroller.scrollTop - offset);
+        const viewHeight = this.scroller.clientHeight || window.innerHeight;
+
+        const firstRow = Math.max(0, Math.floor(viewTop / this.rowHeight) - this.overscan);
+        const lastRow = Math.min(totalRows, Math.ceil((viewTop + viewHeight) / this.rowHeight) + this.overscan);
+
+        this.paint(firstRow * this.columns, Math.min(this.items.length, lastRow * this.columns), gap, firstRow, totalRows - lastRow);
+    }
+
+    paint(from, to, gap, rowsAbove = 0, rowsBelow = 0) {
+        const count = Math.max(0, to - from);
+
+        // Nodos que ya muestran un item visible se conservan tal cual
+        const byItem = new Map();
+        this.nodes.forEach(node => byItem.set(node.__item, node));
+        const next = new Array(count);
+        const missing = [];
+        for (let i = 0; i < count; i++) {
+            const item = this.itemAt(from + i);
+            const node = byItem.get(item);
+            if (node) {
+                next[i] = node;
+                byItem.delete(item);
+            } else {
+                missing.push(i);
+            }
+        }
+
+        // El resto de nodos se reciclan para los items nuevos
+        const free = [...byItem.values()];
+        missing.forEach(i => {
+            const item = this.itemAt(from + i);
+            const node = free.pop() || null;
+            const rendered = this.renderItem(item, node);
+            rendered.__item = item;
+            if (node && rendered !== node) node.remove();
+            next[i] = rendered;
+        });
+        free.forEach(node => node.remove());
+
+        // Colocar en orden moviendo solo los nodos que no están en su sitio
+        let cursor = this.topSpacer;
+        next.forEach(node => {
+            if (cursor.nextSibling !== node) {
+                this.container.insertBefore(node, cursor.nextSibling);
+            }
+            cursor = node;
+        });
+        this.nodes = next;
+
+        this.start = from;
+        this.sizeSpacer(this.topSpacer, rowsAbove, gap);
+        this.sizeSpacer(this.bottomSpacer, rowsBelow, gap);
+    }
+
+    sizeSpacer(spacer, rows, gap) {
+        // El gap del grid ya separa el espaciador de la primera fila
+        const height = Math.max(0, rows * this.rowHeight - gap);
+        spacer.style.display = rows > 0 ? '' : 'none';
+        spacer.style.height = `${height}px`;
+    }
+
+    reset() {
+        this.nodes = [];
+        this.topSpacer = null;
+        this.bottomSpacer = null;
+    }
+}
+
+// Espaciador que ocupa la fila entera de un grid
+function gridSpacer() {
+    const spacer = document.createElement('div');
+    spacer.style.gridColumn = '1 / -1';
+    return spacer;
+}
+
+// Espaciador para listas en <tbody>
+function tableSpacer(columns) {
+    return () => {
+        const tr = document.createElement('tr');
+        tr.className = 'virtual-spacer';
+        const td = document.createElement('td');
+        td.colSpan = columns;
+        tr.appendChild(td);
+        return tr;
+    };
+}
+
+// Ejecutar fn solo cuando dejan de llegar llamadas durante `wait` ms
+function debounce(fn, wait = 150) {
+    let timer = null;
+    return (...args) => {
+        clearTimeout(timer);
+        timer = setTimeout(() => fn(...args), wait);
+    };
+}
@@ -0,0 +1,63 @@
+// Formato compacto de las listas de perfiles (ver wire.py)
+//
+// Opt-in por página con ?wire=columnar o ?wire=msgpack (se recuerda en
+// localStorage; ?wire=json vuelve al formato por defecto). Las listas llegan
+// como lista de objetos (json), {keys, rows} (columnar) o un ArrayBuffer
+// MessagePack con {keys, rows}; Wire.users las devuelve siempre como objetos.
+// La librería de MessagePack solo se descarga en las páginas que la piden.
+const MSGPACK_URL = 'https://unpkg.com/@msgpack/msgpack@2.8.0/dist.es5+umd/msgpack.min.js';
+
+const Wire = {
+    format() {
+        const requested = new URLSearchParams(window.location.search).get('wire');
+        if (requested) localStorage.setItem('wireFormat', requested);
+        return requested || localStorage.getItem('wireFormat') || 'json';
+    },
+
+    // Cargar la librería una sola vez; resuelve a false si no se pudo
+    loadMsgpack() {
+        if (typeof MessagePack !== 'undefined') return Promise.resolve(true);
+        if (!this.msgpackLoading) {
+            this.msgpackLoading = new Promise(resolve => {
+                const script = document.createElement('script');
+                script.src = MSGPACK_URL;
+                script.onload = () => resolve(true);
+                script.onerror = () => resolve(false);
+                document.head.appendChild(script);
+            });
+        }
+        return this.msgpackLoading;
+    },
+
+    // Pedir el formato al servidor (llamar en cada 'connect')
+    negotiate(socket) {
+        const format = this.format();
+        if (format === 'msgpack') {
+            // Hasta que llega la librería el servidor sigue en json; si no carga, columnar
+            this.loadMsgpack().then(loaded => socket.emit('set_wire_format', { format: loaded ? 'msgpack' : 'columnar' }));
+        } else if (format !== 'json') {
+            socket.emit('set_wire_format', { format });
+        }
+    },
+
+    users(payload) {
+        if (payload instanceof ArrayBuffer || ArrayBuffer.isView(payload)) {
+            payload = MessagePack.decode(payload instanceof ArrayBuffer ? new Uint8Array(payload) : payload);
+        }
+        if (payload && !Array.isArray(payload) && Array.isArray(payload.keys)) {
+            const keys = payload.keys;
+            return payload.rows.map(row => {
+                const user = {};
+                for (let i = 0; i < keys.length; i++) user[keys[i]] = row[i];
+                return user;
+            });
+        }
+        return payload;
+    },
+
+    // new_user: un perfil (objeto en json, lista de uno en los formatos compactos)
+    user(payload) {
+        const users = this.users(payload);
+        return Array.isArray(users) ? users[0] : users;
+    }
+};
@@ -0,0 +1,61 @@
+"""Formato en el cable de las listas de perfiles enviadas por SocketIO
+
+Cada cliente elige el suyo con set_wire_format (por defecto JSON, como antes):
+
+  json      lista de diccionarios: repite los ~30 nombres de campo por perfil
+  columnar  {"keys": [...], "rows": [[...], ...]}: los nombres una sola vez
+  msgpack   el formato columnar codificado en MessagePack (adjunto binario);
+            necesita el paquete msgpack
+
+static/js/wire.js lo decodifica de vuelta a la lista de diccionarios.
+"""
+try:
+    import msgpack  # opcional: pip install msgpack
+except ImportError:
+    msgpack = None
+
+JSON = 'json'
+COLUMNAR = 'columnar'
+MSGPACK = 'msgpack'
+
+FORMATS = (JSON, COLUMNAR, MSGPACK) if msgpack is not None else (JSON, COLUMNAR)
+
+
+def room_for(fmt):
+    """Sala de los clientes que reciben new_user en `fmt`"""
+    return f'wire:{fmt}'
+
+
+def to_columnar(users):
+    """Lista de diccionarios -> {"keys", "rows"} (claves en orden de aparición)"""
+    keys = {}
+    for user in users:
+        for key in user:
+            if key not in keys:
+                keys[key] = len(keys)
+    names = list(keys)
+    # A un perfil sin alguno de los campos se le envía null
+    return {'keys': names, 'rows': [[user.get(key) for key in names] for user in users]}
+
+
+def from_columnar(payload):
+    keys = payload['keys']
+    return [dict(zip(keys, row)) for row in payload['rows']]
+
+
+def encode_users(users, fmt=JSON):
+    """Lista de perfiles en el formato `fmt`"""
+    if fmt == COLUMNAR:
+        return to_columnar(users)
+    if fmt == MSGPACK and msgpack is not None:
+        return msgpack.packb(to_columnar(users), use_bin_type=True)
+    return users
+
+
+def decode_users(payload):
+    """Inverso de encode_users (lo que hace wire.js en el navegador)"""
+    if isinstance(payload, (bytes, bytearray)):
+        payload = msgpack.unpackb(payload, raw=False)
+    if isinstance(payload, dict) and 'keys' in payload:
+        return from_columnar(payload)
+    return payload